@@ -0,0 +1,111 @@
+'''End-to-end benchmark of simplechatbot's own per-turn overhead using the offline FakeChatModel.
+The fake model has zero latency, so the timings are framework cost (plus the langchain_core invoke path).
+Results are written as JSON so they can be compared between releases.
+    python bench_agent_overhead.py --output results.json
+    python bench_agent_overhead.py --history-sizes 10 1000 --repeats 20
+'''
+from __future__ import annotations
+import typing
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import time
+
+import langchain_core.tools
+from langchain_core.messages import AIMessage
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent
+
+
+def make_tools(num_tools: int) -> list[langchain_core.tools.BaseTool]:
+    '''Create simple tools with distinct names.'''
+    tools = list()
+    for i in range(num_tools):
+        @langchain_core.tools.tool(f'lookup_{i}')
+        def lookup(key: str, limit: int = 10) -> str:
+            '''Look up a key in a table and return matching values.'''
+            return f'value of {key}'
+        tools.append(lookup)
+    return tools
+
+
+def make_agent(history_size: int, num_tools: int, responses: list | None = None) -> FakeAgent:
+    agent = FakeAgent.new(
+        responses = responses if responses is not None else ['The quick brown fox jumps over the lazy dog. ' * 10],
+        system_prompt = 'You are a helpful assistant.',
+        tools = make_tools(num_tools),
+    )
+    for i in range((history_size - 1) // 2):
+        agent.history.add_human_message(f'question number {i}')
+        agent.history.add_ai_message(f'answer number {i}')
+    return agent
+
+
+def time_op(op: typing.Callable[[], typing.Any], repeats: int, warmup: int = 2) -> dict[str, float]:
+    '''Time an operation and summarize in microseconds.'''
+    for _ in range(warmup):
+        op()
+    times = list()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        op()
+        times.append((time.perf_counter() - start) * 1e6)
+    times.sort()
+    return {
+        'repeats': repeats,
+        'mean_us': statistics.fmean(times),
+        'median_us': statistics.median(times),
+        'p95_us': times[min(len(times)-1, int(len(times)*0.95))],
+        'min_us': times[0],
+    }
+
+
+def run_benchmarks(history_sizes: list[int], num_tools: int, repeats: int) -> list[dict[str, typing.Any]]:
+    results = list()
+    def record(name: str, history_size: int, op: typing.Callable[[], typing.Any]) -> None:
+        r = time_op(op, repeats)
+        results.append({'benchmark': name, 'history_size': history_size, 'num_tools': num_tools, **r})
+        print(f'{name:>16} history={history_size:>6} median={r["median_us"]:>10.1f}us p95={r["p95_us"]:>10.1f}us')
+
+    tool_call_reply = AIMessage(content='', tool_calls=[
+        {'name': f'lookup_{i % max(num_tools, 1)}', 'args': {'key': f'k{i}'}, 'id': f'call_{i}'} for i in range(3)
+    ])
+
+    for history_size in history_sizes:
+        agent = make_agent(history_size, num_tools)
+        record('chat', history_size, lambda: agent.chat('hello', add_to_history=False))
+        record('stream', history_size, lambda: agent.stream('hello', add_to_history=False).collect())
+        record('clone', history_size, lambda: agent.clone())
+
+        if num_tools > 0:
+            tool_agent = make_agent(history_size, num_tools, responses=[tool_call_reply])
+            result = tool_agent.chat('look up some keys', add_to_history=False)
+            record('execute_tools', history_size, lambda: result.execute_tools())
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history-sizes', type=int, nargs='+', default=[10, 1_000, 10_000])
+    parser.add_argument('--num-tools', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--output', type=str, default=None, help='path of JSON file to write results to')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.history_sizes, args.num_tools, args.repeats)
+    report = {
+        'timestamp': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'wrote {len(results)} results to {args.output}')
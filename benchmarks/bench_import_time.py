@@ -0,0 +1,39 @@
+'''Measures how long `import simplechatbot` takes, split into the package's own modules and dependencies.
+Wall-clock import time varies with machine load, so it is reported here rather than asserted in tests.
+    python bench_import_time.py
+'''
+from __future__ import annotations
+import typing
+import subprocess
+import sys
+import pathlib
+
+SRC_PATH = str(pathlib.Path(__file__).parent.parent / 'src')
+
+
+def run_import(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import sys; sys.path.insert(0, {SRC_PATH!r}); {code}'],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    '''Get module name -> (self us, cumulative us).'''
+    times = dict()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+if __name__ == '__main__':
+    print(f'{"run":>4} {"self ms":>10} {"total ms":>10}')
+    for i in range(5):
+        times = parse_importtime(run_import('import simplechatbot').stderr)
+        self_us = sum(s for name, (s, c) in times.items() if name.startswith('simplechatbot'))
+        print(f'{i:>4} {self_us/1000:>10.1f} {times["simplechatbot"][1]/1000:>10.1f}')
@@ -0,0 +1,47 @@
+'''Micro-benchmark of per-chunk overhead when accumulating long streamed responses.
+Compares StreamResult (buffered, single merge) against repeated AIMessageChunk addition.
+    python bench_stream_accumulation.py
+'''
+from __future__ import annotations
+import typing
+import time
+
+from langchain_core.messages import AIMessageChunk
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+
+
+def make_chunks(n: int) -> list[AIMessageChunk]:
+    return [AIMessageChunk(content=f'tok{i} ', id='run-bench') for i in range(n)]
+
+
+def time_repeated_addition(chunks: list[AIMessageChunk]) -> float:
+    start = time.perf_counter()
+    full_message = AIMessageChunk(content='')
+    for chunk in chunks:
+        full_message += chunk
+    return time.perf_counter() - start
+
+
+def time_stream_result(chunks: list[AIMessageChunk]) -> float:
+    agent = simplechatbot.Agent(_model=None)
+    start = time.perf_counter()
+    stream = simplechatbot.StreamResult.from_message_iter(
+        message_iter = iter(chunks),
+        agent = agent,
+        tool_lookup = simplechatbot.ToolSet.empty().tool_lookup(),
+        add_reply_to_history = True,
+    )
+    stream.collect()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    print(f'{"chunks":>8} {"addition us/chunk":>18} {"StreamResult us/chunk":>22}')
+    for n in (100, 1_000, 4_000, 16_000):
+        chunks = make_chunks(n)
+        t_add = min(time_repeated_addition(chunks) for _ in range(3))
+        t_stream = min(time_stream_result(chunks) for _ in range(3))
+        print(f'{n:>8} {t_add/n*1e6:>18.2f} {t_stream/n*1e6:>22.2f}')
@@ -1,12 +1,36 @@
 
-# so this places everything from the tools module into the tools namespace. Access it like this:
-# import simplechatbot
-# simplechatbot.tools.WhateverTool
-from . import tools
-
-from . import andrew
+import importlib
+import typing
 
 # I had to move this to the package root for some imports to work.
 from .agent import *
 
 from .promptmanager import PromptManager, PromptNotFound, TemplateVariableMismatch
+
+# subpackages with heavy optional dependencies are imported lazily on first attribute access
+#   so that `import simplechatbot` stays cheap. Access them like this:
+# import simplechatbot
+# simplechatbot.tools.WhateverTool
+# simplechatbot.openai_agent.OpenAIAgent
+_LAZY_SUBMODULES = (
+    'tools',
+    'andrew',
+    'openai_agent',
+    'ollama_agent',
+    'mistral_agent',
+    'fake_agent',
+)
+
+if typing.TYPE_CHECKING:
+    from . import tools, andrew, openai_agent, ollama_agent, mistral_agent, fake_agent
+
+def __getattr__(name: str) -> typing.Any:
+    '''Import subpackages lazily (PEP 562).'''
+    if name in _LAZY_SUBMODULES:
+        module = importlib.import_module(f'.{name}', __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY_SUBMODULES))
@@ -10,9 +10,26 @@
 from .agent import Agent
 from .toolset import ToolSet, ToolCallResult
 from .message_history import MessageHistory
+from .persistent_history import PersistentMessageHistory, MessageStore, JsonlMessageStore, SqliteMessageStore
+from .shared_history import SharedMessageHistory
+from .branching import Checkpoint, HistoryFootprint, history_footprint
+from .binding_cache import ModelBindingCache, BindingCacheStats
+from .factory_cache import ToolFactoryCache, ToolFactoryCacheStats, DynamicToolFactory, dynamic_tool_factory
+from .tool_selection import ToolSelector, LexicalToolSelector, EmbeddingToolSelector
+from .context_window import WindowPolicy, ContextWindow, approximate_token_count
+from .response_cache import ResponseCache, ResponseCacheStats
+from .tool_cache import ToolResultCache, ToolCachePolicy, ToolCacheStats
+from .tool_runner import ToolRunner, ToolExecutionPolicy
+from .timing import PhaseTimer, PhaseTimings, TimingSink, TimingAggregator
+from .stream_metrics import StreamMetrics, StreamStats
+from .coalesce import CoalescePolicy
+from .run import RunStep, RunTrace, RunLimits
+from .best_of import BestOfResult, ScoredCandidate, StructuredJudge, JudgeScore
+from .hedging import HedgedChatModel, ModelLatencyTracker, ModelLatencyStats
+from .rate_limit import RateLimiter, RateLimitedChatModel, RateLimitLease, RateLimitStats
 from .keychain import APIKeyChain
-from .errors import UknownToolError, ToolRaisedExceptionError, ToolWasNotExecutedError
-from .chatresult import ChatResult, StreamResult, StructuredOutputResult
+from .errors import UknownToolError, ToolRaisedExceptionError, ToolWasNotExecutedError, ToolTimeoutError
+from .chatresult import ChatResult, StreamResult, AsyncStreamResult, StructuredOutputResult
 # import old stuff into separate namespace
 #from . import v4
 
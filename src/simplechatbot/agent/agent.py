@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import typing
 import dataclasses
+import concurrent.futures
 import copy
+import time
 
 import pydantic
 
@@ -14,12 +16,27 @@ from langchain_core.messages import (
 )
 
 from .message_history import MessageHistory
+from .shared_history import SharedMessageHistory
+from .branching import Checkpoint
 from .toolset import ToolSet, ToolCallResult, ToolLookup
+from .binding_cache import ModelBindingCache
+from .context_window import WindowPolicy
+from .response_cache import ResponseCache, message_to_chunk
+from .tool_cache import ToolResultCache
+from .tool_runner import ToolRunner
+from .factory_cache import ToolFactoryCache
+from .tool_selection import ToolSelector, query_from_messages
+from .timing import PhaseTimer, PhaseTimings, phase
+from .coalesce import CoalescePolicy, print_text
+from .run import RunStep, RunTrace, RunLimits, count_result_tokens
+from .best_of import BestOfResult, BestOfStopReason, ScoredCandidate, Scorer, sample_best_of, asample_best_of
+from .message_history import add_ai_message_chunks
 
 from .ui import ChatBotUI
 from .chatresult import (
     ChatResult, 
     StreamResult,
+    AsyncStreamResult,
     StructuredOutputResult,
 )
 
@@ -52,7 +69,16 @@ class Agent:
     '''
     _model: BaseChatModel
     history: MessageHistory = dataclasses.field(default_factory=MessageHistory)
-    toolset: ToolSet = dataclasses.field(default_factory=ToolSet)
+    toolset: ToolSet = dataclasses.field(default_factory=ToolSet.empty)
+    binding_cache: ModelBindingCache = dataclasses.field(default_factory=ModelBindingCache, repr=False)
+    context_window: WindowPolicy | None = None
+    response_cache: ResponseCache | None = dataclasses.field(default=None, repr=False)
+    timer: PhaseTimer | None = dataclasses.field(default=None, repr=False)
+    tool_cache: ToolResultCache | None = dataclasses.field(default=None, repr=False)
+    tool_runner: ToolRunner | None = dataclasses.field(default=None, repr=False)
+    factory_cache: ToolFactoryCache | None = dataclasses.field(default_factory=ToolFactoryCache, repr=False)
+    _tool_executor: concurrent.futures.Executor | None = dataclasses.field(default=None, repr=False)
+    _owns_tool_executor: bool = dataclasses.field(default=False, repr=False)
     
     ############################# Generic Constructors #############################
     @classmethod
@@ -63,6 +89,13 @@ class Agent:
         toolkits: typing.Optional[list[BaseToolkit]] = None,
         tool_factories: ToolFactoryType | None = None,
         tool_choice: ToolName | typing.Literal['auto', 'any'] | None = None,
+        context_window: WindowPolicy | None = None,
+        response_cache: ResponseCache | None = None,
+        timer: PhaseTimer | None = None,
+        tool_cache: ToolResultCache | None = None,
+        tool_runner: ToolRunner | None = None,
+        tool_selector: ToolSelector | None = None,
+        history: MessageHistory | None = None,
     ) -> typing.Self:
         '''Create a new agent with any subtype of BaseChatModel.
         Args:
@@ -71,11 +104,19 @@ class Agent:
             tools: tools to be bound to the model using model.bind_tools(tools)
             toolkits: toolkits to extract tools from.
             tool_factories: tool factories that create new tools.
+            context_window: policy used to trim the messages sent to the model (e.g. ContextWindow).
+            response_cache: cache of model responses to reuse for identical requests.
+            timer: enables per-phase timing instrumentation (see result.timings).
+            tool_cache: memoizes results of deterministic tool calls (see ToolResultCache).
+            tool_runner: per-tool timeouts and thread/process pools (see ToolRunner).
+            tool_selector: bind only the tools most relevant to each turn (see LexicalToolSelector).
+            history: existing history to use (e.g. a PersistentMessageHistory). The system prompt
+                is only added if it is empty.
         '''
-        if system_prompt is not None:
-            history = MessageHistory.from_system_prompt(system_prompt)
-        else:
+        if history is None:
             history = MessageHistory()
+        if system_prompt is not None and len(history) == 0:
+            history.add_system_message(system_prompt)
 
         # NOTE: The agent is in a partially initialized state here, so maybe fix that in the future.
         new_agent = cls(
@@ -86,7 +127,13 @@ class Agent:
                 toolkits = toolkits,
                 tool_factories = tool_factories,
                 tool_choice=tool_choice,
+                tool_selector=tool_selector,
             ),
+            context_window = context_window,
+            response_cache = response_cache,
+            timer = timer,
+            tool_cache = tool_cache,
+            tool_runner = tool_runner,
         )
         return new_agent
     
@@ -100,6 +147,8 @@ class Agent:
         tool_factories: ToolFactoryType | None = None,
         do_print: bool = False,
         receive_callback: typing.Callable[[AIMessageChunk], None] = None,
+        coalesce: CoalescePolicy | None = None,
+        eager_tools: bool = False,
     ) -> StreamResult:
         '''Return a StreamResult that can be iterated over to get the chat messages.
         Args:
@@ -109,16 +158,29 @@ class Agent:
             tools: tools to use in this particular message.
             toolkits: toolkits to use in this particular message.
             tool_factories: tool factories to use in this particular message.
+            do_print: print text as it arrives.
+            receive_callback: called with each chunk as it arrives.
+            coalesce: deliver text in batches (to do_print and receive_callback, which then
+                receives str instead of chunks) rather than once per chunk. Iterating over the
+                result still yields every chunk.
+            eager_tools: start each tool call as soon as its arguments have finished streaming,
+                so tool latency overlaps with the rest of the response. execute_tools() then
+                waits on calls that are already running.
         '''
-        use_messages = self._get_message_history(new_message, add_to_history=add_to_history)
+        timings = self._start_timings('stream')
+        with phase(timings, 'history'):
+            use_messages = self._get_message_history(new_message, add_to_history=add_to_history)
         return self._stream(
             messages = use_messages,
+            timings = timings,
             add_reply_to_history=add_to_history,
             tools = tools,
             toolkits = toolkits,
             tool_factories = tool_factories,
             receive_callback = receive_callback,
             do_print=do_print,
+            coalesce=coalesce,
+            eager_tools=eager_tools,
         )
 
     def chat(self, 
@@ -134,9 +196,12 @@ class Agent:
             show_tools: whether to show tool calls in the response.
             add_to_history: whether to add the message to the history after the response is received.
         '''
-        use_messages = self._get_message_history(new_message, add_to_history=add_to_history)
+        timings = self._start_timings('invoke')
+        with phase(timings, 'history'):
+            use_messages = self._get_message_history(new_message, add_to_history=add_to_history)
         return self._invoke(
             messages = use_messages,
+            timings = timings,
             add_reply_to_history=add_to_history,
             tools = tools,
             toolkits = toolkits,
@@ -154,22 +219,460 @@ class Agent:
             show_tools: whether to show tool calls in the response.
             add_to_history: whether to add the message to the history after the response is received.
         '''
-        use_messages = self._get_message_history(new_message, add_to_history=add_to_history)
+        timings = self._start_timings('structured')
+        with phase(timings, 'history'):
+            use_messages = self._get_message_history(new_message, add_to_history=add_to_history)
         return self._invoke_structured_output(
             messages = use_messages,
+            timings = timings,
             output_structure=output_structure,
             add_reply_to_history=add_to_history,
         )
 
+    ############################# Async chat interface #############################
+    def astream(self, 
+        new_message: typing.Optional[str], 
+        add_to_history: bool = True,
+        tools: typing.Optional[list[BaseTool]] = None,
+        toolkits: typing.Optional[list[BaseToolkit]] = None,
+        tool_factories: ToolFactoryType | None = None,
+        do_print: bool = False,
+        receive_callback: typing.Callable[[AIMessageChunk], None] = None,
+        coalesce: CoalescePolicy | None = None,
+        eager_tools: bool = False,
+    ) -> AsyncStreamResult:
+        '''Return an AsyncStreamResult that can be iterated over using `async for`.
+            Uses model.astream so the event loop is not blocked while waiting on the model.
+        Args:
+            new_message: message to send to the agent. If None is entered, a new message will 
+                not be added to history.
+            add_to_history: whether to add the message to the history after the response is received
+            tools: tools to use in this particular message.
+            toolkits: toolkits to use in this particular message.
+            tool_factories: tool factories to use in this particular message.
+            do_print: print text as it arrives.
+            receive_callback: called with each chunk as it arrives.
+            coalesce: deliver text in batches (to do_print and receive_callback, which then
+                receives str instead of chunks) rather than once per chunk. Iterating over the
+                result still yields every chunk.
+            eager_tools: start each tool call as soon as its arguments have finished streaming,
+                so tool latency overlaps with the rest of the response. execute_tools() then
+                waits on calls that are already running.
+        '''
+        timings = self._start_timings('stream')
+        with phase(timings, 'history'):
+            use_messages = self._get_message_history(new_message, add_to_history=add_to_history)
+        return self._astream(
+            messages = use_messages,
+            timings = timings,
+            add_reply_to_history=add_to_history,
+            tools = tools,
+            toolkits = toolkits,
+            tool_factories = tool_factories,
+            receive_callback = receive_callback,
+            do_print=do_print,
+            coalesce=coalesce,
+            eager_tools=eager_tools,
+        )
+
+    async def achat(self, 
+        new_message: typing.Optional[str], 
+        add_to_history: bool = True,
+        tools: list[BaseTool] | None = None,
+        toolkits: list[BaseToolkit] | None = None,
+        tool_factories: ToolFactoryType | None = None,
+    ) -> ChatResult:
+        '''Send a message to the agent and await the response. Async version of chat().
+        Args:
+            new_message: message to send to the agent. If None is entered, a new message will not be added to history.
+            add_to_history: whether to add the message to the history after the response is received.
+        '''
+        timings = self._start_timings('invoke')
+        with phase(timings, 'history'):
+            use_messages = self._get_message_history(new_message, add_to_history=add_to_history)
+        return await self._ainvoke(
+            messages = use_messages,
+            timings = timings,
+            add_reply_to_history=add_to_history,
+            tools = tools,
+            toolkits = toolkits,
+            tool_factories = tool_factories,
+        )
+
+    async def achat_structured(self, 
+        new_message: typing.Optional[str], 
+        output_structure: type[pydantic.BaseModel],
+        add_to_history: bool = True,
+    ) -> StructuredOutputResult:
+        '''Send a message to the agent and await the structured response. Async version of chat_structured().
+        Args:
+            new_message: message to send to the agent. If None is entered, a new message will not be added to history.
+            output_structure: pydantic model describing the desired output.
+            add_to_history: whether to add the message to the history after the response is received.
+        '''
+        timings = self._start_timings('structured')
+        with phase(timings, 'history'):
+            use_messages = self._get_message_history(new_message, add_to_history=add_to_history)
+        return await self._ainvoke_structured_output(
+            messages = use_messages,
+            timings = timings,
+            output_structure=output_structure,
+            add_reply_to_history=add_to_history,
+        )
+
+    ############################# Tool loop #############################
+    def run(self, 
+        new_message: typing.Optional[str], 
+        max_iterations: int | None = 10,
+        deadline: float | None = None,
+        max_tokens: int | None = None,
+        parallel: bool = False,
+        max_concurrency: int | None = None,
+        stream: bool = False,
+        do_print: bool = False,
+        on_step: typing.Callable[[RunStep], None] | None = None,
+        tools: list[BaseTool] | None = None,
+        toolkits: list[BaseToolkit] | None = None,
+        tool_factories: ToolFactoryType | None = None,
+    ) -> RunTrace:
+        '''Chat and execute tool calls in a loop until the model stops calling tools or a limit is reached.
+            Replies and tool results are added to history, so history is always left with no pending tool calls.
+        Args:
+            new_message: message to send to the agent. If None, continue from the current history.
+            max_iterations: maximum number of model calls.
+            deadline: stop calling the model after this many seconds (checked between steps).
+            max_tokens: stop calling the model after this many tokens have been used (checked between steps).
+            parallel: run the tool calls from each response concurrently.
+            max_concurrency: maximum number of tools to run at once when parallel=True.
+            stream: stream each response (use with do_print to show text as it arrives).
+            do_print: print text as it arrives. Only used when stream=True.
+            on_step: called after each step, once its tool calls have finished.
+        Example:
+            trace = agent.run('What is the weather in Paris?', max_iterations=5)
+            print(trace.content, trace.stop_reason)
+        '''
+        limits = RunLimits(max_iterations=max_iterations, deadline=deadline, max_tokens=max_tokens)
+        trace = RunTrace()
+        while (reason := limits.check(trace)) is None:
+            model_start = time.perf_counter()
+            if stream:
+                result = self.stream(new_message, tools=tools, toolkits=toolkits, tool_factories=tool_factories, do_print=do_print).collect()
+            else:
+                result = self.chat(new_message, tools=tools, toolkits=toolkits, tool_factories=tool_factories)
+            tool_start = time.perf_counter()
+            tool_results = result.execute_tools(parallel=parallel, max_concurrency=max_concurrency)
+            new_message = None
+
+            step = RunStep(
+                iteration = len(trace),
+                result = result,
+                tool_results = tool_results,
+                model_time = tool_start - model_start,
+                tool_time = time.perf_counter() - tool_start,
+                tokens = count_result_tokens(result),
+            )
+            trace.add_step(step)
+            if on_step is not None:
+                on_step(step)
+            if not len(tool_results):
+                return trace.stop('complete')
+        return trace.stop(reason)
+
+    async def arun(self, 
+        new_message: typing.Optional[str], 
+        max_iterations: int | None = 10,
+        deadline: float | None = None,
+        max_tokens: int | None = None,
+        parallel: bool = False,
+        max_concurrency: int | None = None,
+        stream: bool = False,
+        do_print: bool = False,
+        on_step: typing.Callable[[RunStep], None] | None = None,
+        tools: list[BaseTool] | None = None,
+        toolkits: list[BaseToolkit] | None = None,
+        tool_factories: ToolFactoryType | None = None,
+    ) -> RunTrace:
+        '''Async version of run(). Tools are awaited using BaseTool.ainvoke.'''
+        limits = RunLimits(max_iterations=max_iterations, deadline=deadline, max_tokens=max_tokens)
+        trace = RunTrace()
+        while (reason := limits.check(trace)) is None:
+            model_start = time.perf_counter()
+            if stream:
+                result = await self.astream(new_message, tools=tools, toolkits=toolkits, tool_factories=tool_factories, do_print=do_print).collect()
+            else:
+                result = await self.achat(new_message, tools=tools, toolkits=toolkits, tool_factories=tool_factories)
+            tool_start = time.perf_counter()
+            tool_results = await result.aexecute_tools(parallel=parallel, max_concurrency=max_concurrency)
+            new_message = None
+
+            step = RunStep(
+                iteration = len(trace),
+                result = result,
+                tool_results = tool_results,
+                model_time = tool_start - model_start,
+                tool_time = time.perf_counter() - tool_start,
+                tokens = count_result_tokens(result),
+            )
+            trace.add_step(step)
+            if on_step is not None:
+                on_step(step)
+            if not len(tool_results):
+                return trace.stop('complete')
+        return trace.stop(reason)
+
+    ############################# Batch chat interface #############################
+    def chat_many(self, 
+        new_messages: list[str], 
+        max_concurrency: int | None = None,
+        return_exceptions: bool = True,
+        tools: list[BaseTool] | None = None,
+        toolkits: list[BaseToolkit] | None = None,
+        tool_factories: ToolFactoryType | None = None,
+    ) -> list[ChatResult | Exception]:
+        '''Send many independent messages using model.batch and return results in input order.
+            Each message is sent to a fork of this agent, so this agent's history is not modified.
+            Access the forked agent via result.agent to continue that conversation.
+        Args:
+            new_messages: messages to send. Each is added to the end of a copy of the current history.
+            max_concurrency: maximum number of requests in flight at once.
+            return_exceptions: place exceptions in the output list instead of raising them.
+            tools: tools to use for these messages.
+            toolkits: toolkits to use for these messages.
+            tool_factories: tool factories to use for these messages.
+        '''
+        self.history.check_tools_were_executed()
+        model, tool_lookup = self.get_model_with_tools(
+            tools = tools,
+            toolkits = toolkits,
+            tool_factories = tool_factories,
+        )
+        forks, inputs = self._fork_for_messages(new_messages)
+        outputs = model.batch(
+            inputs, 
+            config = {'max_concurrency': max_concurrency}, 
+            return_exceptions = return_exceptions,
+        )
+        return [
+            output if isinstance(output, Exception) else ChatResult.from_message(
+                message = output,
+                agent = fork,
+                tool_lookup = tool_lookup,
+                add_reply_to_history = True,
+                add_tool_calls_to_history = True,
+            )
+            for fork, output in zip(forks, outputs)
+        ]
+
+    async def achat_many(self, 
+        new_messages: list[str], 
+        max_concurrency: int | None = None,
+        return_exceptions: bool = True,
+        tools: list[BaseTool] | None = None,
+        toolkits: list[BaseToolkit] | None = None,
+        tool_factories: ToolFactoryType | None = None,
+    ) -> list[ChatResult | Exception]:
+        '''Async version of chat_many using model.abatch.'''
+        self.history.check_tools_were_executed()
+        model, tool_lookup = self.get_model_with_tools(
+            tools = tools,
+            toolkits = toolkits,
+            tool_factories = tool_factories,
+        )
+        forks, inputs = self._fork_for_messages(new_messages)
+        outputs = await model.abatch(
+            inputs, 
+            config = {'max_concurrency': max_concurrency}, 
+            return_exceptions = return_exceptions,
+        )
+        return [
+            output if isinstance(output, Exception) else ChatResult.from_message(
+                message = output,
+                agent = fork,
+                tool_lookup = tool_lookup,
+                add_reply_to_history = True,
+                add_tool_calls_to_history = True,
+            )
+            for fork, output in zip(forks, outputs)
+        ]
+
+    def chat_structured_many(self, 
+        new_messages: list[str], 
+        output_structure: type[pydantic.BaseModel],
+        max_concurrency: int | None = None,
+        return_exceptions: bool = True,
+    ) -> list[StructuredOutputResult | Exception]:
+        '''Send many independent messages using model.batch and return structured results in input order.
+        Args:
+            new_messages: messages to send. Each is added to the end of a copy of the current history.
+            output_structure: pydantic model describing the desired output.
+            max_concurrency: maximum number of requests in flight at once.
+            return_exceptions: place exceptions in the output list instead of raising them.
+        '''
+        self.history.check_tools_were_executed()
+        model = self.get_model_with_structured_output(output_structure=output_structure)
+        forks, inputs = self._fork_for_messages(new_messages)
+        outputs = model.batch(
+            inputs, 
+            config = {'max_concurrency': max_concurrency}, 
+            return_exceptions = return_exceptions,
+        )
+        return [
+            output if isinstance(output, Exception) else StructuredOutputResult.from_output(
+                output = output,
+                agent = fork,
+                add_reply_to_history = True,
+            )
+            for fork, output in zip(forks, outputs)
+        ]
+
+    async def achat_structured_many(self, 
+        new_messages: list[str], 
+        output_structure: type[pydantic.BaseModel],
+        max_concurrency: int | None = None,
+        return_exceptions: bool = True,
+    ) -> list[StructuredOutputResult | Exception]:
+        '''Async version of chat_structured_many using model.abatch.'''
+        self.history.check_tools_were_executed()
+        model = self.get_model_with_structured_output(output_structure=output_structure)
+        forks, inputs = self._fork_for_messages(new_messages)
+        outputs = await model.abatch(
+            inputs, 
+            config = {'max_concurrency': max_concurrency}, 
+            return_exceptions = return_exceptions,
+        )
+        return [
+            output if isinstance(output, Exception) else StructuredOutputResult.from_output(
+                output = output,
+                agent = fork,
+                add_reply_to_history = True,
+            )
+            for fork, output in zip(forks, outputs)
+        ]
+
+    ############################# Best-of-n sampling #############################
+    def chat_best_of(self, 
+        new_message: typing.Optional[str | HumanMessage],
+        n: int,
+        scorer: Scorer,
+        threshold: float | None = None,
+        max_concurrency: int | None = None,
+        add_to_history: bool = True,
+        tools: list[BaseTool] | None = None,
+        toolkits: list[BaseToolkit] | None = None,
+        tool_factories: ToolFactoryType | None = None,
+    ) -> BestOfResult:
+        '''Sample n replies to the same context concurrently and keep the highest scoring one.
+            Only the new message and the winning reply are added to history. The response cache is
+            bypassed so each request is a fresh sample.
+        Args:
+            new_message: message to send. If None, sample replies to the current history.
+            n: number of replies to request.
+            scorer: function taking the reply AIMessage and returning a score (higher is better),
+                e.g. a StructuredJudge. It runs in the worker that made the request.
+            threshold: stop as soon as a reply scores at least this much. Requests that have not
+                started are cancelled; requests already in flight are abandoned.
+            max_concurrency: maximum number of requests in flight at once (default n).
+            add_to_history: whether to add the new message and winning reply to the history.
+        Example:
+            best = agent.chat_best_of('Write a haiku about rain.', n=5, scorer=lambda m: -len(m.content))
+            print(best.content, best.scores)
+        '''
+        self.history.check_tools_were_executed()
+        new_message = self._as_human_message(new_message)
+        messages = self._get_message_history(new_message, add_to_history=False)
+        model, tool_lookup = self.get_model_with_tools(
+            tools = tools,
+            toolkits = toolkits,
+            tool_factories = tool_factories,
+            messages = messages,
+        )
+        candidates, num_cancelled, num_failed, stop_reason = sample_best_of(model, messages, n, scorer, threshold, max_concurrency)
+        return self._commit_best_of(new_message, tool_lookup, candidates, num_cancelled, num_failed, stop_reason, add_to_history)
+
+    async def achat_best_of(self, 
+        new_message: typing.Optional[str | HumanMessage],
+        n: int,
+        scorer: Scorer,
+        threshold: float | None = None,
+        max_concurrency: int | None = None,
+        add_to_history: bool = True,
+        tools: list[BaseTool] | None = None,
+        toolkits: list[BaseToolkit] | None = None,
+        tool_factories: ToolFactoryType | None = None,
+    ) -> BestOfResult:
+        '''Async version of chat_best_of. Requests still in flight are cancelled once the threshold is met.
+            The scorer may be async, and a scorer with an ascore() method (e.g. StructuredJudge) is awaited.
+        '''
+        self.history.check_tools_were_executed()
+        new_message = self._as_human_message(new_message)
+        messages = self._get_message_history(new_message, add_to_history=False)
+        model, tool_lookup = self.get_model_with_tools(
+            tools = tools,
+            toolkits = toolkits,
+            tool_factories = tool_factories,
+            messages = messages,
+        )
+        candidates, num_cancelled, num_failed, stop_reason = await asample_best_of(model, messages, n, scorer, threshold, max_concurrency)
+        return self._commit_best_of(new_message, tool_lookup, candidates, num_cancelled, num_failed, stop_reason, add_to_history)
+
+    def _commit_best_of(self, 
+        new_message: BaseMessage | None,
+        tool_lookup: ToolLookup,
+        candidates: list[ScoredCandidate],
+        num_cancelled: int,
+        num_failed: int,
+        stop_reason: BestOfStopReason,
+        add_to_history: bool,
+    ) -> BestOfResult:
+        '''Add the new message and the winning reply to history.'''
+        best = max(candidates, key=lambda c: c.score)
+        if add_to_history and new_message is not None:
+            self.history.add_message(new_message)
+        result = ChatResult.from_message(
+            message = best.message,
+            agent = self,
+            tool_lookup = tool_lookup,
+            add_reply_to_history = add_to_history,
+            add_tool_calls_to_history = add_to_history,
+        )
+        return BestOfResult(
+            result = result,
+            candidates = candidates,
+            num_cancelled = num_cancelled,
+            num_failed = num_failed,
+            stop_reason = stop_reason,
+        )
+
+    @staticmethod
+    def _as_human_message(new_message: typing.Optional[str | BaseMessage]) -> BaseMessage | None:
+        if new_message is None or isinstance(new_message, BaseMessage):
+            return new_message
+        return HumanMessage(content=new_message)
+
+    def _fork_for_messages(self, new_messages: list[str]) -> tuple[list[typing.Self], list[list[BaseMessage]]]:
+        '''Create one fork of this agent per message and the message list to send for each.'''
+        forks = [self.clone() for _ in new_messages]
+        inputs = [fork._get_message_history(m, add_to_history=True) for fork, m in zip(forks, new_messages)]
+        return forks, inputs
 
     def _get_message_history(self, new_message: typing.Optional[str | HumanMessage], add_to_history: bool) -> list[BaseMessage]:
-        '''Get messages for this chat and add the new message to the history if needed.'''
-        if new_message is None:
-            use_messages = self.history
+        '''Get messages for this chat and add the new message to the history if needed.
+            The stored history is never modified by the context window policy.
+        '''
+        if new_message is not None and not isinstance(new_message, BaseMessage):
+            new_message = HumanMessage(content=new_message)
+
+        if self.context_window is not None:
+            # the window picks messages before anything is copied, so stored histories only load what is sent
+            extra = [new_message] if new_message is not None else []
+            use_messages = self.history.windowed(self.context_window, extra)
+        elif new_message is not None:
+            use_messages = self.history.appended(new_message)
         else:
-            use_messages = self.history + [new_message]
-            if add_to_history:
-                self.history.add_human_message(new_message)
+            use_messages = self.history
+
+        if new_message is not None and add_to_history:
+            self.history.add_message(new_message)
         return use_messages
     
     ############################# wrappers over model calls #############################
@@ -183,28 +686,33 @@ class Agent:
         tool_choice: ToolName | typing.Literal['auto', 'any'] | UnspecifiedType | None = UNSPECIFIED,
         receive_callback: typing.Callable[[AIMessageChunk], None] = None,
         do_print: bool = False,
+        coalesce: CoalescePolicy | None = None,
+        eager_tools: bool = False,
+        timings: PhaseTimings | None = None,
         **kwargs,
     ) -> StreamResult:
         '''Sends a message to be streamed back without storing the message as history.'''
+        if timings is None:
+            timings = self._start_timings('stream')
         self.history.check_tools_were_executed()
         model, tool_lookup = self.get_model_with_tools(
             tools = tools,
             toolkits = toolkits,
             tool_factories = tool_factories,
             tool_choice=tool_choice,
+            timings = timings,
+            messages = messages,
         )
 
-        if do_print and receive_callback is None:
-            receive_callback = lambda r: print(r.content, end='', flush=True)
-        elif do_print and receive_callback is not None:
-            receive_callback = lambda r: (print(r.content, end='', flush=True), receive_callback(r))
-        
         return StreamResult.from_message_iter(
-            message_iter = model.stream(messages, **kwargs),
+            message_iter = self._stream_model(model, messages, **kwargs),
             agent = self,
             tool_lookup=tool_lookup,
             add_reply_to_history = add_reply_to_history,
-            receive_callback=receive_callback,
+            receive_callback=self._get_receive_callback(receive_callback, do_print, coalesce is not None),
+            timings = timings,
+            coalesce = coalesce,
+            eager_tools = eager_tools,
         )
 
     def _invoke(
@@ -215,43 +723,282 @@ class Agent:
         toolkits: list[BaseToolkit] | None = None,
         tool_factories: ToolFactoryType | None = None,
         tool_choice: ToolName | typing.Literal['auto', 'any'] | UnspecifiedType | None = UNSPECIFIED,
+        timings: PhaseTimings | None = None,
         **kwargs,
     ) -> ChatResult:
         '''Invoke the model and return a chatresult object.'''
+        if timings is None:
+            timings = self._start_timings('invoke')
         self.history.check_tools_were_executed()
         model, tool_lookup = self.get_model_with_tools(
             tools = tools,
             toolkits = toolkits,
             tool_factories = tool_factories,
             tool_choice=tool_choice,
+            timings = timings,
+            messages = messages,
         )
-        return ChatResult.from_message(
-            message = model.invoke(messages, **kwargs),
+        with phase(timings, 'model'):
+            message = self._invoke_model(model, messages, **kwargs)
+        result = ChatResult.from_message(
+            message = message,
             agent = self,
             tool_lookup=tool_lookup,
             add_reply_to_history = add_reply_to_history,
             add_tool_calls_to_history = add_reply_to_history,
+            timings = timings,
         )
+        if timings is not None:
+            timings.submit()
+        return result
 
     def _invoke_structured_output(
         self, 
         messages: BaseMessage | str | list[BaseMessage] | list[str],
         output_structure: typing.Type[T],
         add_reply_to_history: bool = False,
+        timings: PhaseTimings | None = None,
         **kwargs,
     ) -> StructuredOutputResult[T]:
         '''Invoke the model and return a chatresult object.'''
+        if timings is None:
+            timings = self._start_timings('structured')
         self.history.check_tools_were_executed()
-        model = self.get_model_with_structured_output(
-            output_structure=output_structure,
-        )
-        return StructuredOutputResult.from_output(
-            output = model.invoke(messages, **kwargs),
+        with phase(timings, 'bind_tools'):
+            model = self.get_model_with_structured_output(
+                output_structure=output_structure,
+            )
+        with phase(timings, 'model'):
+            output = self._invoke_structured_model(model, messages, output_structure, **kwargs)
+
+        result = StructuredOutputResult.from_output(
+            output = output,
             agent = self,
             add_reply_to_history = add_reply_to_history,
+            timings = timings,
         )
+        if timings is not None:
+            timings.submit()
+        return result
 
     
+    ############################# async wrappers over model calls #############################
+    def _astream(
+        self, 
+        messages: BaseMessage | str | list[BaseMessage] | list[str],
+        add_reply_to_history: bool = False,
+        tools: list[BaseTool] | None = None,
+        toolkits: list[BaseToolkit] | None = None,
+        tool_factories: ToolFactoryType | None = None,
+        tool_choice: ToolName | typing.Literal['auto', 'any'] | UnspecifiedType | None = UNSPECIFIED,
+        receive_callback: typing.Callable[[AIMessageChunk], None] = None,
+        do_print: bool = False,
+        coalesce: CoalescePolicy | None = None,
+        eager_tools: bool = False,
+        timings: PhaseTimings | None = None,
+        **kwargs,
+    ) -> AsyncStreamResult:
+        '''Sends a message to be streamed back asynchronously. The request is sent on first iteration.'''
+        if timings is None:
+            timings = self._start_timings('stream')
+        self.history.check_tools_were_executed()
+        model, tool_lookup = self.get_model_with_tools(
+            tools = tools,
+            toolkits = toolkits,
+            tool_factories = tool_factories,
+            tool_choice=tool_choice,
+            timings = timings,
+            messages = messages,
+        )
+        return AsyncStreamResult.from_message_aiter(
+            message_aiter = self._astream_model(model, messages, **kwargs),
+            agent = self,
+            tool_lookup=tool_lookup,
+            add_reply_to_history = add_reply_to_history,
+            receive_callback=self._get_receive_callback(receive_callback, do_print, coalesce is not None),
+            timings = timings,
+            coalesce = coalesce,
+            eager_tools = eager_tools,
+        )
+
+    async def _ainvoke(
+        self, 
+        messages: BaseMessage | str | list[BaseMessage] | list[str],
+        add_reply_to_history: bool = False,
+        tools: list[BaseTool] | None = None,
+        toolkits: list[BaseToolkit] | None = None,
+        tool_factories: ToolFactoryType | None = None,
+        tool_choice: ToolName | typing.Literal['auto', 'any'] | UnspecifiedType | None = UNSPECIFIED,
+        timings: PhaseTimings | None = None,
+        **kwargs,
+    ) -> ChatResult:
+        '''Invoke the model asynchronously and return a chatresult object.'''
+        if timings is None:
+            timings = self._start_timings('invoke')
+        self.history.check_tools_were_executed()
+        model, tool_lookup = self.get_model_with_tools(
+            tools = tools,
+            toolkits = toolkits,
+            tool_factories = tool_factories,
+            tool_choice=tool_choice,
+            timings = timings,
+            messages = messages,
+        )
+        with phase(timings, 'model'):
+            message = await self._ainvoke_model(model, messages, **kwargs)
+        result = ChatResult.from_message(
+            message = message,
+            agent = self,
+            tool_lookup=tool_lookup,
+            add_reply_to_history = add_reply_to_history,
+            add_tool_calls_to_history = add_reply_to_history,
+            timings = timings,
+        )
+        if timings is not None:
+            timings.submit()
+        return result
+
+    async def _ainvoke_structured_output(
+        self, 
+        messages: BaseMessage | str | list[BaseMessage] | list[str],
+        output_structure: typing.Type[T],
+        add_reply_to_history: bool = False,
+        timings: PhaseTimings | None = None,
+        **kwargs,
+    ) -> StructuredOutputResult[T]:
+        '''Invoke the structured output model asynchronously and return a result object.'''
+        if timings is None:
+            timings = self._start_timings('structured')
+        self.history.check_tools_were_executed()
+        with phase(timings, 'bind_tools'):
+            model = self.get_model_with_structured_output(
+                output_structure=output_structure,
+            )
+        with phase(timings, 'model'):
+            output = await self._ainvoke_structured_model(model, messages, output_structure, **kwargs)
+
+        result = StructuredOutputResult.from_output(
+            output = output,
+            agent = self,
+            add_reply_to_history = add_reply_to_history,
+            timings = timings,
+        )
+        if timings is not None:
+            timings.submit()
+        return result
+
+    ############################# model calls with response caching #############################
+    def _invoke_model(self, model: BaseChatModel, messages: list[BaseMessage], **kwargs) -> AIMessage:
+        '''Call model.invoke, using the response cache if one is attached.'''
+        if self.response_cache is None:
+            return model.invoke(messages, **kwargs)
+        key = self.response_cache.make_key(model, messages, **kwargs)
+        message = self.response_cache.get_message(key)
+        if message is None:
+            message = model.invoke(messages, **kwargs)
+            self.response_cache.put_message(key, message)
+        return message
+
+    async def _ainvoke_model(self, model: BaseChatModel, messages: list[BaseMessage], **kwargs) -> AIMessage:
+        '''Call model.ainvoke, using the response cache if one is attached.'''
+        if self.response_cache is None:
+            return await model.ainvoke(messages, **kwargs)
+        key = self.response_cache.make_key(model, messages, **kwargs)
+        message = self.response_cache.get_message(key)
+        if message is None:
+            message = await model.ainvoke(messages, **kwargs)
+            self.response_cache.put_message(key, message)
+        return message
+
+    def _stream_model(self, model: BaseChatModel, messages: list[BaseMessage], **kwargs) -> typing.Iterator[AIMessageChunk]:
+        '''Call model.stream, replaying a cached response as a single chunk on a cache hit.'''
+        if self.response_cache is None:
+            yield from model.stream(messages, **kwargs)
+            return
+        key = self.response_cache.make_key(model, messages, **kwargs)
+        message = self.response_cache.get_message(key)
+        if message is not None:
+            yield message_to_chunk(message)
+            return
+        chunks = list()
+        for chunk in model.stream(messages, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        if len(chunks):
+            self.response_cache.put_message(key, add_ai_message_chunks(chunks[0], *chunks[1:]))
+
+    async def _astream_model(self, model: BaseChatModel, messages: list[BaseMessage], **kwargs) -> typing.AsyncIterator[AIMessageChunk]:
+        '''Call model.astream, replaying a cached response as a single chunk on a cache hit.'''
+        if self.response_cache is None:
+            async for chunk in model.astream(messages, **kwargs):
+                yield chunk
+            return
+        key = self.response_cache.make_key(model, messages, **kwargs)
+        message = self.response_cache.get_message(key)
+        if message is not None:
+            yield message_to_chunk(message)
+            return
+        chunks = list()
+        async for chunk in model.astream(messages, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        if len(chunks):
+            self.response_cache.put_message(key, add_ai_message_chunks(chunks[0], *chunks[1:]))
+
+    def _invoke_structured_model(self, model: BaseChatModel, messages: list[BaseMessage], output_structure: typing.Type[T], **kwargs) -> T:
+        '''Call the structured output model, using the response cache if one is attached.'''
+        if self.response_cache is None:
+            return model.invoke(messages, **kwargs)
+        key = self._structured_cache_key(messages, output_structure, **kwargs)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return output_structure.model_validate_json(cached)
+        output = model.invoke(messages, **kwargs)
+        self.response_cache.put(key, output.model_dump_json())
+        return output
+
+    async def _ainvoke_structured_model(self, model: BaseChatModel, messages: list[BaseMessage], output_structure: typing.Type[T], **kwargs) -> T:
+        '''Async version of _invoke_structured_model.'''
+        if self.response_cache is None:
+            return await model.ainvoke(messages, **kwargs)
+        key = self._structured_cache_key(messages, output_structure, **kwargs)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return output_structure.model_validate_json(cached)
+        output = await model.ainvoke(messages, **kwargs)
+        self.response_cache.put(key, output.model_dump_json())
+        return output
+
+    def _structured_cache_key(self, messages: list[BaseMessage], output_structure: typing.Type[pydantic.BaseModel], **kwargs) -> str:
+        return self.response_cache.make_key(
+            self._model, 
+            messages, 
+            output_structure = output_structure.model_json_schema(), 
+            **kwargs,
+        )
+
+    def _start_timings(self, kind: str) -> PhaseTimings | None:
+        '''Start timing a call, or return None if instrumentation is disabled.'''
+        if self.timer is None:
+            return None
+        return self.timer.start(kind)
+
+    @staticmethod
+    def _get_receive_callback(
+        receive_callback: typing.Callable[[AIMessageChunk], None] | None,
+        do_print: bool,
+        coalesced: bool = False,
+    ) -> typing.Callable[[AIMessageChunk], None] | typing.Callable[[str], None] | None:
+        '''Combine the do_print option with the user-provided callback.
+            Coalesced callbacks receive batches of text rather than chunks.
+        '''
+        print_fn = print_text if coalesced else (lambda r: print(r.content, end='', flush=True))
+        if do_print and receive_callback is None:
+            return print_fn
+        elif do_print and receive_callback is not None:
+            return lambda r: (print_fn(r), receive_callback(r))
+        return receive_callback
+
     ############################# access model with tools #############################
     @property
     def model(self) -> BaseChatModel:
@@ -265,6 +1012,8 @@ class Agent:
         toolkits: list[BaseToolkit] | None = None,
         tool_factories: ToolFactoryType | None = None,
         tool_choice: ToolName | typing.Literal['auto', 'any'] | None | UnspecifiedType = UNSPECIFIED,
+        timings: PhaseTimings | None = None,
+        messages: BaseMessage | str | list[BaseMessage] | list[str] | None = None,
     ) -> tuple[BaseChatModel, ToolLookup]:
         '''Bind tools to the model and return the resulting chain.
         Args:
@@ -272,17 +1021,60 @@ class Agent:
             toolkits: toolkits to bind to the model.
             tool_factories: tool factories to bind to the model.
             tool_choice: how to choose the tools to bind to the model.
+            messages: messages about to be sent. Used by the toolset's tool_selector, if any.
         '''
-        toolset = self.toolset.merge_tools(
-            tools = tools,
-            toolkits = toolkits,
-            tool_factories = tool_factories,
-            tool_choice=tool_choice,
-        )
+        with phase(timings, 'merge_tools'):
+            toolset = self.toolset.merge_tools(
+                tools = tools,
+                toolkits = toolkits,
+                tool_factories = tool_factories,
+                tool_choice=tool_choice,
+            )
 
-        model, tool_lookup = toolset.bind_tools(agent=self)
+        query = query_from_messages(messages) if messages is not None and toolset.tool_selector is not None else None
+        model, tool_lookup = toolset.bind_tools(agent=self, binding_cache=self.binding_cache, timings=timings, query=query)
         
         return model, tool_lookup
+
+    @property
+    def tool_executor(self) -> concurrent.futures.Executor:
+        '''Executor used to run tool calls that are dispatched while a response is still streaming.
+            Created on first use. Each agent (including clones) has its own, shut down by close().
+        '''
+        if self._tool_executor is None:
+            self._tool_executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix='simplechatbot-tools')
+            self._owns_tool_executor = True
+        return self._tool_executor
+
+    def close(self) -> None:
+        '''Shut down the tool executor if this agent created it, waiting for running tool calls.
+            The agent can still be used afterwards; a new executor is created if needed.
+        Example:
+            with OpenAIAgent.new(tools=tools) as agent:
+                agent.stream('Look this up.', eager_tools=True).collect().execute_tools()
+        '''
+        executor, owned = self._tool_executor, self._owns_tool_executor
+        self._tool_executor, self._owns_tool_executor = None, False
+        if executor is not None and owned:
+            executor.shutdown(wait=True)
+
+    def __enter__(self) -> typing.Self:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def invalidate_binding_cache(self) -> None:
+        '''Drop cached tool bindings. Call after mutating tools in the toolset in-place.'''
+        self.binding_cache.invalidate()
+
+    def invalidate_tool_factories(self, factory: ToolFactoryType | None = None) -> None:
+        '''Call tool factories again on the next turn. Use when the state a factory depends on has changed.
+        Args:
+            factory: only invalidate this factory. If None, invalidate all factories.
+        '''
+        if self.factory_cache is not None:
+            self.factory_cache.invalidate(factory)
     
     def get_model_with_structured_output(
         self, 
@@ -313,8 +1105,77 @@ class Agent:
             _model = model_transform(self._model) if model_transform is not None else self._model,
             history = self.history.empty(keep_system_prompt=keep_system_prompt) if clear_history else self.history.clone(),
             toolset = self.toolset.empty() if clear_tools else self.toolset.clone(),
+            binding_cache = self.binding_cache, # keyed on model identity, so safe to share
+            context_window = self.context_window,
+            response_cache = self.response_cache,
+            timer = self.timer,
+            tool_cache = self.tool_cache,
+            tool_runner = self.tool_runner,
+            factory_cache = ToolFactoryCache() if self.factory_cache is not None else None, # factories are called with the agent, so not shared
         )
 
+    ############################# branching #############################
+    def checkpoint(self, label: str | None = None) -> Checkpoint:
+        '''Save the current point in the conversation so it can be branched from later.
+            The agent's history object is never replaced. If it is a SharedMessageHistory the checkpoint
+            is O(1); otherwise the message list is copied once into a shared snapshot (the messages
+            themselves are not copied), and all branches from that checkpoint share its storage.
+            Call enable_shared_history() first to make repeated checkpoints O(1).
+        Args:
+            label: optional name, for bookkeeping.
+        '''
+        if isinstance(self.history, SharedMessageHistory):
+            return Checkpoint(history=self.history.clone(), label=label)
+        return Checkpoint(history=SharedMessageHistory(self.history), label=label)
+
+    def enable_shared_history(self) -> SharedMessageHistory:
+        '''Replace the history with a SharedMessageHistory holding the same messages, so checkpoints
+            and branches are O(1). This rebinds agent.history: code holding the old history object
+            (including agents it was shared with) will no longer see new messages.
+        Returns:
+            The new history.
+        '''
+        if not isinstance(self.history, SharedMessageHistory):
+            self.history = SharedMessageHistory(self.history)
+        return self.history
+
+    def branch(self, from_checkpoint: Checkpoint | None = None) -> typing.Self:
+        '''Create an agent that continues from a checkpoint (or from now), sharing message storage with this one.
+            Everything other than history is cloned as in clone().
+        Example:
+            checkpoint = agent.checkpoint()
+            branches = [agent.branch(checkpoint) for _ in range(8)]
+            replies = [b.chat('What happens next?') for b in branches]
+        '''
+        if from_checkpoint is None:
+            from_checkpoint = self.checkpoint()
+        new_agent = self.clone(clear_history=True)
+        new_agent.history = from_checkpoint.history.clone()
+        return new_agent
+
+    def rewind(self, n: int = 1) -> list[BaseMessage]:
+        '''Remove the last n turns (each starting at a human message) from the history.
+            For shared histories the cost is proportional to the number of removed messages,
+            because only the end of the view moves.
+        Returns:
+            The removed messages.
+        '''
+        if n < 1:
+            return []
+        num_humans = 0
+        start = None
+        for i, message in zip(range(len(self.history) - 1, -1, -1), reversed(self.history)):
+            if isinstance(message, HumanMessage):
+                num_humans += 1
+                if num_humans == n:
+                    start = i
+                    break
+        if start is None:
+            raise ValueError(f'Cannot rewind {n} turns: the history only has {num_humans} human messages.')
+        removed = self.history[start:]
+        del self.history[start:]
+        return removed
+
     def new_agent_from_model(
         self, 
         system_prompt: typing.Optional[str] = None,
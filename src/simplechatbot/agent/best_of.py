@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import asyncio
+import concurrent.futures
+import inspect
+import time
+
+import pydantic
+from langchain_core.messages import AIMessage, BaseMessage
+
+if typing.TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from .agent import Agent
+    from .chatresult import ChatResult
+
+Scorer = typing.Callable[[AIMessage], float | typing.Awaitable[float]]
+BestOfStopReason = typing.Literal['complete', 'threshold']
+
+
+@dataclasses.dataclass
+class ScoredCandidate:
+    '''One sampled reply and its score.'''
+    index: int
+    message: AIMessage
+    score: float
+    elapsed: float
+
+    @property
+    def content(self) -> str | list[str | dict]:
+        return self.message.content
+
+
+@dataclasses.dataclass(repr=False)
+class BestOfResult:
+    '''Outcome of Agent.chat_best_of: the winning reply plus every candidate that finished.
+    Args:
+        result: ChatResult for the winning reply (added to history if add_to_history was set).
+        candidates: scored candidates in the order they finished.
+        num_cancelled: requests cancelled (or abandoned) after the threshold was met.
+        num_failed: requests that raised an exception.
+        stop_reason: 'threshold' if sampling stopped early, otherwise 'complete'.
+    '''
+    result: ChatResult
+    candidates: list[ScoredCandidate]
+    num_cancelled: int = 0
+    num_failed: int = 0
+    stop_reason: BestOfStopReason = 'complete'
+
+    @property
+    def best(self) -> ScoredCandidate:
+        return max(self.candidates, key=lambda c: c.score)
+
+    @property
+    def content(self) -> str | list[str | dict]:
+        return self.result.content
+
+    @property
+    def scores(self) -> list[float]:
+        return [c.score for c in self.candidates]
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(best_score={self.best.score}, num_candidates={len(self.candidates)}, stop_reason={self.stop_reason!r})'
+
+
+############################# judge #############################
+class JudgeScore(pydantic.BaseModel):
+    '''Score for a candidate reply.'''
+    reasoning: str = pydantic.Field(description='Brief justification for the score.')
+    score: float = pydantic.Field(description='Score from 0 (worst) to 10 (best).')
+
+
+@dataclasses.dataclass
+class StructuredJudge:
+    '''Scorer that asks a judge agent to rate each candidate using structured output.
+        The judge's history is never modified, so one judge can score candidates concurrently.
+    Example:
+        judge = StructuredJudge(agent.clone(clear_history=True), instructions='Prefer concise, correct answers.')
+        best = agent.chat_best_of('Explain recursion.', n=4, scorer=judge, threshold=9)
+    '''
+    agent: Agent
+    instructions: str = 'Rate how helpful, correct, and clear the reply is.'
+
+    def prompt(self, message: AIMessage) -> str:
+        return f'{self.instructions}\n\nReply to rate:\n{message.content}'
+
+    def __call__(self, message: AIMessage) -> float:
+        return self.agent.chat_structured(self.prompt(message), output_structure=JudgeScore, add_to_history=False).data.score
+
+    async def ascore(self, message: AIMessage) -> float:
+        result = await self.agent.achat_structured(self.prompt(message), output_structure=JudgeScore, add_to_history=False)
+        return result.data.score
+
+
+############################# sampling #############################
+def _check_sampling_args(n: int, max_concurrency: int | None) -> None:
+    if n < 1:
+        raise ValueError(f'n must be at least 1, got {n}.')
+    if max_concurrency is not None and max_concurrency < 1:
+        raise ValueError(f'max_concurrency must be at least 1 (or None for n), got {max_concurrency}.')
+
+
+def sample_best_of(
+    model: BaseChatModel,
+    messages: list[BaseMessage],
+    n: int,
+    scorer: Scorer,
+    threshold: float | None = None,
+    max_concurrency: int | None = None,
+) -> tuple[list[ScoredCandidate], int, int, BestOfStopReason]:
+    '''Request and score n replies in worker threads, stopping once one scores at least `threshold`.
+        Requests that have not started are cancelled; running ones finish in the background.
+    Returns:
+        (candidates, num_cancelled, num_failed, stop_reason)
+    '''
+    _check_sampling_args(n, max_concurrency)
+    def sample(index: int) -> ScoredCandidate:
+        start = time.perf_counter()
+        message = model.invoke(messages)
+        return ScoredCandidate(index=index, message=message, score=scorer(message), elapsed=time.perf_counter() - start)
+
+    candidates, errors = list(), list()
+    stop_reason = 'complete'
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency or n, thread_name_prefix='simplechatbot-best-of')
+    try:
+        futures = [executor.submit(sample, i) for i in range(n)]
+        for future in concurrent.futures.as_completed(futures):
+            if future.exception() is not None:
+                errors.append(future.exception())
+                continue
+            candidates.append(future.result())
+            if threshold is not None and candidates[-1].score >= threshold:
+                stop_reason = 'threshold'
+                break
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if len(candidates) == 0:
+        raise errors[-1]
+    return candidates, n - len(candidates) - len(errors), len(errors), stop_reason
+
+
+async def asample_best_of(
+    model: BaseChatModel,
+    messages: list[BaseMessage],
+    n: int,
+    scorer: Scorer,
+    threshold: float | None = None,
+    max_concurrency: int | None = None,
+) -> tuple[list[ScoredCandidate], int, int, BestOfStopReason]:
+    '''Async version of sample_best_of. Outstanding requests are cancelled once the threshold is met.'''
+    _check_sampling_args(n, max_concurrency)
+    semaphore = asyncio.Semaphore(max_concurrency or n)
+    score_func = getattr(scorer, 'ascore', scorer)
+
+    async def sample(index: int) -> ScoredCandidate:
+        async with semaphore:
+            start = time.perf_counter()
+            message = await model.ainvoke(messages)
+            score = score_func(message)
+            if inspect.isawaitable(score):
+                score = await score
+            return ScoredCandidate(index=index, message=message, score=score, elapsed=time.perf_counter() - start)
+
+    candidates, errors = list(), list()
+    stop_reason = 'complete'
+    tasks = [asyncio.ensure_future(sample(i)) for i in range(n)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                candidates.append(await next_done)
+            except Exception as e:
+                errors.append(e)
+                continue
+            if threshold is not None and candidates[-1].score >= threshold:
+                stop_reason = 'threshold'
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if len(candidates) == 0:
+        raise errors[-1]
+    return candidates, n - len(candidates) - len(errors), len(errors), stop_reason
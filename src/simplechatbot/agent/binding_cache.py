@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import collections
+import hashlib
+import json
+import threading
+
+if typing.TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.tools import BaseTool
+    from .toolset import ToolLookup
+
+
+@dataclasses.dataclass
+class BindingCacheStats:
+    '''Hit/miss counts for a ModelBindingCache.'''
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+@dataclasses.dataclass
+class _BindingEntry:
+    model: BaseChatModel # reference kept so id(model) cannot be reused while cached
+    bound_model: BaseChatModel
+
+
+@dataclasses.dataclass(repr=False)
+class ModelBindingCache:
+    '''Caches the result of model.bind_tools() so it is not recomputed every turn.
+        Entries are keyed by a fingerprint of (model identity, tool names/descriptions/schemas, tool_choice),
+        so changing tools or tool_choice naturally produces a miss. Call invalidate() after mutating
+        tools in place (e.g. changing a description on an existing tool object).
+    '''
+    maxsize: int = 32
+    max_tool_fingerprints: int = 1024
+    _entries: collections.OrderedDict[tuple, _BindingEntry] = dataclasses.field(default_factory=collections.OrderedDict)
+    _tool_fingerprints: dict[int, tuple[BaseTool, str]] = dataclasses.field(default_factory=dict)
+    _stats: BindingCacheStats = dataclasses.field(default_factory=BindingCacheStats)
+    _lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+    def bind_tools(
+        self,
+        model: BaseChatModel,
+        tool_lookup: ToolLookup,
+        tool_choice: str | None = None,
+    ) -> BaseChatModel:
+        '''Get the model with tools bound to it, binding only if there is no cached version.'''
+        key = self.fingerprint(model, tool_lookup, tool_choice)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.model is model:
+                self._entries.move_to_end(key)
+                self._stats.hits += 1
+                return entry.bound_model
+            self._stats.misses += 1
+
+        if tool_choice is None:
+            bound_model = model.bind_tools(tool_lookup.tool_list())
+        else:
+            bound_model = model.bind_tools(tool_lookup.tool_list(), tool_choice=tool_choice)
+
+        with self._lock:
+            self._entries[key] = _BindingEntry(model=model, bound_model=bound_model)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return bound_model
+
+    ############################# fingerprinting #############################
+    def fingerprint(
+        self,
+        model: BaseChatModel,
+        tool_lookup: ToolLookup,
+        tool_choice: str | None = None,
+    ) -> tuple[int, str, str]:
+        '''Get a stable key for the (model, tools, tool_choice) combination.'''
+        tool_fps = sorted(self.tool_fingerprint(t) for t in tool_lookup.tool_list())
+        tools_digest = hashlib.sha1('\n'.join(tool_fps).encode()).hexdigest()
+        return (id(model), tools_digest, repr(tool_choice))
+
+    def tool_fingerprint(self, tool: BaseTool) -> str:
+        '''Get the fingerprint of a single tool. Memoized by tool identity because computing
+            the json schema is the expensive part of binding.
+        '''
+        with self._lock:
+            cached = self._tool_fingerprints.get(id(tool))
+            if cached is not None and cached[0] is tool:
+                return cached[1]
+
+        fp = hashlib.sha1(json.dumps(
+            [tool.name, tool.description, tool.args],
+            sort_keys=True,
+            default=str,
+        ).encode()).hexdigest()
+
+        with self._lock:
+            if len(self._tool_fingerprints) >= self.max_tool_fingerprints:
+                self._tool_fingerprints.clear()
+            self._tool_fingerprints[id(tool)] = (tool, fp)
+        return fp
+
+    ############################# invalidation and stats #############################
+    def invalidate(self) -> None:
+        '''Drop all cached bindings and tool fingerprints.'''
+        with self._lock:
+            self._entries.clear()
+            self._tool_fingerprints.clear()
+            self._stats.invalidations += 1
+
+    def stats(self) -> BindingCacheStats:
+        '''Get a snapshot of the hit/miss counts.'''
+        with self._lock:
+            return dataclasses.replace(self._stats, size=len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        s = self.stats()
+        return f'{self.__class__.__name__}(size={s.size}, hits={s.hits}, misses={s.misses})'
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import sys
+import time
+
+from .shared_history import SharedMessageHistory
+
+if typing.TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+    from .message_history import MessageHistory
+
+
+@dataclasses.dataclass(frozen=True, repr=False)
+class Checkpoint:
+    '''A saved point in an agent's conversation. Created by Agent.checkpoint().
+        Holds an O(1) snapshot of the history that shares messages with the agent and its branches.
+    '''
+    history: SharedMessageHistory
+    label: str | None = None
+    created_at: float = dataclasses.field(default_factory=time.time)
+
+    def __len__(self) -> int:
+        return len(self.history)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(label={self.label!r}, num_messages={len(self)})'
+
+
+@dataclasses.dataclass
+class HistoryFootprint:
+    '''Approximate memory used by a group of histories, counting shared objects once.
+        Sizes are shallow (sys.getsizeof of each object and its direct attributes), so they are
+        meant for comparing storage strategies rather than as exact totals.
+    Args:
+        num_histories: number of histories measured.
+        total_messages: sum of history lengths.
+        unique_messages: number of distinct message objects across all histories.
+        message_bytes: size of the distinct message objects.
+        container_bytes: size of the histories themselves (lists, segments, indexes).
+    '''
+    num_histories: int = 0
+    total_messages: int = 0
+    unique_messages: int = 0
+    message_bytes: int = 0
+    container_bytes: int = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self.message_bytes + self.container_bytes
+
+    @property
+    def sharing_ratio(self) -> float:
+        '''Messages referenced per distinct message (1.0 means nothing is shared).'''
+        return self.total_messages / self.unique_messages if self.unique_messages > 0 else 1.0
+
+
+def history_footprint(histories: typing.Iterable[MessageHistory]) -> HistoryFootprint:
+    '''Measure the memory used by a group of histories, e.g. to compare N branches against N clones.
+    Example:
+        checkpoint = agent.checkpoint()
+        branches = history_footprint(agent.branch(checkpoint).history for _ in range(100))
+    '''
+    footprint = HistoryFootprint()
+    seen: dict[int, typing.Any] = dict() # keeps objects alive so ids are not reused
+    for history in histories:
+        footprint.num_histories += 1
+        footprint.total_messages += len(history)
+        footprint.container_bytes += sys.getsizeof(history) + sys.getsizeof(history._pending_tool_ids) + sys.getsizeof(history._executed_tool_ids)
+        if isinstance(history, SharedMessageHistory):
+            for segment, _ in history._chain():
+                if id(segment) not in seen:
+                    seen[id(segment)] = segment
+                    footprint.container_bytes += sys.getsizeof(segment) + sys.getsizeof(segment.messages) + sys.getsizeof(segment.tool_calls) + sys.getsizeof(segment.tool_results)
+        for message in history:
+            if id(message) not in seen:
+                seen[id(message)] = message
+                footprint.unique_messages += 1
+                footprint.message_bytes += message_size(message)
+    return footprint
+
+
+def message_size(message: BaseMessage) -> int:
+    '''Shallow size of a message and its field values.'''
+    return sys.getsizeof(message) + sum(sys.getsizeof(v) for v in vars(message).values())
@@ -2,18 +2,40 @@ from __future__ import annotations
 
 import typing
 import dataclasses
+import asyncio
+import concurrent.futures
+import json
 import pydantic
 import tqdm
 
-from .message_history import AIMessage, AIMessageChunk
+from .message_history import AIMessage, AIMessageChunk, add_ai_message_chunks
 
 if typing.TYPE_CHECKING:
     from .agent import Agent
 
 from .toolset import ToolCallInfo, ToolCallResult, ToolLookup
+from .errors import UknownToolError
+from .types import ToolCallID
+from .timing import PhaseTimings
+from .stream_metrics import StreamMetrics, StreamStats
+from .coalesce import CoalescePolicy, TextCoalescer, print_text
 
 
 
+def _check_dispatched(tool_call_id: ToolCallID, future: concurrent.futures.Future | asyncio.Future) -> None:
+    '''Tool calls dispatched by an AsyncStreamResult run on an event loop, so a sync caller cannot wait for them.'''
+    if isinstance(future, asyncio.Future) and not future.done():
+        raise ValueError(
+            f'Tool call {tool_call_id} was started on an event loop while streaming and has not finished. '
+            'Use `await result.aexecute_tools()` to wait for it.'
+        )
+
+
+def _dispatched_result(tool_call_id: ToolCallID, future: concurrent.futures.Future | asyncio.Future) -> ToolCallResult:
+    _check_dispatched(tool_call_id, future)
+    return future.result()
+
+
 class ChatResultBase:
     '''Base class for chat results.'''
 
@@ -23,16 +45,111 @@ class ChatResultBase:
         tool_lookup: ToolLookup,
         message: AIMessage,
         add_to_history: bool,
-    ) -> dict[str, ToolCallResult]:
-        '''Actually execute tool calls and add results to history if requested.'''
-        results: dict[str,ToolCallResult] = dict()
-        for tool_info_dict in message.tool_calls:
-            tool_info = tool_lookup.get_tool_info(tool_info_dict)
-            result = tool_info.execute(agent, add_to_history=add_to_history)
-            results[tool_info.name] = result
+        parallel: bool = False,
+        max_concurrency: int | None = None,
+        timings: PhaseTimings | None = None,
+        dispatched: dict[ToolCallID, concurrent.futures.Future[ToolCallResult]] | None = None,
+    ) -> dict[ToolCallID, ToolCallResult]:
+        '''Actually execute tool calls and add results to history if requested.
+        Args:
+            parallel: run the tool calls concurrently in a thread pool.
+            max_concurrency: maximum number of tools to run at once when parallel=True.
+            timings: if provided, record the time taken by each tool.
+            dispatched: futures for tool calls that are already running (eager dispatch while streaming).
+        '''
+        dispatched = dispatched if dispatched is not None else dict()
+        tool_infos = [tool_lookup.get_tool_info(tc) for tc in message.tool_calls]
+        results: dict[ToolCallID,ToolCallResult] = dict()
+        if not parallel or len(tool_infos) <= 1:
+            for tool_info in tool_infos:
+                if tool_info.id in dispatched:
+                    result = _dispatched_result(tool_info.id, dispatched[tool_info.id])
+                    if add_to_history:
+                        agent.history.add_tool_message(result.return_value, result.id, status=result.status)
+                else:
+                    result = tool_info.execute(agent, add_to_history=add_to_history, timings=timings)
+                results[tool_info.id] = result
+            return results
+
+        for ti in tool_infos:
+            if ti.id in dispatched:
+                _check_dispatched(ti.id, dispatched[ti.id])
+        max_workers = max_concurrency if max_concurrency is not None else len(tool_infos)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                dispatched[ti.id] if ti.id in dispatched else executor.submit(ti.execute, agent, add_to_history=False, timings=timings)
+                for ti in tool_infos
+            ]
+            # append in original tool call order regardless of completion order
+            for future in futures:
+                result = future.result()
+                if add_to_history:
+                    agent.history.add_tool_message(result.return_value, result.id, status=result.status)
+                results[result.id] = result
+        
+        return results
+
+    @staticmethod
+    async def _ahandle_tool_calls(
+        agent: Agent,
+        tool_lookup: ToolLookup,
+        message: AIMessage,
+        add_to_history: bool,
+        parallel: bool = False,
+        max_concurrency: int | None = None,
+        timings: PhaseTimings | None = None,
+        dispatched: dict[ToolCallID, asyncio.Task[ToolCallResult]] | None = None,
+    ) -> dict[ToolCallID, ToolCallResult]:
+        '''Async version of _handle_tool_calls: awaits each tool using BaseTool.ainvoke.
+            When parallel=True, tools are run concurrently using asyncio.gather.
+        '''
+        dispatched = dispatched if dispatched is not None else dict()
+        tool_infos = [tool_lookup.get_tool_info(tc) for tc in message.tool_calls]
+        results: dict[ToolCallID,ToolCallResult] = dict()
+        if not parallel or len(tool_infos) <= 1:
+            for tool_info in tool_infos:
+                if tool_info.id in dispatched:
+                    result = await asyncio.wrap_future(dispatched[tool_info.id])
+                    if add_to_history:
+                        agent.history.add_tool_message(result.return_value, result.id, status=result.status)
+                else:
+                    result = await tool_info.aexecute(agent, add_to_history=add_to_history, timings=timings)
+                results[tool_info.id] = result
+            return results
+
+        semaphore = asyncio.Semaphore(max_concurrency if max_concurrency is not None else len(tool_infos))
+        async def run_tool(tool_info: ToolCallInfo) -> ToolCallResult:
+            if tool_info.id in dispatched:
+                return await asyncio.wrap_future(dispatched[tool_info.id])
+            async with semaphore:
+                return await tool_info.aexecute(agent, add_to_history=False, timings=timings)
+
+        outputs = await asyncio.gather(*[run_tool(ti) for ti in tool_infos], return_exceptions=True)
+        for output in outputs:
+            if isinstance(output, BaseException):
+                raise output
+            if add_to_history:
+                agent.history.add_tool_message(output.return_value, output.id, status=output.status)
+            results[output.id] = output
         
         return results
 
+    def _get_tool_timings(self) -> PhaseTimings | None:
+        '''Tool timings are shared by eagerly dispatched calls and those run from execute_tools.'''
+        if self._tool_timings is None:
+            self._tool_timings = self.agent._start_timings('tools')
+        return self._tool_timings
+
+    def _finish_tool_timings(self, tool_timings: PhaseTimings | None) -> None:
+        '''Submit tool timings and add them to the timings of this result.'''
+        self._tool_timings = None
+        if tool_timings is None:
+            return
+        tool_timings.submit()
+        if self.timings is not None:
+            for name, seconds in tool_timings.phases.items():
+                self.timings.add(name, seconds)
+
 @dataclasses.dataclass(repr=False)
 class ChatResult(ChatResultBase):
     '''AI reply and results of any tool calls.'''
@@ -40,6 +157,10 @@ class ChatResult(ChatResultBase):
     agent: Agent
     tool_lookup: ToolLookup
     add_tool_calls_to_history: bool
+    timings: PhaseTimings | None = None
+    stream_stats: StreamStats | None = None
+    _dispatched: dict[ToolCallID, typing.Any] = dataclasses.field(default_factory=dict)
+    _tool_timings: PhaseTimings | None = None
 
     @classmethod
     def from_message(
@@ -48,7 +169,11 @@ class ChatResult(ChatResultBase):
         agent: Agent,
         tool_lookup: ToolLookup,
         add_reply_to_history: bool,
-        add_tool_calls_to_history: bool
+        add_tool_calls_to_history: bool,
+        timings: PhaseTimings | None = None,
+        stream_stats: StreamStats | None = None,
+        dispatched: dict[ToolCallID, typing.Any] | None = None,
+        tool_timings: PhaseTimings | None = None,
     ) -> typing.Self:
         '''Create a chat stream from a message iterator.'''
         if add_reply_to_history:
@@ -59,18 +184,54 @@ class ChatResult(ChatResultBase):
             agent=agent,
             tool_lookup = tool_lookup,
             add_tool_calls_to_history=add_tool_calls_to_history,
+            timings = timings,
+            stream_stats = stream_stats,
+            _dispatched = dispatched if dispatched is not None else dict(),
+            _tool_timings = tool_timings,
         )
 
 
     def execute_tools(self, 
-    ) -> dict[str, ToolCallResult]:
-        '''Call tools on the full message.'''
-        return self._handle_tool_calls(
+        parallel: bool = False,
+        max_concurrency: int | None = None,
+    ) -> dict[ToolCallID, ToolCallResult]:
+        '''Call tools on the full message. Results are keyed by tool call id.
+        Args:
+            parallel: run the tool calls concurrently. Tool messages are still added to history in call order.
+            max_concurrency: maximum number of tools to run at once when parallel=True.
+        '''
+        tool_timings = self._get_tool_timings()
+        results = self._handle_tool_calls(
             agent=self.agent, 
             tool_lookup = self.tool_lookup,
             message=self.message, 
             add_to_history=self.add_tool_calls_to_history, 
+            parallel=parallel,
+            max_concurrency=max_concurrency,
+            timings=tool_timings,
+            dispatched=self._dispatched,
         )
+        self._finish_tool_timings(tool_timings)
+        return results
+
+    async def aexecute_tools(self, 
+        parallel: bool = False,
+        max_concurrency: int | None = None,
+    ) -> dict[ToolCallID, ToolCallResult]:
+        '''Call tools on the full message asynchronously.'''
+        tool_timings = self._get_tool_timings()
+        results = await self._ahandle_tool_calls(
+            agent=self.agent, 
+            tool_lookup = self.tool_lookup,
+            message=self.message, 
+            add_to_history=self.add_tool_calls_to_history, 
+            parallel=parallel,
+            max_concurrency=max_concurrency,
+            timings=tool_timings,
+            dispatched=self._dispatched,
+        )
+        self._finish_tool_timings(tool_timings)
+        return results
     
     @property
     def tool_calls(self) -> list[ToolCallInfo]:
@@ -91,17 +252,141 @@ class ChatResult(ChatResultBase):
 
 
 
+class StreamResultBase(ChatResultBase):
+    '''Shared chunk accumulation for sync and async stream results.
+        Chunks are buffered in a list and merged in a single pass when full_message is requested,
+        rather than adding each AIMessageChunk to a running total (which is quadratic in the output length).
+    '''
+    chunks: list[AIMessageChunk]
+    exhausted: bool
+    timings: PhaseTimings | None
+    metrics: StreamMetrics
+    coalescer: TextCoalescer | None
+    eager_tools: bool
+    _full_message: AIMessageChunk | None
+    _num_merged: int
+    _partial_tool_calls: dict[int | str, dict[str, typing.Any]]
+    _dispatched: dict[ToolCallID, typing.Any]
+    _tool_timings: PhaseTimings | None
+
+    @property
+    def full_message(self) -> AIMessageChunk:
+        '''The message accumulated so far. Merged lazily, only from chunks that arrived since the last access.'''
+        if self._num_merged < len(self.chunks):
+            new_chunks = self.chunks[self._num_merged:]
+            if self._full_message is None:
+                self._full_message = add_ai_message_chunks(new_chunks[0], *new_chunks[1:])
+            else:
+                self._full_message = add_ai_message_chunks(self._full_message, *new_chunks)
+            self._num_merged = len(self.chunks)
+        elif self._full_message is None:
+            return AIMessageChunk(content='')
+        return self._full_message
+
+    def _receive_chunk(self, chunk: AIMessageChunk) -> None:
+        '''Handle a newly received chunk.'''
+        self.metrics.record_chunk()
+        if self.coalescer is not None:
+            self.coalescer.receive(chunk)
+        elif self.receive_callback is not None:
+            self.receive_callback(chunk)
+        self.chunks.append(chunk)
+        if self.eager_tools and len(chunk.tool_call_chunks):
+            for tool_call in self._completed_tool_calls(chunk):
+                self._dispatch_tool_call(tool_call)
+
+    def _completed_tool_calls(self, chunk: AIMessageChunk) -> list[dict[str, typing.Any]]:
+        '''Accumulate streamed tool call chunks and return the tool calls whose arguments just became complete.
+            Arguments are complete once the accumulated string parses as a JSON object; the parse
+            is only attempted when the string ends with a closing brace.
+        '''
+        completed = list()
+        for tcc in chunk.tool_call_chunks:
+            key = tcc.get('index') if tcc.get('index') is not None else tcc.get('id')
+            partial = self._partial_tool_calls.setdefault(key, {'name': None, 'id': None, 'args': '', 'done': False})
+            if tcc.get('name'):
+                partial['name'] = tcc['name']
+            if tcc.get('id'):
+                partial['id'] = tcc['id']
+            partial['args'] += tcc.get('args') or ''
+
+            if partial['done'] or partial['name'] is None or partial['id'] is None or not partial['args'].rstrip().endswith('}'):
+                continue
+            try:
+                args = json.loads(partial['args'])
+            except json.JSONDecodeError:
+                continue
+            if isinstance(args, dict):
+                partial['done'] = True
+                completed.append({'name': partial['name'], 'args': args, 'id': partial['id'], 'type': 'tool_call'})
+        return completed
+
+    def _dispatch_tool_call(self, tool_call: dict[str, typing.Any]) -> None:
+        raise NotImplementedError
+
+    def _finish(self) -> None:
+        '''Handle the end of the stream.'''
+        if self.add_reply_to_history:
+            self.agent.history.add_message(self.full_message)
+        self.exhausted = True
+        if self.coalescer is not None:
+            self.coalescer.flush()
+        self.metrics.finish(self.full_message)
+        if self.timings is not None:
+            self.timings.add('model', self.metrics.end - self.metrics.start)
+            self.timings.submit()
+
+    def _collected_result(self) -> ChatResult:
+        return ChatResult.from_message(
+            message=self.full_message,
+            agent=self.agent,
+            tool_lookup=self.tool_lookup,
+            add_reply_to_history=False,
+            add_tool_calls_to_history=self.add_reply_to_history,
+            timings=self.timings,
+            stream_stats=self.stats(),
+            dispatched=self._dispatched,
+            tool_timings=self._tool_timings,
+        )
+
+    def stats(self) -> StreamStats:
+        '''Get time-to-first-token, inter-chunk gaps, and tokens/sec for the stream.'''
+        if not self.exhausted:
+            raise ValueError('Cannot get stream stats until the stream is exhausted.')
+        return self.metrics.summary()
+
+    @property
+    def tool_calls(self) -> list[ToolCallInfo]:
+        '''Get the names of the tools called.'''
+        if not self.exhausted:
+            raise ValueError('Cannot get tool calls until the stream is exhausted.')
+        return [self.tool_lookup.get_tool_info(tc) for tc in self.full_message.tool_calls]
+    
+    def has_tool_calls(self) -> bool:
+        '''Return whether the message has tool calls.'''
+        return len(self.full_message.tool_calls) > 0
+
+
 @dataclasses.dataclass
-class StreamResult(ChatResultBase):
+class StreamResult(StreamResultBase):
     '''Returned from chat_stream so that user can collect results of streamed chat and tool calls.'''
     message_iter: typing.Iterator[AIMessageChunk]
     agent: Agent
     tool_lookup: ToolLookup
     add_reply_to_history: bool
     #add_tool_calls_to_history: bool
-    full_message: AIMessage
+    chunks: list[AIMessageChunk]
     exhausted: bool
     receive_callback: typing.Callable[[AIMessageChunk], None]
+    timings: PhaseTimings | None = dataclasses.field(default=None, repr=False)
+    metrics: StreamMetrics = dataclasses.field(default_factory=StreamMetrics, repr=False)
+    coalescer: TextCoalescer | None = dataclasses.field(default=None, repr=False)
+    eager_tools: bool = False
+    _full_message: AIMessageChunk | None = dataclasses.field(default=None, repr=False)
+    _num_merged: int = dataclasses.field(default=0, repr=False)
+    _partial_tool_calls: dict[int | str, dict[str, typing.Any]] = dataclasses.field(default_factory=dict, repr=False)
+    _dispatched: dict[ToolCallID, typing.Any] = dataclasses.field(default_factory=dict, repr=False)
+    _tool_timings: PhaseTimings | None = dataclasses.field(default=None, repr=False)
 
     @classmethod
     def from_message_iter(
@@ -111,29 +396,49 @@ class StreamResult(ChatResultBase):
         tool_lookup: ToolLookup,
         add_reply_to_history: bool,
         #add_tool_calls_to_history: bool,
-        receive_callback: typing.Callable[[AIMessageChunk], None] = None,
+        receive_callback: typing.Callable[[AIMessageChunk], None] | typing.Callable[[str], None] = None,
+        timings: PhaseTimings | None = None,
+        coalesce: CoalescePolicy | None = None,
+        eager_tools: bool = False,
     ) -> typing.Self:
-        '''Create a chat stream from a message iterator.'''
+        '''Create a chat stream from a message iterator.
+        Args:
+            receive_callback: called with each chunk as it arrives, or with batches of text if coalesce is set.
+            coalesce: batch text for receive_callback according to this policy.
+            eager_tools: start each tool call as soon as its arguments have been fully streamed,
+                rather than waiting for execute_tools(). Results are still added to history by execute_tools().
+        '''
         return cls(
             message_iter=message_iter,
             agent=agent,
             tool_lookup = tool_lookup,
             add_reply_to_history=add_reply_to_history,
             #add_tool_calls_to_history = add_tool_calls_to_history,
-            full_message = AIMessageChunk(content=''),
+            chunks = list(),
             exhausted = False,
-            receive_callback = receive_callback,
+            receive_callback = receive_callback if coalesce is None else None,
+            timings = timings,
+            coalescer = TextCoalescer(coalesce, receive_callback) if coalesce is not None and receive_callback is not None else None,
+            eager_tools = eager_tools,
         )
     
     ####################### Iterating through results #######################
-    def print_and_collect(self) -> ChatResult:
+    def print_and_collect(self, coalesce: CoalescePolicy | None = None) -> ChatResult:
         '''Print the chat stream result and collect it.
+        Args:
+            coalesce: print text in batches according to this policy rather than once per chunk.
         Example:
             result = agent.stream('hello world').print_and_collect()
             result.execute_tools()
         '''
-        for chunk in self:
-            print(chunk.content, end='', flush=True)
+        if coalesce is None:
+            for chunk in self:
+                print(chunk.content, end='', flush=True)
+        else:
+            coalescer = TextCoalescer(coalesce, print_text)
+            for chunk in self:
+                coalescer.receive(chunk)
+            coalescer.flush()
         return self.collect()
 
     def progress_and_collect(self) -> ChatResult:
@@ -142,10 +447,11 @@ class StreamResult(ChatResultBase):
             result = agent.stream('hello world').progress_and_collect()
             result.execute_tools()
         '''
-        pbar = tqdm.tqdm(ncols=100)
+        pbar = tqdm.tqdm(ncols=100, unit='chunk')
         for chunk in self:
-            chunk.content
+            pbar.set_postfix_str(f'{self.metrics.live_tokens_per_second():.1f} tok/s', refresh=False)
             pbar.update(1)
+        pbar.set_postfix_str(f'{self.metrics.summary().tokens_per_second:.1f} tok/s')
         pbar.close()
         return self.collect()
 
@@ -157,13 +463,7 @@ class StreamResult(ChatResultBase):
             for _ in self:
                 pass
 
-        return ChatResult.from_message(
-            message=self.full_message,
-            agent=self.agent,
-            tool_lookup=self.tool_lookup,
-            add_reply_to_history=False,
-            add_tool_calls_to_history=self.add_reply_to_history,
-        )
+        return self._collected_result()
 
     def __iter__(self):
         return self
@@ -174,44 +474,178 @@ class StreamResult(ChatResultBase):
         
     def next(self) -> AIMessageChunk:
         '''Get the next message and add it to the full message.'''
+        self.metrics.mark_start() # the model request is sent on the first call
         try:
             next_message = next(self.message_iter)
-            if self.receive_callback is not None:
-                self.receive_callback(next_message)
-            self.full_message += next_message
+            self._receive_chunk(next_message)
             return next_message
         
         except StopIteration:
-            if self.add_reply_to_history:
-                self.agent.history.add_message(self.full_message)
-            self.exhausted = True
+            self._finish()
             raise StopIteration
 
     
     ####################### handle tool calls #######################
+    def _dispatch_tool_call(self, tool_call: dict[str, typing.Any]) -> None:
+        '''Start a tool call in the agent's tool executor. Unknown tools are left for execute_tools to report.'''
+        try:
+            tool_info = self.tool_lookup.get_tool_info(tool_call)
+        except UknownToolError:
+            return
+        self._dispatched[tool_info.id] = self.agent.tool_executor.submit(
+            tool_info.execute, self.agent, add_to_history=False, timings=self._get_tool_timings(),
+        )
+
     def execute_tools(self, 
-    ) -> dict[str, ToolCallResult]:
-        '''Call tools on the full message.'''
+        parallel: bool = False,
+        max_concurrency: int | None = None,
+    ) -> dict[ToolCallID, ToolCallResult]:
+        '''Call tools on the full message. With eager_tools=True, calls that already started are awaited.'''
         if not self.exhausted:
             raise ValueError('Cannot call tools until the stream is exhausted.')
 
-        return self._handle_tool_calls(
+        tool_timings = self._get_tool_timings()
+        results = self._handle_tool_calls(
             agent=self.agent, 
             tool_lookup = self.tool_lookup,
             message=self.full_message, 
             add_to_history=self.add_reply_to_history, 
+            parallel=parallel,
+            max_concurrency=max_concurrency,
+            timings=tool_timings,
+            dispatched=self._dispatched,
         )
+        self._finish_tool_timings(tool_timings)
+        return results
 
-    @property
-    def tool_calls(self) -> list[ToolCallInfo]:
-        '''Get the names of the tools called.'''
-        if not self.exhausted:
-            raise ValueError('Cannot get tool calls until the stream is exhausted.')
-        return [self.tool_lookup.get_tool_info(tc) for tc in self.full_message.tool_calls]
+
+@dataclasses.dataclass
+class AsyncStreamResult(StreamResultBase):
+    '''Returned from astream so that user can collect results of streamed chat and tool calls using async for.'''
+    message_aiter: typing.AsyncIterator[AIMessageChunk]
+    agent: Agent
+    tool_lookup: ToolLookup
+    add_reply_to_history: bool
+    chunks: list[AIMessageChunk]
+    exhausted: bool
+    receive_callback: typing.Callable[[AIMessageChunk], None]
+    timings: PhaseTimings | None = dataclasses.field(default=None, repr=False)
+    metrics: StreamMetrics = dataclasses.field(default_factory=StreamMetrics, repr=False)
+    coalescer: TextCoalescer | None = dataclasses.field(default=None, repr=False)
+    eager_tools: bool = False
+    _full_message: AIMessageChunk | None = dataclasses.field(default=None, repr=False)
+    _num_merged: int = dataclasses.field(default=0, repr=False)
+    _partial_tool_calls: dict[int | str, dict[str, typing.Any]] = dataclasses.field(default_factory=dict, repr=False)
+    _dispatched: dict[ToolCallID, typing.Any] = dataclasses.field(default_factory=dict, repr=False)
+    _tool_timings: PhaseTimings | None = dataclasses.field(default=None, repr=False)
+
+    @classmethod
+    def from_message_aiter(
+        cls,
+        message_aiter: typing.AsyncIterator[AIMessageChunk],
+        agent: Agent,
+        tool_lookup: ToolLookup,
+        add_reply_to_history: bool,
+        receive_callback: typing.Callable[[AIMessageChunk], None] | typing.Callable[[str], None] = None,
+        timings: PhaseTimings | None = None,
+        coalesce: CoalescePolicy | None = None,
+        eager_tools: bool = False,
+    ) -> typing.Self:
+        '''Create an async chat stream from an async message iterator. See StreamResult.from_message_iter.'''
+        return cls(
+            message_aiter=message_aiter,
+            agent=agent,
+            tool_lookup = tool_lookup,
+            add_reply_to_history=add_reply_to_history,
+            chunks = list(),
+            exhausted = False,
+            receive_callback = receive_callback if coalesce is None else None,
+            timings = timings,
+            coalescer = TextCoalescer(coalesce, receive_callback) if coalesce is not None and receive_callback is not None else None,
+            eager_tools = eager_tools,
+        )
     
-    def has_tool_calls(self) -> bool:
-        '''Return whether the message has tool calls.'''
-        return len(self.full_message.tool_calls) > 0
+    ####################### Iterating through results #######################
+    async def print_and_collect(self, coalesce: CoalescePolicy | None = None) -> ChatResult:
+        '''Print the chat stream result and collect it.
+        Args:
+            coalesce: print text in batches according to this policy rather than once per chunk.
+        Example:
+            result = await agent.astream('hello world').print_and_collect()
+            await result.aexecute_tools()
+        '''
+        if coalesce is None:
+            async for chunk in self:
+                print(chunk.content, end='', flush=True)
+        else:
+            coalescer = TextCoalescer(coalesce, print_text)
+            async for chunk in self:
+                coalescer.receive(chunk)
+            coalescer.flush()
+        return await self.collect()
+
+    async def collect(self) -> ChatResult:
+        '''Get the full chat result after accumulating all messages.'''
+        if not self.exhausted:
+            async for _ in self:
+                pass
+
+        return self._collected_result()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        '''Get the next message and add it to the full message.'''
+        return await self.anext()
+        
+    async def anext(self) -> AIMessageChunk:
+        '''Get the next message and add it to the full message.'''
+        self.metrics.mark_start()
+        try:
+            next_message = await self.message_aiter.__anext__()
+            self._receive_chunk(next_message)
+            return next_message
+        
+        except StopAsyncIteration:
+            self._finish()
+            raise StopAsyncIteration
+
+    ####################### handle tool calls #######################
+    def _dispatch_tool_call(self, tool_call: dict[str, typing.Any]) -> None:
+        '''Start a tool call as a task on the running event loop. Unknown tools are left for aexecute_tools to report.'''
+        try:
+            tool_info = self.tool_lookup.get_tool_info(tool_call)
+        except UknownToolError:
+            return
+        self._dispatched[tool_info.id] = asyncio.ensure_future(
+            tool_info.aexecute(self.agent, add_to_history=False, timings=self._get_tool_timings())
+        )
+
+    async def aexecute_tools(self, 
+        parallel: bool = False,
+        max_concurrency: int | None = None,
+    ) -> dict[ToolCallID, ToolCallResult]:
+        '''Call tools on the full message asynchronously. With eager_tools=True, calls that already started are awaited.'''
+        if not self.exhausted:
+            raise ValueError('Cannot call tools until the stream is exhausted.')
+
+        tool_timings = self._get_tool_timings()
+        results = await self._ahandle_tool_calls(
+            agent=self.agent, 
+            tool_lookup = self.tool_lookup,
+            message=self.full_message, 
+            add_to_history=self.add_reply_to_history, 
+            parallel=parallel,
+            max_concurrency=max_concurrency,
+            timings=tool_timings,
+            dispatched=self._dispatched,
+        )
+        self._finish_tool_timings(tool_timings)
+        return results
+
+    # same name as ChatResult.aexecute_tools; execute_tools is kept for existing callers
+    execute_tools = aexecute_tools
     
 
 T = typing.TypeVar('T', bound=pydantic.BaseModel)
@@ -222,6 +656,7 @@ class StructuredOutputResult:
     data: T
     agent: Agent
     add_reply_to_history: bool
+    timings: PhaseTimings | None = None
 
     @classmethod
     def from_output(
@@ -229,6 +664,7 @@ class StructuredOutputResult:
         output: T,
         agent: Agent,
         add_reply_to_history: bool,
+        timings: PhaseTimings | None = None,
     ) -> typing.Self:
         '''Create a chat stream from a message iterator.'''
         if add_reply_to_history:
@@ -238,6 +674,7 @@ class StructuredOutputResult:
             data=output,
             agent=agent,
             add_reply_to_history=add_reply_to_history,
+            timings=timings,
         )
 
     def as_json(self, **kwargs) -> str:
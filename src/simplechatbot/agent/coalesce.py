@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import time
+
+if typing.TYPE_CHECKING:
+    from langchain_core.messages import AIMessageChunk, BaseMessage
+
+TextCallback = typing.Callable[[str], None]
+
+
+@dataclasses.dataclass
+class CoalescePolicy:
+    '''Controls how streamed text is batched before it is handed to a callback or printed.
+        Buffered text is flushed when a chunk arrives and either max_chars characters are waiting or
+        max_delay seconds have passed since the last flush, and always when the stream ends. Limits
+        are only checked when a chunk arrives (there is no background timer), so if the model pauses
+        (e.g. before a tool call), text buffered before the pause is delivered with the next chunk
+        or at the end of the stream. Set a limit to None to disable it.
+    Example:
+        agent.stream('hello', do_print=True, coalesce=CoalescePolicy(max_delay=0.05))
+    '''
+    max_delay: float | None = 0.05
+    max_chars: int | None = 256
+
+
+@dataclasses.dataclass(repr=False)
+class TextCoalescer:
+    '''Buffers chunk text and delivers it to a callback in batches according to a CoalescePolicy.'''
+    policy: CoalescePolicy
+    callback: TextCallback
+    _buffer: list[str] = dataclasses.field(default_factory=list)
+    _num_chars: int = 0
+    _last_flush: float = dataclasses.field(default_factory=time.monotonic)
+
+    def receive(self, chunk: AIMessageChunk) -> None:
+        '''Add the text of a chunk to the buffer, then flush if a limit has been reached. This is the only place limits are checked.'''
+        text = chunk_text(chunk)
+        if not len(text):
+            return
+        self._buffer.append(text)
+        self._num_chars += len(text)
+
+        if self.policy.max_chars is not None and self._num_chars >= self.policy.max_chars:
+            self.flush()
+        elif self.policy.max_delay is not None and time.monotonic() - self._last_flush >= self.policy.max_delay:
+            self.flush()
+
+    def flush(self) -> None:
+        '''Deliver any buffered text.'''
+        self._last_flush = time.monotonic()
+        if not len(self._buffer):
+            return
+        text = ''.join(self._buffer)
+        self._buffer.clear()
+        self._num_chars = 0
+        self.callback(text)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(policy={self.policy}, buffered_chars={self._num_chars})'
+
+
+def chunk_text(chunk: BaseMessage) -> str:
+    '''Get the text of a chunk (or any message). Content blocks that are not text (e.g. tool call deltas) are skipped.'''
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return ''.join(
+        block if isinstance(block, str) else block.get('text', '')
+        for block in chunk.content
+        if isinstance(block, str) or block.get('type') == 'text'
+    )
+
+
+def print_text(text: str) -> None:
+    print(text, end='', flush=True)
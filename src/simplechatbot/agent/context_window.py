@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import json
+import threading
+
+from langchain_core.messages import (
+    BaseMessage,
+    AIMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+
+if typing.TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+TokenCounter = typing.Callable[[BaseMessage], int]
+
+
+def approximate_token_count(message: BaseMessage) -> int:
+    '''Rough token estimate (about 4 characters per token) that does not need a tokenizer.'''
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+    num_chars = len(content)
+    if isinstance(message, AIMessage) and len(message.tool_calls):
+        num_chars += len(json.dumps(message.tool_calls, default=str))
+    return num_chars // 4 + 4 # small per-message overhead for role tokens
+
+
+class WindowPolicy:
+    '''Base class for policies that choose which messages are sent to the model.
+        Subclass and implement apply(). Policies must not modify the input list.
+    '''
+    def apply(self, messages: typing.Sequence[BaseMessage]) -> list[BaseMessage]:
+        raise NotImplementedError
+
+
+@dataclasses.dataclass(repr=False)
+class ContextWindow(WindowPolicy):
+    '''Trims the outgoing message list to the most recent turns that fit within a token budget.
+        The leading system prompt is always kept, and an AIMessage with tool calls is never
+        separated from its ToolMessages. The most recent message group is always sent, even if
+        it exceeds the budget on its own.
+        Per-message token counts are cached by message identity, and the history is walked
+        backwards only until the budget is reached, so trimming cost depends on the window size
+        rather than the full history length.
+    '''
+    max_tokens: int | None = None
+    max_turns: int | None = None
+    keep_system_prompt: bool = True
+    token_counter: TokenCounter = approximate_token_count
+    max_cached_counts: int = 100_000
+    _token_counts: dict[int, tuple[BaseMessage, int]] = dataclasses.field(default_factory=dict)
+    _lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+    @classmethod
+    def from_model(cls,
+        model: BaseChatModel,
+        max_tokens: int | None = None,
+        max_turns: int | None = None,
+        keep_system_prompt: bool = True,
+    ) -> typing.Self:
+        '''Create a window that counts tokens using the model's own tokenizer.'''
+        return cls(
+            max_tokens = max_tokens,
+            max_turns = max_turns,
+            keep_system_prompt = keep_system_prompt,
+            token_counter = lambda m: model.get_num_tokens_from_messages([m]),
+        )
+
+    def apply(self, messages: typing.Sequence[BaseMessage]) -> list[BaseMessage]:
+        '''Get the subset of messages to send to the model.'''
+        if self.keep_system_prompt and len(messages) and isinstance(messages[0], SystemMessage):
+            head = [messages[0]]
+            body_start = 1
+        else:
+            head = []
+            body_start = 0
+
+        budget = self.max_tokens
+        if budget is not None:
+            budget -= sum(self.count_tokens(m) for m in head)
+
+        kept_groups: list[list[BaseMessage]] = list()
+        num_turns = 0
+        for group in self._iter_groups_reversed(messages, body_start):
+            if self.max_turns is not None and num_turns >= self.max_turns:
+                break
+            if budget is not None:
+                group_tokens = sum(self.count_tokens(m) for m in group)
+                if group_tokens > budget and len(kept_groups):
+                    break
+                budget -= group_tokens
+            kept_groups.append(group)
+            if isinstance(group[0], HumanMessage):
+                num_turns += 1
+
+        return head + [m for group in reversed(kept_groups) for m in group]
+
+    def count_tokens(self, message: BaseMessage) -> int:
+        '''Get the (cached) token count of a single message.'''
+        with self._lock:
+            cached = self._token_counts.get(id(message))
+            if cached is not None and cached[0] is message:
+                return cached[1]
+        count = self.token_counter(message)
+        with self._lock:
+            if len(self._token_counts) >= self.max_cached_counts:
+                self._token_counts.clear()
+            self._token_counts[id(message)] = (message, count)
+        return count
+
+    @staticmethod
+    def _iter_groups_reversed(
+        messages: typing.Sequence[BaseMessage],
+        start: int,
+    ) -> typing.Iterator[list[BaseMessage]]:
+        '''Iterate backwards over groups of messages that must be kept together.
+            A group is either a single message or an AIMessage with tool calls followed by its ToolMessages.
+            Messages are read one index at a time (never sliced), so histories that store messages
+            lazily or in shared segments only load the messages that are looked at.
+        '''
+        i = len(messages) - 1
+        while i >= start:
+            group = [messages[i]]
+            while i > start and isinstance(group[-1], ToolMessage):
+                i -= 1
+                group.append(messages[i])
+            group.reverse()
+            yield group
+            i -= 1
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(max_tokens={self.max_tokens}, max_turns={self.max_turns}, keep_system_prompt={self.keep_system_prompt})'
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import typing
+import json
 import langchain_core.tools
 
 from .types import ToolCallID
@@ -34,6 +35,29 @@ class ToolRaisedExceptionError(Exception):
 class ToolWasNotExecutedError(Exception):
     pass
 
+class ToolTimeoutError(TimeoutError):
+    '''Raised by ToolRunner when a tool does not finish within its timeout.
+        ToolCallInfo.execute catches this and returns it to the model as an error ToolMessage.
+    '''
+    tool_name: str
+    timeout: float
+
+    @classmethod
+    def from_timeout(cls, tool_name: str, timeout: float) -> typing.Self:
+        o = cls(f'The tool {tool_name} did not finish within {timeout} seconds.')
+        o.tool_name = tool_name
+        o.timeout = timeout
+        return o
+
+    def to_tool_content(self) -> str:
+        '''Get the error as JSON to use as the content of a ToolMessage.'''
+        return json.dumps({
+            'error': 'timeout',
+            'tool': self.tool_name,
+            'timeout_seconds': self.timeout,
+            'message': str(self),
+        })
+
 
 
 class NoSystemPromptError(ValueError):
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import threading
+
+from .types import ToolName
+
+if typing.TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+    from .agent import Agent
+    from .toolset import ToolFactoryType
+
+
+@dataclasses.dataclass
+class DynamicToolFactory:
+    '''Wraps a tool factory so it is called on every turn rather than cached.
+        Use for factories whose tools depend on state that changes during the conversation.
+    Example:
+        agent = Agent.from_model(model, tool_factories=[dynamic_tool_factory(make_tools)])
+    '''
+    factory: ToolFactoryType
+
+    def __call__(self, agent: Agent) -> list[BaseTool]:
+        return self.factory(agent)
+
+
+def dynamic_tool_factory(factory: ToolFactoryType) -> DynamicToolFactory:
+    '''Mark a tool factory as dynamic so its output is never cached.'''
+    return DynamicToolFactory(factory)
+
+
+@dataclasses.dataclass
+class ToolFactoryCacheStats:
+    '''Hit/miss counts for a ToolFactoryCache.'''
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+
+
+@dataclasses.dataclass(repr=False)
+class ToolFactoryCache:
+    '''Caches the tools created by tool factories for a single agent.
+        Factory output is keyed by factory identity, so each factory is called once per agent until
+        invalidate() is called. Combined tool dicts are also cached per (static tools, factories)
+        combination, which is where the check for tool names defined in both places happens.
+        Factories wrapped with dynamic_tool_factory() are called every time.
+    '''
+    max_entries: int = 256
+    _outputs: dict[int, tuple[ToolFactoryType, list[BaseTool]]] = dataclasses.field(default_factory=dict)
+    _combined: dict[tuple, tuple[list, dict[ToolName, BaseTool]]] = dataclasses.field(default_factory=dict)
+    _stats: ToolFactoryCacheStats = dataclasses.field(default_factory=ToolFactoryCacheStats)
+    _lock: threading.RLock = dataclasses.field(default_factory=threading.RLock)
+
+    def tool_dict(
+        self,
+        tools: dict[ToolName, BaseTool],
+        tool_factories: list[ToolFactoryType],
+        agent: Agent,
+    ) -> dict[ToolName, BaseTool]:
+        '''Get static tools merged with (cached) factory tools.'''
+        if any(isinstance(tf, DynamicToolFactory) for tf in tool_factories):
+            factory_tools = {t.name: t for tf in tool_factories for t in self.factory_output(tf, agent)}
+            return merge_factory_tools(tools, factory_tools)
+
+        key = (tuple(tools.keys()), tuple(id(t) for t in tools.values()), tuple(id(tf) for tf in tool_factories))
+        with self._lock:
+            cached = self._combined.get(key)
+            if cached is not None:
+                self._stats.hits += 1
+                return dict(cached[1]) # copies so callers cannot change what later turns get
+
+            factory_tools = {t.name: t for tf in tool_factories for t in self.factory_output(tf, agent)}
+            combined = merge_factory_tools(tools, factory_tools)
+            if len(self._combined) >= self.max_entries:
+                self._combined.clear()
+            # keep references so ids in the key cannot be reused while cached
+            self._combined[key] = ([*tools.values(), *tool_factories], combined)
+            return dict(combined)
+
+    def factory_output(self, factory: ToolFactoryType, agent: Agent) -> list[BaseTool]:
+        '''Get the tools created by a factory, calling it only on a cache miss.'''
+        if isinstance(factory, DynamicToolFactory):
+            return list(factory(agent))
+        with self._lock:
+            cached = self._outputs.get(id(factory))
+            if cached is not None and cached[0] is factory:
+                self._stats.hits += 1
+                return list(cached[1])
+            self._stats.misses += 1
+            output = list(factory(agent))
+            self._outputs[id(factory)] = (factory, output)
+            return list(output)
+
+    def invalidate(self, factory: ToolFactoryType | None = None) -> None:
+        '''Drop cached output of one factory, or of all factories.'''
+        with self._lock:
+            if factory is None:
+                self._outputs.clear()
+            else:
+                self._outputs.pop(id(factory), None)
+            self._combined.clear()
+            self._stats.invalidations += 1
+
+    def stats(self) -> ToolFactoryCacheStats:
+        with self._lock:
+            return dataclasses.replace(self._stats)
+
+    def __repr__(self) -> str:
+        s = self.stats()
+        return f'{self.__class__.__name__}(num_factories={len(self._outputs)}, hits={s.hits}, misses={s.misses})'
+
+
+def merge_factory_tools(
+    tools: dict[ToolName, BaseTool],
+    factory_tools: dict[ToolName, BaseTool],
+) -> dict[ToolName, BaseTool]:
+    '''Merge static and factory tools, raising if a name is defined in both.'''
+    toolname_overlap = set(tools.keys()) & set(factory_tools.keys())
+    if len(toolname_overlap):
+        raise ValueError('The following tools are defined in both tools and tool factories: ' + ', '.join(toolname_overlap))
+    return {**tools, **factory_tools}
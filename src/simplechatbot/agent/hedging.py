@@ -0,0 +1,423 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import asyncio
+import collections
+import concurrent.futures
+import queue
+import statistics
+import threading
+import time
+
+import pydantic
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .response_cache import runnable_fingerprint
+
+if typing.TYPE_CHECKING:
+    from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+    from langchain_core.runnables import Runnable
+    from langchain_core.tools import BaseTool
+    from .agent import Agent
+
+_DONE = object() # end of a member's stream
+
+
+@dataclasses.dataclass
+class ModelLatencyStats:
+    '''Latency and outcome counts for one member of a HedgedChatModel.'''
+    index: int
+    name: str
+    num_samples: int = 0
+    p50: float | None = None
+    p95: float | None = None
+    wins: int = 0
+    hedges: int = 0
+    failures: int = 0
+
+
+@dataclasses.dataclass(repr=False)
+class ModelLatencyTracker:
+    '''Moving window of per-model latencies used to order the members of a HedgedChatModel.
+        Latency is time to first token for streamed calls and time to the full reply otherwise.
+        When a request loses a race, the time it had been running is recorded as a (lower bound)
+        sample, so a slow primary falls behind even though its requests never finish.
+    '''
+    window: int = 50
+    _samples: dict[int, collections.deque[float]] = dataclasses.field(default_factory=dict)
+    _wins: collections.Counter[int] = dataclasses.field(default_factory=collections.Counter)
+    _hedges: collections.Counter[int] = dataclasses.field(default_factory=collections.Counter)
+    _failures: collections.Counter[int] = dataclasses.field(default_factory=collections.Counter)
+    _lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+    def record(self, index: int, seconds: float, won: bool) -> None:
+        with self._lock:
+            self._samples.setdefault(index, collections.deque(maxlen=self.window)).append(seconds)
+            if won:
+                self._wins[index] += 1
+
+    def record_hedge(self, index: int) -> None:
+        '''Record that a hedge request was sent to this member.'''
+        with self._lock:
+            self._hedges[index] += 1
+
+    def record_failure(self, index: int) -> None:
+        with self._lock:
+            self._failures[index] += 1
+
+    def median(self, index: int) -> float | None:
+        with self._lock:
+            samples = self._samples.get(index)
+            return statistics.median(samples) if samples else None
+
+    def order(self, num_models: int) -> list[int]:
+        '''Get member indices fastest first. Members without samples keep their configured order after measured ones.'''
+        medians = [self.median(i) for i in range(num_models)]
+        return sorted(range(num_models), key=lambda i: (medians[i] is None, medians[i] or 0.0, i))
+
+    def stats(self, names: list[str]) -> list[ModelLatencyStats]:
+        out = list()
+        with self._lock:
+            for i, name in enumerate(names):
+                samples = sorted(self._samples.get(i, ()))
+                out.append(ModelLatencyStats(
+                    index = i,
+                    name = name,
+                    num_samples = len(samples),
+                    p50 = samples[len(samples)//2] if samples else None,
+                    p95 = samples[min(int(len(samples)*0.95), len(samples)-1)] if samples else None,
+                    wins = self._wins[i],
+                    hedges = self._hedges[i],
+                    failures = self._failures[i],
+                ))
+        return out
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(window={self.window}, num_models={len(self._samples)})'
+
+
+class HedgedChatModel(BaseChatModel):
+    '''Chat model that sends each request to a group of models, hedging against slow responses.
+        The request goes to the fastest member first (by median latency over a moving window). If it
+        has not produced a first token (or, for non-streamed calls, a reply) within `hedge_delay`
+        seconds, the request is also sent to the next member, up to `max_hedges` extra requests in
+        flight. The first to respond wins and the others are cancelled: async requests are cancelled
+        outright, and sync requests stop being consumed (queued ones are never sent). A member that
+        raises is failed over to the next one immediately.
+        bind_tools() binds the tools to every member, so tool calling and with_structured_output()
+        work as with a single model.
+    Example:
+        model = HedgedChatModel.from_agents([OpenAIAgent.new(), OllamaAgent.new('llama3.1')], hedge_delay=1.0)
+        agent = Agent.from_model(model, tools=tools)
+    '''
+    models: list[typing.Any] # BaseChatModel or tool-bound Runnable; Any avoids pydantic coercion
+    names: list[str] = pydantic.Field(default_factory=list)
+    hedge_delay: float = 0.5
+    max_hedges: int = 1
+    tracker: typing.Any = pydantic.Field(default_factory=ModelLatencyTracker) # shared with tool-bound copies
+    model_name: str = 'hedged'
+
+    @classmethod
+    def from_agents(cls, agents: list[Agent], **kwargs) -> typing.Self:
+        '''Create a group from the models of existing agents (e.g. an OpenAIAgent and an OllamaAgent).'''
+        return cls(models=[a._model for a in agents], **kwargs)
+
+    @pydantic.model_validator(mode='after')
+    def _check_models(self) -> typing.Self:
+        if len(self.models) == 0:
+            raise ValueError('A HedgedChatModel needs at least one model.')
+        if len(self.names) == 0:
+            self.names = [getattr(m, 'model_name', None) or getattr(m, 'model', None) or type(m).__name__ for m in self.models]
+        return self
+
+    @property
+    def _llm_type(self) -> str:
+        return 'simplechatbot-hedged'
+
+    @property
+    def _identifying_params(self) -> dict[str, typing.Any]:
+        # member fingerprints include bound tools, so tool-bound copies are distinguished (e.g. by ResponseCache)
+        return {'model_name': self.model_name, 'models': self.names, 'members': [runnable_fingerprint(m) for m in self.models]}
+
+    def latency_stats(self) -> list[ModelLatencyStats]:
+        '''Get latency percentiles and win/hedge/failure counts for each member.'''
+        return self.tracker.stats(self.names)
+
+    def bind_tools(
+        self,
+        tools: typing.Sequence[BaseTool | dict | type | typing.Callable],
+        tool_choice: str | None = None,
+        **kwargs,
+    ) -> Runnable[typing.Any, AIMessage]:
+        '''Bind tools to every member. The returned model shares this one's latency tracker.'''
+        if tool_choice is not None:
+            kwargs['tool_choice'] = tool_choice
+        return self.model_copy(update={'models': [m.bind_tools(tools, **kwargs) for m in self.models]})
+
+    ############################# sync #############################
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        order = self.tracker.order(len(self.models))
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=1 + self.max_hedges, thread_name_prefix='simplechatbot-hedge')
+        running: dict[concurrent.futures.Future, tuple[int, float]] = dict()
+        num_launched = 0
+        errors: list[Exception] = list()
+
+        def launch(hedge: bool) -> None:
+            nonlocal num_launched
+            index = order[num_launched]
+            num_launched += 1
+            if hedge:
+                self.tracker.record_hedge(index)
+            running[pool.submit(self.models[index].invoke, messages, stop=stop, **kwargs)] = (index, time.perf_counter())
+
+        launch(hedge=False)
+        try:
+            while True:
+                can_hedge = num_launched < len(order) and len(running) < 1 + self.max_hedges
+                done, _ = concurrent.futures.wait(running, timeout=self.hedge_delay if can_hedge else None, return_when=concurrent.futures.FIRST_COMPLETED)
+                if len(done) == 0:
+                    launch(hedge=True)
+                    continue
+                for future in done:
+                    index, start = running.pop(future)
+                    if future.exception() is None:
+                        now = time.perf_counter()
+                        self.tracker.record(index, now - start, won=True)
+                        for loser_index, loser_start in running.values():
+                            self.tracker.record(loser_index, now - loser_start, won=False)
+                        return ChatResult(generations=[ChatGeneration(message=future.result())])
+                    errors.append(future.exception())
+                    self.tracker.record_failure(index)
+                if len(running) == 0:
+                    if num_launched == len(order):
+                        raise errors[-1]
+                    launch(hedge=False) # fail over
+        finally:
+            for future in running:
+                future.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> typing.Iterator[ChatGenerationChunk]:
+        order = self.tracker.order(len(self.models))
+        chunks: queue.Queue[tuple[int, typing.Any]] = queue.Queue()
+        stopped = {i: threading.Event() for i in order}
+        starts: dict[int, float] = dict()
+        failed: set[int] = set()
+
+        def consume(index: int) -> None:
+            iterator = iter(self.models[index].stream(messages, stop=stop, **kwargs))
+            try:
+                for chunk in iterator:
+                    if stopped[index].is_set():
+                        return
+                    chunks.put((index, chunk))
+                chunks.put((index, _DONE))
+            except Exception as e:
+                chunks.put((index, e))
+            finally:
+                close = getattr(iterator, 'close', None)
+                if close is not None:
+                    close()
+
+        def launch(hedge: bool) -> None:
+            index = order[len(starts)]
+            if hedge:
+                self.tracker.record_hedge(index)
+            starts[index] = time.perf_counter()
+            threading.Thread(target=consume, args=(index,), daemon=True, name='simplechatbot-hedge').start()
+
+        launch(hedge=False)
+        winner = None
+        try:
+            while winner is None:
+                in_flight = len(starts) - len(failed)
+                can_hedge = len(starts) < len(order) and in_flight < 1 + self.max_hedges
+                try:
+                    index, item = chunks.get(timeout=self.hedge_delay if can_hedge else None)
+                except queue.Empty:
+                    launch(hedge=True)
+                    continue
+                if isinstance(item, Exception):
+                    failed.add(index)
+                    self.tracker.record_failure(index)
+                    if len(failed) == len(starts):
+                        if len(starts) == len(order):
+                            raise item
+                        launch(hedge=False) # fail over
+                    continue
+
+                winner = index
+                now = time.perf_counter()
+                self.tracker.record(index, now - starts[index], won=True)
+                for other, start in starts.items():
+                    if other != index and other not in failed:
+                        stopped[other].set()
+                        self.tracker.record(other, now - start, won=False)
+                if item is not _DONE:
+                    yield self._generation_chunk(item, run_manager)
+                else:
+                    return
+
+            while True:
+                index, item = chunks.get()
+                if index != winner:
+                    continue
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield self._generation_chunk(item, run_manager)
+        finally:
+            for event in stopped.values():
+                event.set()
+
+    @staticmethod
+    def _generation_chunk(chunk: AIMessageChunk, run_manager: CallbackManagerForLLMRun | None) -> ChatGenerationChunk:
+        generation = ChatGenerationChunk(message=chunk)
+        if run_manager is not None:
+            run_manager.on_llm_new_token(chunk.content, chunk=generation)
+        return generation
+
+    ############################# async #############################
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        order = self.tracker.order(len(self.models))
+        running: dict[asyncio.Task, tuple[int, float]] = dict()
+        num_launched = 0
+        errors: list[Exception] = list()
+
+        def launch(hedge: bool) -> None:
+            nonlocal num_launched
+            index = order[num_launched]
+            num_launched += 1
+            if hedge:
+                self.tracker.record_hedge(index)
+            task = asyncio.ensure_future(self.models[index].ainvoke(messages, stop=stop, **kwargs))
+            running[task] = (index, time.perf_counter())
+
+        launch(hedge=False)
+        try:
+            while True:
+                can_hedge = num_launched < len(order) and len(running) < 1 + self.max_hedges
+                done, _ = await asyncio.wait(running, timeout=self.hedge_delay if can_hedge else None, return_when=asyncio.FIRST_COMPLETED)
+                if len(done) == 0:
+                    launch(hedge=True)
+                    continue
+                for task in done:
+                    index, start = running.pop(task)
+                    if task.exception() is None:
+                        now = time.perf_counter()
+                        self.tracker.record(index, now - start, won=True)
+                        for loser_index, loser_start in running.values():
+                            self.tracker.record(loser_index, now - loser_start, won=False)
+                        return ChatResult(generations=[ChatGeneration(message=task.result())])
+                    errors.append(task.exception())
+                    self.tracker.record_failure(index)
+                if len(running) == 0:
+                    if num_launched == len(order):
+                        raise errors[-1]
+                    launch(hedge=False) # fail over
+        finally:
+            for task in running:
+                task.cancel()
+            if len(running):
+                await asyncio.gather(*running, return_exceptions=True)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> typing.AsyncIterator[ChatGenerationChunk]:
+        order = self.tracker.order(len(self.models))
+        chunks: asyncio.Queue[tuple[int, typing.Any]] = asyncio.Queue()
+        tasks: dict[int, asyncio.Task] = dict()
+        starts: dict[int, float] = dict()
+        failed: set[int] = set()
+
+        async def consume(index: int) -> None:
+            try:
+                async for chunk in self.models[index].astream(messages, stop=stop, **kwargs):
+                    chunks.put_nowait((index, chunk))
+                chunks.put_nowait((index, _DONE))
+            except Exception as e:
+                chunks.put_nowait((index, e))
+
+        def launch(hedge: bool) -> None:
+            index = order[len(starts)]
+            if hedge:
+                self.tracker.record_hedge(index)
+            starts[index] = time.perf_counter()
+            tasks[index] = asyncio.ensure_future(consume(index))
+
+        launch(hedge=False)
+        winner = None
+        try:
+            while winner is None:
+                in_flight = len(starts) - len(failed)
+                can_hedge = len(starts) < len(order) and in_flight < 1 + self.max_hedges
+                try:
+                    index, item = await asyncio.wait_for(chunks.get(), timeout=self.hedge_delay if can_hedge else None)
+                except TimeoutError:
+                    launch(hedge=True)
+                    continue
+                if isinstance(item, Exception):
+                    failed.add(index)
+                    self.tracker.record_failure(index)
+                    if len(failed) == len(starts):
+                        if len(starts) == len(order):
+                            raise item
+                        launch(hedge=False) # fail over
+                    continue
+
+                winner = index
+                now = time.perf_counter()
+                self.tracker.record(index, now - starts[index], won=True)
+                for other, task in tasks.items():
+                    if other != index and other not in failed:
+                        task.cancel()
+                        self.tracker.record(other, now - starts[other], won=False)
+                if item is _DONE:
+                    return
+                yield await self._ageneration_chunk(item, run_manager)
+
+            while True:
+                index, item = await chunks.get()
+                if index != winner:
+                    continue
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield await self._ageneration_chunk(item, run_manager)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    @staticmethod
+    async def _ageneration_chunk(chunk: AIMessageChunk, run_manager: AsyncCallbackManagerForLLMRun | None) -> ChatGenerationChunk:
+        generation = ChatGenerationChunk(message=chunk)
+        if run_manager is not None:
+            await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+        return generation
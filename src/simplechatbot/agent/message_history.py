@@ -1,5 +1,8 @@
+from __future__ import annotations
+
 import typing
 import dataclasses
+import collections.abc
 
 from langchain_core.messages import (
     BaseMessage,
@@ -10,9 +13,13 @@ from langchain_core.messages import (
     ToolMessage,
     get_buffer_string,
 )
+from langchain_core.messages.ai import add_ai_message_chunks
 
 from .errors import ToolWasNotExecutedError, NoSystemPromptError
 
+if typing.TYPE_CHECKING:
+    from .context_window import WindowPolicy
+
 class MessageHistory(list[BaseMessage]): 
     '''Maintains message history.
     LangChain actuall does provide convenient classes for this, but I found it easier to create my own.
@@ -20,6 +27,13 @@ class MessageHistory(list[BaseMessage]):
         Full interface over messsage types from langchain_core.messages so the client doesn't need to use them.
     '''
     
+    _pending_tool_ids: set[str]
+    _executed_tool_ids: set[str]
+
+    def __init__(self, messages: typing.Iterable[BaseMessage] = ()):
+        super().__init__(messages)
+        self._reindex()
+
     ############################# Constructors #############################
     @classmethod
     def from_system_prompt(cls, system_prompt: str) -> typing.Self:
@@ -42,16 +56,20 @@ class MessageHistory(list[BaseMessage]):
     
     ############################# Checking message history #############################
     def check_tools_were_executed(self) -> None:
-        '''Make sure there are no outstanding tool calls.
+        '''Make sure there are no outstanding tool calls. O(1) because pending tool calls are tracked as messages are added.
         Raises:
             ToolWasNotExecutedError: If the tool was not executed.
         '''
-        for i in range(len(self)):
-            if isinstance(self[i], AIMessage) and len(self[i].tool_calls) and not isinstance(self[i+1], ToolMessage):
-                raise ToolWasNotExecutedError(
-                    f'Previous tool call must be executed to retain consistent message history.'
-                    f'Call execute_tools() on the ChatResult or StreamResult objects to execute the tool calls.'
-                )
+        if len(self._pending_tool_ids):
+            raise ToolWasNotExecutedError(
+                f'Previous tool call must be executed to retain consistent message history. '
+                f'Call execute_tools() on the ChatResult or StreamResult objects to execute the tool calls. '
+                f'Pending tool call ids: {sorted(self._pending_tool_ids)}.'
+            )
+
+    def pending_tool_ids(self) -> set[str]:
+        '''Get ids of tool calls that do not yet have a ToolMessage in the history.'''
+        return set(self._pending_tool_ids)
         
     ############################# Transformations #############################
     def to_string(self) -> str:
@@ -62,6 +80,14 @@ class MessageHistory(list[BaseMessage]):
         '''Get entire buffer as a string.'''
         return get_buffer_string(self, *args, **kwargs)
     
+    def appended(self, message: BaseMessage) -> list[BaseMessage]:
+        '''Get the messages that would be sent with a new message, without modifying the history.'''
+        return self + [message]
+
+    def windowed(self, policy: WindowPolicy, extra: typing.Sequence[BaseMessage] = ()) -> list[BaseMessage]:
+        '''Get the messages (followed by `extra`) selected by a context window policy without modifying the history.'''
+        return policy.apply(self + list(extra) if len(extra) else self)
+    
     def render_streamlit(self, streamlit: typing.Any) -> str:
         '''Render the history in a streamlit friendly way.'''
         # Render the chat history.
@@ -80,17 +106,17 @@ class MessageHistory(list[BaseMessage]):
     @property
     def first_system(self) -> SystemMessage:
         '''Get the first system message.'''
-        return self._first_of_type(self[:], SystemMessage)
+        return self._first_of_type(self, SystemMessage)
     
     @property
     def last_ai(self) -> HumanMessage:
         '''Get the most recent ai message on the history.'''
-        return self._first_of_type(self[::-1], AIMessage)
+        return self._first_of_type(reversed(self), AIMessage)
 
     @property
     def last_human(self) -> HumanMessage:
         '''Get the most recent human message on the history.'''
-        return self._first_of_type(self[::-1], HumanMessage)
+        return self._first_of_type(reversed(self), HumanMessage)
 
     @property
     def last(self) -> BaseMessage:
@@ -110,21 +136,18 @@ class MessageHistory(list[BaseMessage]):
     
     def executed_tool_ids(self) -> set[str]:
         '''Get all tool ids in the history.'''
-        return set(m.tool_call_id for m in self if isinstance(m, ToolMessage))
+        return set(self._executed_tool_ids)
     
     def tool_result_exists(self, tool_call_id: str) -> bool:
         '''Return whether a tool call result was added to history yet.'''
-        for m in self:
-            if isinstance(m, ToolMessage) and m.tool_call_id == tool_call_id:
-                return True
-        return False
+        return tool_call_id in self._executed_tool_ids
 
     ############################# Adding Messages #############################
     def add_ai_chunks(self, chunks: list[AIMessageChunk]) -> None:
         '''Add a AIMessage to the history.
-            Looks like they implemented the __add__ method to chunks so I'll just use that.
+            Merges all chunks in one pass instead of sum(), which adds them pairwise.
         '''
-        self.append(sum(chunks[1:], start=chunks[0]))
+        self.append(add_ai_message_chunks(chunks[0], *chunks[1:]))
 
     def add_ai_message(self, content: str) -> None:
         '''Add a AIMessage to the history.'''
@@ -138,13 +161,206 @@ class MessageHistory(list[BaseMessage]):
         '''Add a HumanMessage to the history.'''
         self.append(HumanMessage(content=content))
 
-    def add_tool_message(self, return_value: typing.Any, tool_call_id: str) -> None:
+    def add_tool_message(self, return_value: typing.Any, tool_call_id: str, status: typing.Literal['success', 'error'] = 'success') -> None:
         '''Add a ToolMessage to the history.'''
-        self.append(ToolMessage(content=return_value, tool_call_id=tool_call_id))
+        self.append(ToolMessage(content=return_value, tool_call_id=tool_call_id, status=status))
     
     def add_message(self, message: BaseMessage) -> None:
         '''Add any subtype of BaseMessage to the history.'''
         self.append(message)
 
+    ############################# Tool call index #############################
+    # appends update the index incrementally. Other list mutations are rare, so they rebuild it.
+    def _index_message(self, message: BaseMessage) -> None:
+        '''Update the pending/executed tool call index with a newly added message.'''
+        if isinstance(message, AIMessage):
+            for tool_call in message.tool_calls:
+                if tool_call.get('id') is not None and tool_call['id'] not in self._executed_tool_ids:
+                    self._pending_tool_ids.add(tool_call['id'])
+        elif isinstance(message, ToolMessage):
+            self._executed_tool_ids.add(message.tool_call_id)
+            self._pending_tool_ids.discard(message.tool_call_id)
+
+    def _reindex(self) -> None:
+        '''Rebuild the tool call index from scratch.'''
+        self._pending_tool_ids = set()
+        self._executed_tool_ids = set()
+        for message in self:
+            self._index_message(message)
+
+    def append(self, message: BaseMessage) -> None:
+        super().append(message)
+        self._index_message(message)
+
+    def extend(self, messages: typing.Iterable[BaseMessage]) -> None:
+        for message in messages:
+            self.append(message)
+
+    def __iadd__(self, messages: typing.Iterable[BaseMessage]) -> typing.Self:
+        self.extend(messages)
+        return self
+
+    def insert(self, index: typing.SupportsIndex, message: BaseMessage) -> None:
+        super().insert(index, message)
+        self._reindex()
+
+    def __setitem__(self, index, value) -> None:
+        super().__setitem__(index, value)
+        self._reindex()
+
+    def __delitem__(self, index) -> None:
+        super().__delitem__(index)
+        self._reindex()
+
+    def pop(self, index: typing.SupportsIndex = -1) -> BaseMessage:
+        message = super().pop(index)
+        self._reindex()
+        return message
+
+    def remove(self, message: BaseMessage) -> None:
+        super().remove(message)
+        self._reindex()
+
+    def clear(self) -> None:
+        super().clear()
+        self._reindex()
+
+    def __reduce__(self):
+        '''Rebuild the index on unpickle/copy rather than relying on list append order.'''
+        return (self.__class__, (list(self),))
+
+
+class _ExtendedView(collections.abc.Sequence):
+    '''Read-only sequence of a history followed by extra messages, without copying either.'''
+    def __init__(self, history: MessageHistory, extra: typing.Sequence[BaseMessage]):
+        self.history = history
+        self.extra = list(extra)
+
+    def __len__(self) -> int:
+        return len(self.history) + len(self.extra)
+
+    def __getitem__(self, index):
+        n = len(self.history)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self.history[min(start, n):min(stop, n)] + self.extra[max(start-n, 0):max(stop-n, 0)]
+        i = index.__index__()
+        if i < 0:
+            i += len(self)
+        return self.history[i] if i < n else self.extra[i - n]
+
+    def __iter__(self) -> typing.Iterator[BaseMessage]:
+        yield from self.history
+        yield from self.extra
+
+    def __reversed__(self) -> typing.Iterator[BaseMessage]:
+        yield from reversed(self.extra)
+        yield from reversed(self.history)
+
+
+class _VirtualMessageHistory(MessageHistory):
+    '''Base for histories that keep their messages somewhere other than the underlying list.
+        Subclasses implement __len__, __getitem__, __iter__, append, and _rewrite. Everything else
+        in the list interface is implemented here in terms of those, with any change other than
+        an append done by rewriting the messages after the first changed position.
+    '''
+    def _rewrite(self, messages: list[BaseMessage], start: int = 0) -> None:
+        '''Replace everything from position `start` onwards with `messages` and rebuild the index.'''
+        raise NotImplementedError
+
+    ############################# Reading #############################
+    def __reversed__(self) -> typing.Iterator[BaseMessage]:
+        for i in range(len(self) - 1, -1, -1):
+            yield self[i]
+
+    def __contains__(self, message: object) -> bool:
+        return any(m is message or m == message for m in self)
+
+    def index(self, message: BaseMessage, start: typing.SupportsIndex = 0, stop: typing.SupportsIndex | None = None) -> int:
+        for i in range(*slice(start, stop).indices(len(self))):
+            if self[i] == message:
+                return i
+        raise ValueError(f'{message!r} is not in history')
+
+    def count(self, message: BaseMessage) -> int:
+        return sum(1 for m in self if m == message)
+
+    def copy(self) -> list[BaseMessage]:
+        return list(self)
+
+    def __add__(self, other: typing.Iterable[BaseMessage]) -> list[BaseMessage]:
+        return [*self, *other]
+
+    def windowed(self, policy: WindowPolicy, extra: typing.Sequence[BaseMessage] = ()) -> list[BaseMessage]:
+        '''Apply the policy to a view of the history and `extra` rather than a copy, so that only
+            the messages the policy looks at are loaded.
+        '''
+        return policy.apply(_ExtendedView(self, extra))
+
+    def __radd__(self, other: typing.Iterable[BaseMessage]) -> list[BaseMessage]:
+        return [*other, *self]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, list):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other: object) -> bool:
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({list(self)!r})'
+
+    ############################# Writing #############################
+    def _mutate(self, start: int, func: typing.Callable[[list[BaseMessage]], typing.Any]) -> typing.Any:
+        '''Apply a list mutation to messages start: and rewrite them.'''
+        tail = self[start:]
+        result = func(tail)
+        self._rewrite(tail, start)
+        return result
+
+    def _first_changed(self, index) -> int:
+        if isinstance(index, slice):
+            start, _, step = index.indices(len(self))
+            return start if step > 0 else 0
+        i = index.__index__()
+        return max(i + len(self), 0) if i < 0 else min(i, len(self))
+
+    def insert(self, index: typing.SupportsIndex, message: BaseMessage) -> None:
+        start = self._first_changed(index)
+        self._mutate(start, lambda tail: tail.insert(0, message))
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            self._mutate(0, lambda messages: messages.__setitem__(index, value))
+        else:
+            self[index] # raises IndexError if out of range
+            self._mutate(self._first_changed(index), lambda tail: tail.__setitem__(0, value))
+
+    def __delitem__(self, index) -> None:
+        if isinstance(index, slice) and index.step in (None, 1) and (index.stop is None or index.stop >= len(self)):
+            self._rewrite([], self._first_changed(index)) # truncation is cheap
+        elif isinstance(index, slice):
+            self._mutate(0, lambda messages: messages.__delitem__(index))
+        else:
+            self[index] # raises IndexError if out of range
+            self._mutate(self._first_changed(index), lambda tail: tail.__delitem__(0))
+
+    def pop(self, index: typing.SupportsIndex = -1) -> BaseMessage:
+        start = self._first_changed(index)
+        return self._mutate(start, lambda tail: tail.pop(0))
+
+    def remove(self, message: BaseMessage) -> None:
+        self.pop(self.index(message))
+
+    def clear(self) -> None:
+        self._rewrite([], 0)
 
+    def reverse(self) -> None:
+        self._mutate(0, lambda messages: messages.reverse())
 
+    def sort(self, *args, **kwargs) -> None:
+        self._mutate(0, lambda messages: messages.sort(*args, **kwargs))
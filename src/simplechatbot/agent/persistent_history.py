@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import collections
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+
+from langchain_core.messages import (
+    BaseMessage,
+    AIMessage,
+    ToolMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+
+from .message_history import MessageHistory, _VirtualMessageHistory
+
+ToolIds = tuple[list[str], str | None]
+'''(ids of tool calls made by a message, id of the tool call a message answers).'''
+
+
+def encode_message(message: BaseMessage) -> str:
+    return json.dumps(message_to_dict(message), default=str, separators=(',', ':'))
+
+
+def decode_message(data: str | bytes) -> BaseMessage:
+    return messages_from_dict([json.loads(data)])[0]
+
+
+def message_tool_ids(message: BaseMessage) -> ToolIds:
+    '''Get the tool call ids a message creates or resolves, stored so the tool index can be
+        rebuilt without deserializing messages.'''
+    if isinstance(message, AIMessage):
+        return [tc['id'] for tc in message.tool_calls if tc.get('id') is not None], None
+    elif isinstance(message, ToolMessage):
+        return [], message.tool_call_id
+    return [], None
+
+
+############################# Message stores #############################
+class MessageStore:
+    '''Append-only storage for the messages of a single session.
+        Messages are addressed by position. Subclasses implement every method.
+    '''
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def append(self, message: BaseMessage) -> None:
+        raise NotImplementedError
+
+    def read(self, start: int, stop: int) -> list[BaseMessage]:
+        '''Deserialize messages start:stop.'''
+        raise NotImplementedError
+
+    def tool_ids(self) -> typing.Iterator[ToolIds]:
+        '''Get tool ids of every message with tool calls or results, in order.'''
+        raise NotImplementedError
+
+    def truncate(self, length: int) -> None:
+        '''Drop all messages after the first `length`.'''
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+@dataclasses.dataclass(repr=False)
+class JsonlMessageStore(MessageStore):
+    '''Stores one message per line of a JSONL file.
+        Each line is a small JSON header with the message's tool ids, a tab, then the message itself.
+        Opening a file only scans line offsets and headers, so no message is deserialized until read.
+        A partially written last line (e.g. from a crash) is dropped when the file is opened.
+    '''
+    path: str | pathlib.Path
+    _offsets: list[int] = dataclasses.field(default_factory=list)
+    _headers: list[tuple[int, ToolIds]] = dataclasses.field(default_factory=list)
+    _file: typing.BinaryIO | None = None
+    _lock: threading.RLock = dataclasses.field(default_factory=threading.RLock)
+
+    def __post_init__(self):
+        self._file = open(self.path, 'a+b')
+        self._file.seek(0)
+        offset = 0
+        for line in self._file:
+            if not line.endswith(b'\n'):
+                break
+            header, _, _ = line.partition(b'\t')
+            calls, result = json.loads(header)
+            if len(calls) or result is not None:
+                self._headers.append((len(self._offsets), (calls, result)))
+            self._offsets.append(offset)
+            offset += len(line)
+        self._file.truncate(offset)
+        self._offsets.append(offset) # end of the last message
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def append(self, message: BaseMessage) -> None:
+        tool_ids = message_tool_ids(message)
+        line = (json.dumps(tool_ids, separators=(',', ':')) + '\t' + encode_message(message) + '\n').encode()
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(line)
+            self._file.flush()
+            if len(tool_ids[0]) or tool_ids[1] is not None:
+                self._headers.append((len(self), tool_ids))
+            self._offsets.append(self._offsets[-1] + len(line))
+
+    def read(self, start: int, stop: int) -> list[BaseMessage]:
+        if start >= stop:
+            return []
+        with self._lock:
+            self._file.seek(self._offsets[start])
+            data = self._file.read(self._offsets[stop] - self._offsets[start])
+        return [decode_message(line.partition(b'\t')[2]) for line in data.splitlines()]
+
+    def tool_ids(self) -> typing.Iterator[ToolIds]:
+        with self._lock:
+            headers = list(self._headers)
+        return (ids for _, ids in headers)
+
+    def truncate(self, length: int) -> None:
+        with self._lock:
+            self._file.truncate(self._offsets[length])
+            self._file.flush()
+            del self._offsets[length+1:]
+            self._headers = [(i, ids) for i, ids in self._headers if i < length]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __reduce__(self):
+        return (self.__class__, (self.path,))
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(path={str(self.path)!r}, num_messages={len(self)})'
+
+
+@dataclasses.dataclass(repr=False)
+class SqliteMessageStore(MessageStore):
+    '''Stores messages in a SQLite table. Many sessions can share one database file.
+        Tool ids are kept in their own columns so the tool index is rebuilt without reading messages.
+    '''
+    path: str | pathlib.Path
+    session_id: str = 'default'
+    _length: int = 0
+    _conn: sqlite3.Connection | None = None
+    _lock: threading.RLock = dataclasses.field(default_factory=threading.RLock)
+
+    def __post_init__(self):
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS messages (session TEXT NOT NULL, idx INTEGER NOT NULL, '
+            'calls TEXT, result TEXT, body TEXT NOT NULL, PRIMARY KEY (session, idx))'
+        )
+        self._conn.commit()
+        self._length = self._conn.execute('SELECT COUNT(*) FROM messages WHERE session = ?', (self.session_id,)).fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, message: BaseMessage) -> None:
+        calls, result = message_tool_ids(message)
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO messages (session, idx, calls, result, body) VALUES (?, ?, ?, ?, ?)',
+                (self.session_id, self._length, json.dumps(calls) if len(calls) else None, result, encode_message(message)),
+            )
+            self._conn.commit()
+            self._length += 1
+
+    def read(self, start: int, stop: int) -> list[BaseMessage]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT body FROM messages WHERE session = ? AND idx >= ? AND idx < ? ORDER BY idx',
+                (self.session_id, start, stop),
+            ).fetchall()
+        return [decode_message(body) for body, in rows]
+
+    def tool_ids(self) -> typing.Iterator[ToolIds]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT calls, result FROM messages WHERE session = ? AND (calls IS NOT NULL OR result IS NOT NULL) ORDER BY idx',
+                (self.session_id,),
+            ).fetchall()
+        return ((json.loads(calls) if calls is not None else [], result) for calls, result in rows)
+
+    def truncate(self, length: int) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM messages WHERE session = ? AND idx >= ?', (self.session_id, length))
+            self._conn.commit()
+            self._length = min(self._length, length)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __reduce__(self):
+        return (self.__class__, (self.path, self.session_id))
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(path={str(self.path)!r}, session_id={self.session_id!r}, num_messages={len(self)})'
+
+
+############################# History #############################
+class PersistentMessageHistory(_VirtualMessageHistory):
+    '''MessageHistory whose messages live in a MessageStore instead of in memory.
+        Appends are written through to the store. The most recently used messages (including every
+        newly added one) are kept in an in-memory LRU of `cache_size` messages, and older messages
+        are read from the store when accessed. Opening an existing session only rebuilds the tool
+        call index from stored metadata, so no messages are deserialized at startup.
+        Changes other than appends (insert, del, etc) are supported but rewrite the store from the
+        first changed position. clone() and empty() return ordinary in-memory histories.
+    Example:
+        history = PersistentMessageHistory.from_sqlite('sessions.db', session_id=user_id)
+        agent = Agent.from_model(model, system_prompt='You are a helpful assistant.', history=history)
+    '''
+    store: MessageStore
+    cache_size: int
+    _cache: collections.OrderedDict[int, BaseMessage]
+    _lock: threading.RLock
+
+    def __init__(self, store: MessageStore, cache_size: int = 256):
+        self.store = store
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._lock = threading.RLock()
+        super().__init__() # builds the tool call index
+
+    ############################# Constructors #############################
+    @classmethod
+    def from_jsonl(cls, path: str | pathlib.Path, cache_size: int = 256) -> typing.Self:
+        '''Open (or create) a history stored in a JSONL file.'''
+        return cls(JsonlMessageStore(path), cache_size=cache_size)
+
+    @classmethod
+    def from_sqlite(cls, path: str | pathlib.Path, session_id: str = 'default', cache_size: int = 256) -> typing.Self:
+        '''Open (or create) a session stored in a SQLite database.'''
+        return cls(SqliteMessageStore(path, session_id=session_id), cache_size=cache_size)
+
+    def empty(self, keep_system_prompt: bool = False) -> MessageHistory:
+        '''Get a new in-memory history, keeping the system prompt if desired.'''
+        return MessageHistory([self.system_prompt] if keep_system_prompt else [])
+
+    def clone(self) -> MessageHistory:
+        '''Get an in-memory copy of this history. Changes to it are not persisted.'''
+        return MessageHistory(self)
+
+    def close(self) -> None:
+        self.store.close()
+
+    ############################# Reading #############################
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            indices = range(*index.indices(len(self)))
+            if len(indices) == 0:
+                return []
+            lo, hi = min(indices), max(indices) + 1
+            messages = self._read_range(lo, hi, cache=False)
+            return [messages[i - lo] for i in indices]
+
+        i = index.__index__()
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('message history index out of range')
+        with self._lock:
+            if i in self._cache:
+                self._cache.move_to_end(i)
+                return self._cache[i]
+        return self._read_range(i, i+1, cache=True)[0]
+
+    def _read_range(self, start: int, stop: int, cache: bool) -> list[BaseMessage]:
+        '''Get messages start:stop, reading only the span of uncached messages from the store.'''
+        with self._lock:
+            missing = [i for i in range(start, stop) if i not in self._cache]
+            if len(missing):
+                lo = missing[0]
+                loaded = self.store.read(lo, missing[-1] + 1)
+                if cache:
+                    for i in missing:
+                        self._cache_message(i, loaded[i - lo])
+            return [self._cache[i] if i in self._cache else loaded[i - lo] for i in range(start, stop)]
+
+    def _cache_message(self, index: int, message: BaseMessage) -> None:
+        self._cache[index] = message
+        self._cache.move_to_end(index)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def __iter__(self) -> typing.Iterator[BaseMessage]:
+        page_size = max(self.cache_size, 1)
+        for start in range(0, len(self), page_size):
+            yield from self._read_range(start, min(start + page_size, len(self)), cache=False)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(store={self.store!r})'
+
+    def __reduce__(self):
+        return (self.__class__, (self.store, self.cache_size))
+
+    ############################# Writing #############################
+    def append(self, message: BaseMessage) -> None:
+        with self._lock:
+            self.store.append(message)
+            self._cache_message(len(self.store) - 1, message)
+        self._index_message(message)
+
+    def _rewrite(self, messages: list[BaseMessage], start: int = 0) -> None:
+        '''Replace everything from position `start` onwards with `messages`.'''
+        with self._lock:
+            self.store.truncate(start)
+            for i in [i for i in self._cache if i >= start]:
+                del self._cache[i]
+            for message in messages:
+                self.store.append(message)
+                self._cache_message(len(self.store) - 1, message)
+        self._reindex()
+
+    ############################# Tool call index #############################
+    def _reindex(self) -> None:
+        '''Rebuild the tool call index from the store's metadata rather than the messages.'''
+        self._pending_tool_ids = set()
+        self._executed_tool_ids = set()
+        for calls, result in self.store.tool_ids():
+            for tool_call_id in calls:
+                if tool_call_id not in self._executed_tool_ids:
+                    self._pending_tool_ids.add(tool_call_id)
+            if result is not None:
+                self._executed_tool_ids.add(result)
+                self._pending_tool_ids.discard(result)
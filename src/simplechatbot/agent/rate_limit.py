@@ -0,0 +1,424 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import asyncio
+import collections
+import threading
+import time
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.ai import UsageMetadata, add_usage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .context_window import approximate_token_count, TokenCounter
+from .response_cache import runnable_fingerprint
+
+if typing.TYPE_CHECKING:
+    from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+    from langchain_core.runnables import Runnable
+    from langchain_core.tools import BaseTool
+    from .agent import Agent
+
+_shared_limiters: dict[str, RateLimiter] = dict()
+_shared_lock = threading.Lock()
+
+
+@dataclasses.dataclass
+class RateLimitStats:
+    '''Queue wait times and token usage for a RateLimiter. Wait percentiles cover the most recent requests.'''
+    num_requests: int = 0
+    num_waiting: int = 0
+    in_flight: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    p50_wait: float = 0.0
+    p95_wait: float = 0.0
+    estimated_tokens: int = 0
+    actual_tokens: int = 0
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.num_requests if self.num_requests > 0 else 0.0
+
+
+@dataclasses.dataclass
+class _Bucket:
+    '''Token bucket refilled continuously at per_minute/60 per second, holding up to one minute of quota.
+        The level may go negative: a reservation takes its amount immediately and waits for the deficit to refill.
+    '''
+    per_minute: float
+    level: float = -1.0
+    updated: float = dataclasses.field(default_factory=time.monotonic)
+
+    def __post_init__(self):
+        if self.level < 0:
+            self.level = self.per_minute
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        '''Take `amount` and get the seconds to wait until it has refilled.'''
+        self._refill(now)
+        self.level -= amount
+        return max(0.0, -self.level * 60 / self.per_minute)
+
+    def refund(self, amount: float, now: float) -> None:
+        '''Return (or, if negative, take) the difference between reserved and actual usage.'''
+        self._refill(now)
+        self.level = min(self.per_minute, self.level + amount)
+
+
+@dataclasses.dataclass(repr=False)
+class _FairGate:
+    '''Concurrency limit that admits waiting threads and coroutines in arrival order.
+        A released slot is handed directly to the next waiter, so later arrivals cannot barge in.
+    '''
+    limit: int
+    _in_use: int = 0
+    _waiters: collections.deque[threading.Event | tuple[asyncio.AbstractEventLoop, asyncio.Future]] = dataclasses.field(default_factory=collections.deque)
+    _lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._in_use < self.limit and len(self._waiters) == 0:
+                self._in_use += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_use < self.limit and len(self._waiters) == 0:
+                self._in_use += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            self.release() # the slot was already handed to us
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            if len(self._waiters) == 0:
+                self._in_use -= 1
+                return
+            waiter = self._waiters.popleft()
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+        else:
+            loop, future = waiter
+            loop.call_soon_threadsafe(_set_future, future)
+
+    @property
+    def num_waiting(self) -> int:
+        return len(self._waiters)
+
+
+def _set_future(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+@dataclasses.dataclass(repr=False)
+class RateLimitLease:
+    '''Permission to send one request. Release it when the response is complete, passing the
+        actual token usage (if known) so the difference from the estimate is returned to the bucket.
+    '''
+    limiter: RateLimiter
+    estimated_tokens: int
+    wait: float
+    _released: bool = False
+
+    def release(self, actual_tokens: int | None = None) -> None:
+        if not self._released:
+            self._released = True
+            self.limiter._release(self, actual_tokens)
+
+    def __enter__(self) -> typing.Self:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+
+@dataclasses.dataclass(repr=False)
+class RateLimiter:
+    '''Client-side limit on requests/min, tokens/min, and concurrent requests for a provider.
+        Each request reserves its estimated tokens (prompt tokens plus the maximum completion) and one
+        request from token buckets holding a minute of quota, then waits until both have refilled.
+        Reservations are made in arrival order, so callers are queued fairly (a large request is not
+        starved by small ones) instead of failing with 429s. Once a response arrives the estimate is
+        corrected using its usage metadata. Works for threads (including model.batch) and coroutines.
+        Use RateLimiter.shared() to get one limiter per provider for the whole process.
+    Args:
+        requests_per_minute: request quota (None for no limit).
+        tokens_per_minute: token quota (None for no limit).
+        max_concurrency: maximum requests in flight (None for no limit).
+        completion_tokens: completion tokens reserved when the model has no max_tokens setting.
+        token_counter: estimates prompt tokens per message.
+    Example:
+        limiter = RateLimiter.shared('openai', requests_per_minute=500, tokens_per_minute=200_000)
+        agent = limiter.attach(OpenAIAgent.new())
+    '''
+    requests_per_minute: float | None = None
+    tokens_per_minute: float | None = None
+    max_concurrency: int | None = None
+    completion_tokens: int = 1024
+    token_counter: TokenCounter = approximate_token_count
+    window: int = 1000
+    _requests: _Bucket | None = None
+    _tokens: _Bucket | None = None
+    _gate: _FairGate | None = None
+    _stats: RateLimitStats = dataclasses.field(default_factory=RateLimitStats)
+    _waits: collections.deque[float] = dataclasses.field(default_factory=collections.deque)
+    _lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+    def __post_init__(self):
+        if self.requests_per_minute is not None:
+            self._requests = _Bucket(self.requests_per_minute)
+        if self.tokens_per_minute is not None:
+            self._tokens = _Bucket(self.tokens_per_minute)
+        if self.max_concurrency is not None:
+            self._gate = _FairGate(self.max_concurrency)
+        self._waits = collections.deque(maxlen=self.window)
+
+    @classmethod
+    def shared(cls, provider: str, **kwargs) -> RateLimiter:
+        '''Get the process-wide limiter for a provider, creating it with kwargs on first use.
+            Later calls may omit kwargs, but raise ValueError if they pass settings that differ from the existing limiter's.
+        '''
+        with _shared_lock:
+            if provider not in _shared_limiters:
+                _shared_limiters[provider] = cls(**kwargs)
+            limiter = _shared_limiters[provider]
+        conflicts = {k: v for k, v in kwargs.items() if getattr(limiter, k) != v}
+        if len(conflicts):
+            raise ValueError(f'The shared limiter for {provider!r} already exists with different settings: {limiter!r} (requested {conflicts}).')
+        return limiter
+
+    ############################# attaching to models #############################
+    def wrap(self, model: BaseChatModel) -> RateLimitedChatModel:
+        '''Get a model whose requests go through this limiter.'''
+        if isinstance(model, RateLimitedChatModel) and model.limiter is self:
+            return model
+        max_tokens = getattr(model, 'max_tokens', None) or getattr(model, 'max_completion_tokens', None)
+        return RateLimitedChatModel(
+            model = model,
+            limiter = self,
+            max_completion_tokens = max_tokens if isinstance(max_tokens, int) else None,
+            model_name = getattr(model, 'model_name', None) or type(model).__name__,
+        )
+
+    def attach(self, agent: Agent) -> Agent:
+        '''Route all of an agent's model calls through this limiter. Returns the agent.'''
+        agent._model = self.wrap(agent._model)
+        return agent
+
+    ############################# acquiring #############################
+    def estimate_tokens(self, messages: list[BaseMessage], max_completion_tokens: int | None = None) -> int:
+        '''Estimated prompt tokens plus the maximum completion tokens.'''
+        completion = max_completion_tokens if max_completion_tokens is not None else self.completion_tokens
+        return sum(self.token_counter(m) for m in messages) + completion
+
+    def _reserve(self, tokens: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            wait = 0.0
+            if self._requests is not None:
+                wait = max(wait, self._requests.reserve(1, now))
+            if self._tokens is not None:
+                wait = max(wait, self._tokens.reserve(tokens, now))
+            return wait
+
+    def _enqueue(self) -> float:
+        with self._lock:
+            self._stats.num_waiting += 1
+        return time.monotonic()
+
+    def _admitted(self, tokens: int, start: float) -> RateLimitLease:
+        wait = time.monotonic() - start
+        with self._lock:
+            self._stats.num_waiting -= 1
+            self._stats.num_requests += 1
+            self._stats.in_flight += 1
+            self._stats.total_wait += wait
+            self._stats.max_wait = max(self._stats.max_wait, wait)
+            self._stats.estimated_tokens += tokens
+            self._waits.append(wait)
+        return RateLimitLease(limiter=self, estimated_tokens=tokens, wait=wait)
+
+    def acquire(self, tokens: int) -> RateLimitLease:
+        '''Block until a request using `tokens` may be sent.'''
+        start = self._enqueue()
+        if self._gate is not None:
+            self._gate.acquire()
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return self._admitted(tokens, start)
+
+    async def aacquire(self, tokens: int) -> RateLimitLease:
+        '''Wait (without blocking the event loop) until a request using `tokens` may be sent.'''
+        start = self._enqueue()
+        try:
+            if self._gate is not None:
+                await self._gate.aacquire()
+        except asyncio.CancelledError:
+            with self._lock:
+                self._stats.num_waiting -= 1
+            raise
+        try:
+            wait = self._reserve(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            with self._lock:
+                self._stats.num_waiting -= 1
+            if self._gate is not None:
+                self._gate.release()
+            raise
+        return self._admitted(tokens, start)
+
+    def _release(self, lease: RateLimitLease, actual_tokens: int | None) -> None:
+        with self._lock:
+            self._stats.in_flight -= 1
+            if actual_tokens is not None:
+                self._stats.actual_tokens += actual_tokens
+                if self._tokens is not None:
+                    self._tokens.refund(lease.estimated_tokens - actual_tokens, time.monotonic())
+        if self._gate is not None:
+            self._gate.release()
+
+    ############################# stats #############################
+    def stats(self) -> RateLimitStats:
+        '''Get a snapshot of queue wait times and token usage.'''
+        with self._lock:
+            waits = sorted(self._waits)
+            return dataclasses.replace(
+                self._stats,
+                p50_wait = waits[len(waits)//2] if waits else 0.0,
+                p95_wait = waits[min(int(len(waits)*0.95), len(waits)-1)] if waits else 0.0,
+            )
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(requests_per_minute={self.requests_per_minute}, tokens_per_minute={self.tokens_per_minute}, max_concurrency={self.max_concurrency})'
+
+
+def _usage_tokens(message: AIMessage | AIMessageChunk | None) -> int | None:
+    usage = getattr(message, 'usage_metadata', None)
+    return usage.get('total_tokens') if usage else None
+
+
+def _add_chunk_usage(usage: UsageMetadata | None, chunk: AIMessageChunk) -> UsageMetadata | None:
+    '''Accumulate usage over a stream. Providers may split it across chunks (e.g. input tokens first, output tokens last).'''
+    chunk_usage = getattr(chunk, 'usage_metadata', None)
+    return add_usage(usage, chunk_usage) if chunk_usage else usage
+
+
+class RateLimitedChatModel(BaseChatModel):
+    '''Chat model that sends every request through a RateLimiter. Create with RateLimiter.wrap().
+        bind_tools() binds the wrapped model, so tool calling and with_structured_output() work as usual.
+    '''
+    model: typing.Any # BaseChatModel or tool-bound Runnable; Any avoids pydantic coercion
+    limiter: typing.Any # RateLimiter
+    max_completion_tokens: int | None = None
+    model_name: str = 'rate-limited'
+
+    @property
+    def _llm_type(self) -> str:
+        return 'simplechatbot-rate-limited'
+
+    @property
+    def _identifying_params(self) -> dict[str, typing.Any]:
+        # the wrapped model's settings and bound tools, so differently configured models do not share cache entries
+        return {'model_name': self.model_name, 'model': runnable_fingerprint(self.model)}
+
+    def bind_tools(
+        self,
+        tools: typing.Sequence[BaseTool | dict | type | typing.Callable],
+        tool_choice: str | None = None,
+        **kwargs,
+    ) -> Runnable[typing.Any, AIMessage]:
+        if tool_choice is not None:
+            kwargs['tool_choice'] = tool_choice
+        return self.model_copy(update={'model': self.model.bind_tools(tools, **kwargs)})
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        lease = self.limiter.acquire(self.limiter.estimate_tokens(messages, self.max_completion_tokens))
+        message = None
+        try:
+            message = self.model.invoke(messages, stop=stop, **kwargs)
+        finally:
+            lease.release(_usage_tokens(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        lease = await self.limiter.aacquire(self.limiter.estimate_tokens(messages, self.max_completion_tokens))
+        message = None
+        try:
+            message = await self.model.ainvoke(messages, stop=stop, **kwargs)
+        finally:
+            lease.release(_usage_tokens(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> typing.Iterator[ChatGenerationChunk]:
+        lease = self.limiter.acquire(self.limiter.estimate_tokens(messages, self.max_completion_tokens))
+        usage = None
+        try:
+            for chunk in self.model.stream(messages, stop=stop, **kwargs):
+                usage = _add_chunk_usage(usage, chunk)
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager is not None:
+                    run_manager.on_llm_new_token(chunk.content, chunk=generation)
+                yield generation
+        finally:
+            lease.release(usage['total_tokens'] if usage else None)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> typing.AsyncIterator[ChatGenerationChunk]:
+        lease = await self.limiter.aacquire(self.limiter.estimate_tokens(messages, self.max_completion_tokens))
+        usage = None
+        try:
+            async for chunk in self.model.astream(messages, stop=stop, **kwargs):
+                usage = _add_chunk_usage(usage, chunk)
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager is not None:
+                    await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+                yield generation
+        finally:
+            lease.release(usage['total_tokens'] if usage else None)
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import collections
+import hashlib
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+import uuid
+
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    ToolMessage,
+    convert_to_messages,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import RunnableBinding, RunnableSequence
+
+if typing.TYPE_CHECKING:
+    from langchain_core.runnables import Runnable
+
+
+@dataclasses.dataclass
+class ResponseCacheStats:
+    '''Hit/miss counts for a ResponseCache.'''
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    size: int = 0
+    num_bytes: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+@dataclasses.dataclass(repr=False)
+class ResponseCache:
+    '''Caches model responses keyed on a canonical hash of the request.
+        The key covers a canonical form of the messages (see canonical_messages), the model settings, bound tool schemas and tool_choice
+        (taken from the bound model), and any extra invoke kwargs. Responses are kept in an in-memory
+        LRU bounded by entry count and (optionally) total bytes, and optionally in a SQLite
+        database so they can be reused across processes.
+    Example:
+        agent = Agent.from_model(model, response_cache=ResponseCache(sqlite_path='responses.db'))
+    '''
+    max_entries: int = 1024
+    max_bytes: int | None = None
+    sqlite_path: str | pathlib.Path | None = None
+    _memory: collections.OrderedDict[str, str] = dataclasses.field(default_factory=collections.OrderedDict)
+    _memory_bytes: int = 0
+    _stats: ResponseCacheStats = dataclasses.field(default_factory=ResponseCacheStats)
+    _fingerprints: dict[int, tuple[typing.Any, str]] = dataclasses.field(default_factory=dict)
+    _conn: sqlite3.Connection | None = None
+    _lock: threading.RLock = dataclasses.field(default_factory=threading.RLock)
+
+    def __post_init__(self):
+        if self.sqlite_path is not None:
+            self._conn = sqlite3.connect(str(self.sqlite_path), check_same_thread=False)
+            self._conn.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)')
+            self._conn.commit()
+
+    ############################# keys #############################
+    def make_key(self,
+        model: Runnable,
+        messages: BaseMessage | str | typing.Sequence[BaseMessage | str],
+        **kwargs,
+    ) -> str:
+        '''Get the cache key for a request.'''
+        if isinstance(messages, (str, BaseMessage)):
+            messages = [messages]
+        payload = json.dumps(
+            [
+                self.runnable_fingerprint(model),
+                canonical_messages(convert_to_messages(messages)),
+                kwargs,
+            ],
+            sort_keys = True,
+            default = str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def runnable_fingerprint(self, runnable: Runnable) -> str:
+        '''Get a string describing the model settings and anything bound to it (tool schemas, tool_choice).
+            Memoized by identity because bound models are reused across turns.
+        '''
+        with self._lock:
+            cached = self._fingerprints.get(id(runnable))
+            if cached is not None and cached[0] is runnable:
+                return cached[1]
+
+        fp = runnable_fingerprint(runnable)
+
+        with self._lock:
+            if len(self._fingerprints) >= 1024:
+                self._fingerprints.clear()
+            self._fingerprints[id(runnable)] = (runnable, fp)
+        return fp
+
+    ############################# raw access #############################
+    def get(self, key: str) -> str | None:
+        '''Get a serialized response, checking memory then disk.'''
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._stats.memory_hits += 1
+                return value
+
+            if self._conn is not None:
+                row = self._conn.execute('SELECT value FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    self._stats.disk_hits += 1
+                    self._put_memory(key, row[0])
+                    return row[0]
+
+            self._stats.misses += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        '''Store a serialized response in all tiers.'''
+        with self._lock:
+            self._put_memory(key, value)
+            if self._conn is not None:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO responses (key, value, created) VALUES (?, ?, ?)',
+                    (key, value, time.time()),
+                )
+                self._conn.commit()
+
+    def _put_memory(self, key: str, value: str) -> None:
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+        while len(self._memory) > self.max_entries or (self.max_bytes is not None and self._memory_bytes > self.max_bytes and len(self._memory) > 1):
+            _, old_value = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old_value)
+
+    ############################# message access #############################
+    def get_message(self, key: str) -> AIMessage | None:
+        '''Get a cached AIMessage. Tool call ids are regenerated so replayed calls get fresh ToolMessages.'''
+        value = self.get(key)
+        if value is None:
+            return None
+        message = messages_from_dict([json.loads(value)])[0]
+        return with_fresh_tool_call_ids(message)
+
+    def put_message(self, key: str, message: AIMessage) -> None:
+        self.put(key, json.dumps(message_to_dict(message)))
+
+    ############################# other #############################
+    def stats(self) -> ResponseCacheStats:
+        '''Get a snapshot of the hit/miss counts.'''
+        with self._lock:
+            return dataclasses.replace(self._stats, size=len(self._memory), num_bytes=self._memory_bytes)
+
+    def clear(self) -> None:
+        '''Remove all cached responses from memory and disk.'''
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._conn is not None:
+                self._conn.execute('DELETE FROM responses')
+                self._conn.commit()
+
+    def close(self) -> None:
+        '''Close the SQLite connection, if any.'''
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def __repr__(self) -> str:
+        s = self.stats()
+        return f'{self.__class__.__name__}(size={s.size}, hits={s.hits}, misses={s.misses}, sqlite_path={self.sqlite_path})'
+
+
+def runnable_fingerprint(runnable: Runnable) -> str:
+    '''Describe a model's settings and anything bound to it (tool schemas, tool_choice).
+        Wrapper models (e.g. HedgedChatModel) include their members' fingerprints in _identifying_params.
+    '''
+    if isinstance(runnable, RunnableBinding):
+        return json.dumps([runnable_fingerprint(runnable.bound), runnable.kwargs], sort_keys=True, default=str)
+    elif isinstance(runnable, RunnableSequence):
+        return json.dumps([runnable_fingerprint(step) for step in runnable.steps])
+    elif isinstance(runnable, BaseChatModel):
+        return json.dumps([type(runnable).__name__, runnable._identifying_params], sort_keys=True, default=str)
+    return repr(runnable)
+
+
+def canonical_messages(messages: typing.Sequence[BaseMessage]) -> list[dict[str, typing.Any]]:
+    '''Get the parts of each message that affect the reply, for use in cache keys.
+        Message ids and response/usage metadata are left out because they change on every call, and
+        tool call ids are replaced by their position because replayed tool calls get fresh ids.
+    '''
+    positions: dict[str, int] = dict()
+    def position(tool_call_id: str | None) -> int | str | None:
+        if tool_call_id is None:
+            return None
+        return positions.setdefault(tool_call_id, len(positions))
+
+    canonical = list()
+    for message in messages:
+        entry = {'type': message.type, 'content': message.content, 'name': message.name}
+        if isinstance(message, AIMessage):
+            entry['tool_calls'] = [[tc['name'], tc['args'], position(tc.get('id'))] for tc in message.tool_calls]
+        if isinstance(message, ToolMessage):
+            entry['tool_call_id'] = position(message.tool_call_id)
+        if isinstance(message.content, list):
+            entry['content'] = [
+                {**block, 'id': position(block['id'])} if isinstance(block, dict) and block.get('id') in positions else block
+                for block in message.content
+            ]
+        canonical.append(entry)
+    return canonical
+
+
+def with_fresh_tool_call_ids(message: AIMessage) -> AIMessage:
+    '''Copy the message, giving each tool call a new id.'''
+    if not len(message.tool_calls):
+        return message
+    return message.model_copy(update={
+        'tool_calls': [{**tc, 'id': f'call_{uuid.uuid4().hex[:24]}'} for tc in message.tool_calls],
+    })
+
+
+def message_to_chunk(message: AIMessage) -> AIMessageChunk:
+    '''Convert a complete AIMessage into a single chunk so it can be replayed as a stream.'''
+    return AIMessageChunk(
+        content = message.content,
+        additional_kwargs = message.additional_kwargs,
+        response_metadata = message.response_metadata,
+        usage_metadata = message.usage_metadata,
+        id = message.id,
+        tool_call_chunks = [
+            tool_call_chunk(name=tc['name'], args=json.dumps(tc['args']), id=tc['id'], index=i)
+            for i, tc in enumerate(message.tool_calls)
+        ],
+    )
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import time
+
+from .context_window import approximate_token_count
+
+if typing.TYPE_CHECKING:
+    from .chatresult import ChatResult
+    from .toolset import ToolCallResult
+    from .types import ToolCallID
+
+RunStopReason = typing.Literal['complete', 'max_iterations', 'deadline', 'token_budget']
+
+
+@dataclasses.dataclass(repr=False)
+class RunStep:
+    '''One model call in a tool loop and the tool calls it made.'''
+    iteration: int
+    result: ChatResult
+    tool_results: dict[ToolCallID, ToolCallResult]
+    model_time: float
+    tool_time: float
+    tokens: int
+
+    @property
+    def content(self) -> str:
+        return self.result.content
+
+    def __repr__(self) -> str:
+        tool_names = [tr.info.name for tr in self.tool_results.values()]
+        return f'{self.__class__.__name__}(iteration={self.iteration}, tools={tool_names}, model_time={self.model_time:.3f}, tool_time={self.tool_time:.3f}, tokens={self.tokens})'
+
+
+@dataclasses.dataclass(repr=False)
+class RunTrace:
+    '''Every step taken by Agent.run, and why the loop stopped.'''
+    steps: list[RunStep] = dataclasses.field(default_factory=list)
+    stop_reason: RunStopReason | None = None
+    start: float = dataclasses.field(default_factory=time.perf_counter)
+    end: float | None = None
+
+    def add_step(self, step: RunStep) -> None:
+        self.steps.append(step)
+
+    def stop(self, reason: RunStopReason) -> typing.Self:
+        self.stop_reason = reason
+        self.end = time.perf_counter()
+        return self
+
+    @property
+    def final(self) -> ChatResult:
+        '''The result of the last model call.'''
+        if len(self.steps) == 0:
+            raise ValueError(f'The run made no model calls (stop reason: {self.stop_reason}).')
+        return self.steps[-1].result
+
+    @property
+    def content(self) -> str:
+        '''Content of the last model response.'''
+        return self.final.content
+
+    @property
+    def completed(self) -> bool:
+        '''Whether the model finished without making more tool calls (rather than hitting a limit).'''
+        return self.stop_reason == 'complete'
+
+    @property
+    def elapsed(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(step.tokens for step in self.steps)
+
+    @property
+    def tool_results(self) -> dict[ToolCallID, ToolCallResult]:
+        '''Results of all tool calls made during the run, in call order.'''
+        return {tid: tr for step in self.steps for tid, tr in step.tool_results.items()}
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __iter__(self) -> typing.Iterator[RunStep]:
+        return iter(self.steps)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(num_steps={len(self.steps)}, stop_reason={self.stop_reason}, elapsed={self.elapsed:.3f}, total_tokens={self.total_tokens})'
+
+
+@dataclasses.dataclass
+class RunLimits:
+    '''Limits checked between the steps of a tool loop. None disables a limit.
+        The deadline (seconds since the run started) and token budget are checked before each
+        model call, so a single slow call can overrun them.
+    '''
+    max_iterations: int | None = 10
+    deadline: float | None = None
+    max_tokens: int | None = None
+
+    def __post_init__(self):
+        if self.max_iterations is not None and self.max_iterations < 1:
+            raise ValueError(f'max_iterations must be at least 1 (or None for no limit), got {self.max_iterations}.')
+
+    def check(self, trace: RunTrace) -> RunStopReason | None:
+        '''Get the reason to stop before the next model call, if any.'''
+        if self.max_iterations is not None and len(trace) >= self.max_iterations:
+            return 'max_iterations'
+        if self.deadline is not None and trace.elapsed >= self.deadline:
+            return 'deadline'
+        if self.max_tokens is not None and trace.total_tokens >= self.max_tokens:
+            return 'token_budget'
+        return None
+
+
+def count_result_tokens(result: ChatResult) -> int:
+    '''Tokens used by a model call: the provider's total when usage metadata is sent, otherwise an estimate of the output.'''
+    usage = getattr(result.message, 'usage_metadata', None)
+    if usage is not None and usage.get('total_tokens'):
+        return usage['total_tokens']
+    return approximate_token_count(result.message)
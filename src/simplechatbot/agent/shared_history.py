@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import itertools
+import threading
+
+from langchain_core.messages import BaseMessage, AIMessage, ToolMessage
+
+from .message_history import _VirtualMessageHistory
+
+# guards the check-then-append on segments that may be shared between histories
+_append_lock = threading.Lock()
+
+
+@dataclasses.dataclass(eq=False, repr=False)
+class _Segment:
+    '''A run of messages starting at position `offset`, following the first `offset` messages of the parent chain.
+        Messages are only ever appended. A history sees a prefix of its segment, so a segment can be
+        shared by histories that have since diverged.
+    '''
+    parent: _Segment | None
+    offset: int
+    messages: list[BaseMessage] = dataclasses.field(default_factory=list)
+    tool_calls: dict[str, int] = dataclasses.field(default_factory=dict) # tool_call_id -> position of the AIMessage in segment
+    tool_results: dict[str, int] = dataclasses.field(default_factory=dict) # tool_call_id -> position in segment
+
+    @property
+    def end(self) -> int:
+        return self.offset + len(self.messages)
+
+
+class SharedMessageHistory(_VirtualMessageHistory):
+    '''MessageHistory that shares its messages with its clones.
+        Messages are stored in a tree of append-only segments: clone() is O(1) and returns a history
+        that points at the same segment. The original keeps extending its segment in place, while a
+        clone starts a new child segment on its first append. Common prefixes (e.g. a system
+        prompt and shared setting) are therefore stored once no matter how many forks there are.
+        Truncating (del history[n:], pop()) only moves the end of the view and updates the tool call
+        index for the removed messages, so it costs O(removed messages) rather than O(history length).
+        Indexing and slicing walk up the segment chain from the end, so access to recent messages is
+        O(1) per message and access to old messages costs one step per fork between them and the end.
+    Example:
+        agent = Agent.from_model(model, system_prompt=setting, history=SharedMessageHistory())
+        forks = [agent.clone() for _ in range(100)] # messages are not copied
+    '''
+    _segment: _Segment
+    _length: int
+    _forked: bool
+
+    def __init__(self, messages: typing.Iterable[BaseMessage] = ()):
+        self._segment = _Segment(parent=None, offset=0)
+        self._length = 0
+        self._forked = False
+        super().__init__()
+        for message in messages:
+            self.append(message)
+
+    @classmethod
+    def _from_view(cls, segment: _Segment, length: int, pending_tool_ids: set[str]) -> typing.Self:
+        o = cls.__new__(cls)
+        o._segment = segment
+        o._length = length
+        o._forked = True
+        o._pending_tool_ids = set(pending_tool_ids)
+        o._executed_tool_ids = set() # unused; executed ids are kept in the segments
+        return o
+
+    ############################# Cloning #############################
+    def clone(self) -> typing.Self:
+        '''Get a history that shares all current messages with this one. O(1).'''
+        return self._from_view(self._segment, self._length, self._pending_tool_ids)
+
+    def empty(self, keep_system_prompt: bool = False) -> typing.Self:
+        '''Get an empty history, keeping (and sharing) the system prompt if desired.'''
+        if keep_system_prompt:
+            self.system_prompt # raises NoSystemPromptError if there is none
+            return self._prefix(1)
+        return self.__class__()
+
+    def _prefix(self, length: int) -> typing.Self:
+        '''Get a history sharing the first `length` messages.'''
+        o = self.clone()
+        o._truncate(length)
+        return o
+
+    def appended(self, message: BaseMessage) -> list[BaseMessage]:
+        '''Get the messages that would be sent with a new message without copying the history.'''
+        o = self.clone()
+        o.append(message)
+        return o
+
+    ############################# Reading #############################
+    def __len__(self) -> int:
+        return self._length
+
+    def _chain(self) -> list[tuple[_Segment, int]]:
+        '''Get (segment, number of visible messages) pairs from the root to this history's segment.'''
+        chain = list()
+        segment, end = self._segment, self._length
+        while segment is not None:
+            chain.append((segment, end - segment.offset))
+            end = segment.offset
+            segment = segment.parent
+        chain.reverse()
+        return chain
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step == 1:
+                return self._slice(start, stop)
+            return list(self)[index]
+
+        i = index.__index__()
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError('message history index out of range')
+        segment = self._segment
+        while i < segment.offset:
+            segment = segment.parent
+        return segment.messages[i - segment.offset]
+
+    def _slice(self, start: int, stop: int) -> list[BaseMessage]:
+        '''Get messages start:stop, walking back from the end only as far as `start`.'''
+        parts = list()
+        segment, end = self._segment, self._length
+        while segment is not None and end > start:
+            lo, hi = max(start, segment.offset), min(stop, end)
+            if lo < hi:
+                parts.append(segment.messages[lo - segment.offset:hi - segment.offset])
+            end = segment.offset
+            segment = segment.parent
+        return [m for part in reversed(parts) for m in part]
+
+    def __iter__(self) -> typing.Iterator[BaseMessage]:
+        for segment, count in self._chain():
+            yield from itertools.islice(segment.messages, count)
+
+    def __reversed__(self) -> typing.Iterator[BaseMessage]:
+        segment, end = self._segment, self._length
+        while segment is not None:
+            for i in range(end - segment.offset - 1, -1, -1):
+                yield segment.messages[i]
+            end = segment.offset
+            segment = segment.parent
+
+    def segment_count(self) -> int:
+        '''Number of segments between the root and the end of this history.'''
+        return len(self._chain())
+
+    ############################# Writing #############################
+    def append(self, message: BaseMessage) -> None:
+        self._index_message(message)
+        with _append_lock:
+            if self._forked or self._segment.end != self._length:
+                # clones and truncated histories never write into a segment they may share
+                self._segment = _Segment(parent=self._segment, offset=self._length)
+                self._forked = False
+            if isinstance(message, ToolMessage):
+                self._segment.tool_results.setdefault(message.tool_call_id, len(self._segment.messages))
+            elif isinstance(message, AIMessage):
+                for tool_call in message.tool_calls:
+                    if tool_call.get('id') is not None:
+                        self._segment.tool_calls.setdefault(tool_call['id'], len(self._segment.messages))
+            self._segment.messages.append(message)
+            self._length += 1
+
+    def _truncate(self, length: int) -> None:
+        '''Move the end of the view back to `length` messages and update the pending tool call ids.
+            Shared segments are not modified. Costs O(min(removed, remaining) messages).
+        '''
+        num_removed = self._length - length
+        if num_removed <= 0:
+            return
+        affected = set()
+        if num_removed <= length:
+            for message in itertools.islice(reversed(self), num_removed):
+                if isinstance(message, AIMessage):
+                    affected.update(tc['id'] for tc in message.tool_calls if tc.get('id') is not None)
+                elif isinstance(message, ToolMessage):
+                    affected.add(message.tool_call_id)
+
+        while self._segment.offset > length:
+            self._segment = self._segment.parent
+        self._length = length
+
+        if num_removed > length:
+            self._reindex() # cheaper to rebuild from what is left
+            return
+        for tool_call_id in affected:
+            if self._tool_call_exists(tool_call_id) and not self.tool_result_exists(tool_call_id):
+                self._pending_tool_ids.add(tool_call_id)
+            else:
+                self._pending_tool_ids.discard(tool_call_id)
+
+    def _rewrite(self, messages: list[BaseMessage], start: int = 0) -> None:
+        self._truncate(start)
+        for message in messages:
+            self.append(message) # updates the index incrementally
+
+    ############################# Tool call index #############################
+    # executed tool ids are looked up in the segments so that clones need not copy them.
+    def tool_result_exists(self, tool_call_id: str) -> bool:
+        for segment, count in self._chain():
+            if segment.tool_results.get(tool_call_id, count) < count:
+                return True
+        return False
+
+    def _tool_call_exists(self, tool_call_id: str) -> bool:
+        for segment, count in self._chain():
+            if segment.tool_calls.get(tool_call_id, count) < count:
+                return True
+        return False
+
+    def executed_tool_ids(self) -> set[str]:
+        return {tool_call_id for segment, count in self._chain() for tool_call_id, i in segment.tool_results.items() if i < count}
+
+    def _index_message(self, message: BaseMessage) -> None:
+        if isinstance(message, AIMessage):
+            for tool_call in message.tool_calls:
+                if tool_call.get('id') is not None and not self.tool_result_exists(tool_call['id']):
+                    self._pending_tool_ids.add(tool_call['id'])
+        elif isinstance(message, ToolMessage):
+            self._pending_tool_ids.discard(message.tool_call_id)
+
+    def _reindex(self) -> None:
+        self._executed_tool_ids = set()
+        self._pending_tool_ids = set()
+        executed = set()
+        for message in self:
+            if isinstance(message, AIMessage):
+                self._pending_tool_ids.update(tc['id'] for tc in message.tool_calls if tc.get('id') is not None and tc['id'] not in executed)
+            elif isinstance(message, ToolMessage):
+                executed.add(message.tool_call_id)
+                self._pending_tool_ids.discard(message.tool_call_id)
+
+    def __reduce__(self):
+        return (self.__class__, (list(self),))
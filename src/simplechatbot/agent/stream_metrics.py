@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import array
+import time
+
+from .timing import _percentile
+
+if typing.TYPE_CHECKING:
+    from langchain_core.messages import AIMessageChunk
+    from langchain_core.messages.ai import UsageMetadata
+
+
+@dataclasses.dataclass
+class StreamStats:
+    '''Latency summary of a finished stream. Times are in seconds.
+        output_tokens comes from the provider's usage metadata when it is sent; otherwise
+        each chunk is counted as one token and tokens_estimated is True.
+    '''
+    time_to_first_token: float | None
+    total_time: float
+    num_chunks: int
+    output_tokens: int
+    tokens_estimated: bool
+    tokens_per_second: float
+    mean_gap: float
+    p50_gap: float
+    p95_gap: float
+    max_gap: float
+    usage: UsageMetadata | None = None
+
+    def __str__(self) -> str:
+        ttft = f'{self.time_to_first_token*1000:.0f}ms' if self.time_to_first_token is not None else 'n/a'
+        approx = '~' if self.tokens_estimated else ''
+        return (
+            f'ttft={ttft}, total={self.total_time*1000:.0f}ms, '
+            f'tokens={approx}{self.output_tokens}, {self.tokens_per_second:.1f} tok/s, '
+            f'gap p50={self.p50_gap*1000:.1f}ms p95={self.p95_gap*1000:.1f}ms max={self.max_gap*1000:.1f}ms'
+        )
+
+
+@dataclasses.dataclass(repr=False)
+class StreamMetrics:
+    '''Records arrival times of streamed chunks.
+        Arrival times are stored as offsets (seconds) from the request start in a compact array,
+        so recording a chunk is a single float append. The request start is marked by the stream
+        result when it first asks the model iterator for a chunk, which is when the request is sent.
+    '''
+    start: float | None = None
+    end: float | None = None
+    arrivals: array.array = dataclasses.field(default_factory=lambda: array.array('d'))
+    usage: UsageMetadata | None = None
+
+    def mark_start(self) -> None:
+        '''Record that the request is being sent now, if it has not been recorded already.'''
+        if self.start is None:
+            self.start = time.perf_counter()
+
+    def record_chunk(self) -> None:
+        '''Record the arrival of a chunk at the current time.'''
+        self.arrivals.append(time.perf_counter() - self.start)
+
+    def finish(self, message: AIMessageChunk | None = None) -> None:
+        '''Record the end of the stream and any usage metadata on the merged message.'''
+        self.mark_start()
+        self.end = time.perf_counter()
+        if message is not None:
+            self.usage = message.usage_metadata
+
+    @property
+    def num_chunks(self) -> int:
+        return len(self.arrivals)
+
+    @property
+    def time_to_first_token(self) -> float | None:
+        return self.arrivals[0] if len(self.arrivals) else None
+
+    def live_tokens_per_second(self) -> float:
+        '''Estimated throughput so far (one token per chunk), measured from the first chunk.'''
+        if len(self.arrivals) < 2:
+            return 0.0
+        elapsed = time.perf_counter() - self.start - self.arrivals[0]
+        return (len(self.arrivals) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> StreamStats:
+        '''Summarize the stream. Call after the stream is exhausted.'''
+        end = self.end if self.end is not None else time.perf_counter()
+        total_time = end - self.start if self.start is not None else 0.0
+        gaps = sorted(b - a for a, b in zip(self.arrivals, self.arrivals[1:]))
+
+        if self.usage is not None and self.usage.get('output_tokens'):
+            output_tokens = self.usage['output_tokens']
+            tokens_estimated = False
+        else:
+            output_tokens = len(self.arrivals)
+            tokens_estimated = True
+
+        # throughput is measured over the generation time (after the first token)
+        ttft = self.time_to_first_token
+        generation_time = total_time - ttft if ttft is not None else 0.0
+        if generation_time > 0:
+            tokens_per_second = output_tokens / generation_time
+        else:
+            tokens_per_second = output_tokens / total_time if total_time > 0 else 0.0
+
+        return StreamStats(
+            time_to_first_token = ttft,
+            total_time = total_time,
+            num_chunks = len(self.arrivals),
+            output_tokens = output_tokens,
+            tokens_estimated = tokens_estimated,
+            tokens_per_second = tokens_per_second,
+            mean_gap = sum(gaps) / len(gaps) if len(gaps) else 0.0,
+            p50_gap = _percentile(gaps, 0.50),
+            p95_gap = _percentile(gaps, 0.95),
+            max_gap = gaps[-1] if len(gaps) else 0.0,
+            usage = self.usage,
+        )
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(num_chunks={self.num_chunks}, finished={self.end is not None})'
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import collections
+import contextlib
+import threading
+import time
+
+
+class TimingSink:
+    '''Receives timings from finished calls. Subclass and implement record().'''
+    def record(self, timings: PhaseTimings) -> None:
+        raise NotImplementedError
+
+
+@dataclasses.dataclass(repr=False)
+class PhaseTimings:
+    '''Monotonic timings (in seconds) for the phases of a single agent call.
+        Phases include: history (building the message list), merge_tools, tool_dict (running tool
+        factories), bind_tools, model (round trip), and tool:<name> for each executed tool.
+    '''
+    kind: str
+    phases: dict[str, float] = dataclasses.field(default_factory=dict)
+    sink: TimingSink | None = None
+    start: float = dataclasses.field(default_factory=time.perf_counter)
+    _lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> typing.Iterator[None]:
+        '''Time a block of code, adding the elapsed time to the named phase.'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        '''Add time to a phase. Repeated phases (e.g. the same tool called twice) accumulate.'''
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def submit(self) -> None:
+        '''Send these timings to the sink, if there is one.'''
+        if self.sink is not None:
+            self.sink.record(self)
+
+    @property
+    def total(self) -> float:
+        '''Sum of all recorded phases.'''
+        return sum(self.phases.values())
+
+    def __getitem__(self, name: str) -> float:
+        return self.phases[name]
+
+    def __repr__(self) -> str:
+        phase_str = ', '.join(f'{k}={v*1000:.2f}ms' for k, v in self.phases.items())
+        return f'{self.__class__.__name__}(kind={self.kind}, {phase_str})'
+
+
+@dataclasses.dataclass(repr=False)
+class PhaseTimer:
+    '''Attach to an Agent to enable timing instrumentation. Timing is disabled when Agent.timer is None.
+    Example:
+        aggregator = TimingAggregator()
+        agent = Agent.from_model(model, timer=PhaseTimer(sink=aggregator))
+        agent.chat('hello').timings
+        aggregator.percentiles()
+    '''
+    sink: TimingSink | None = None
+
+    def start(self, kind: str) -> PhaseTimings:
+        return PhaseTimings(kind=kind, sink=self.sink)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(sink={self.sink!r})'
+
+
+@dataclasses.dataclass(repr=False)
+class TimingAggregator(TimingSink):
+    '''Keeps a moving window of timings per (kind, phase) and reports percentiles across sessions.'''
+    window: int = 10_000
+    _samples: dict[tuple[str, str], collections.deque[float]] = dataclasses.field(default_factory=dict)
+    _lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+    def record(self, timings: PhaseTimings) -> None:
+        with self._lock:
+            for name, seconds in list(timings.phases.items()) + [('total', timings.total)]:
+                key = (timings.kind, name)
+                if key not in self._samples:
+                    self._samples[key] = collections.deque(maxlen=self.window)
+                self._samples[key].append(seconds)
+
+    def percentiles(self, kind: str | None = None) -> dict[str, dict[str, float]]:
+        '''Get count/p50/p95/p99 (in seconds) for each "kind.phase" recorded so far.'''
+        with self._lock:
+            samples = {k: sorted(v) for k, v in self._samples.items() if kind is None or k[0] == kind}
+        return {
+            f'{k}.{name}': {
+                'count': len(values),
+                'p50': _percentile(values, 0.50),
+                'p95': _percentile(values, 0.95),
+                'p99': _percentile(values, 0.99),
+            }
+            for (k, name), values in samples.items()
+        }
+
+    def summary(self, kind: str | None = None) -> str:
+        '''Get a printable table of percentiles in milliseconds.'''
+        lines = [f'{"phase":<32} {"count":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}']
+        for name, p in self.percentiles(kind).items():
+            lines.append(f'{name:<32} {p["count"]:>7} {p["p50"]*1000:>9.2f} {p["p95"]*1000:>9.2f} {p["p99"]*1000:>9.2f}')
+        return '\n'.join(lines)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(num_series={len(self._samples)}, window={self.window})'
+
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+def phase(timings: PhaseTimings | None, name: str) -> typing.ContextManager[None]:
+    '''Time a phase if timings are enabled; otherwise a shared no-op context manager.'''
+    if timings is None:
+        return _NULL_CONTEXT
+    return timings.phase(name)
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not len(sorted_values):
+        return 0.0
+    return sorted_values[min(len(sorted_values)-1, int(q * len(sorted_values)))]
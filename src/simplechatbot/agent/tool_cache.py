@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import collections
+import hashlib
+import json
+import pathlib
+import pickle
+import sqlite3
+import threading
+import time
+
+from .types import ToolName
+
+
+@dataclasses.dataclass
+class ToolCachePolicy:
+    '''Caching settings for a single tool. Only tools with a policy are cached.
+    Args:
+        ttl: seconds before a cached result expires (None means never).
+        max_entries: maximum number of results kept in memory for this tool.
+        max_bytes: maximum total size (pickled) of results kept in memory for this tool.
+        persist: also store results in the on-disk store, if the cache has one.
+    '''
+    ttl: float | None = None
+    max_entries: int = 256
+    max_bytes: int | None = None
+    persist: bool = True
+
+
+@dataclasses.dataclass
+class ToolCacheStats:
+    '''Hit/miss counts for a ToolResultCache.'''
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    size: int = 0
+    num_bytes: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+@dataclasses.dataclass
+class _ToolEntries:
+    '''In-memory LRU of pickled results for one tool.'''
+    values: collections.OrderedDict[str, tuple[bytes, float | None]] = dataclasses.field(default_factory=collections.OrderedDict)
+    num_bytes: int = 0
+
+
+@dataclasses.dataclass(repr=False)
+class ToolResultCache:
+    '''Memoizes results of deterministic tool calls, keyed by tool name and canonicalized arguments.
+        Tools are only cached if they have a policy: pass them in `policies` (by tool name) or set
+        `default_policy` to cache every tool. Results are kept in a per-tool in-memory LRU and
+        optionally in a SQLite database so they survive across sessions. Results that cannot be
+        pickled are not cached.
+        A cached result is returned in a new ToolCallResult for the current call, so the ToolMessage
+        added to history has the new tool_call_id.
+    Example:
+        cache = ToolResultCache(policies={'sql_schema': ToolCachePolicy(ttl=3600)}, sqlite_path='tools.db')
+        agent = Agent.from_model(model, tools=tools, tool_cache=cache)
+    '''
+    policies: dict[ToolName, ToolCachePolicy] = dataclasses.field(default_factory=dict)
+    default_policy: ToolCachePolicy | None = None
+    sqlite_path: str | pathlib.Path | None = None
+    _entries: dict[ToolName, _ToolEntries] = dataclasses.field(default_factory=dict)
+    _stats: ToolCacheStats = dataclasses.field(default_factory=ToolCacheStats)
+    _conn: sqlite3.Connection | None = None
+    _lock: threading.RLock = dataclasses.field(default_factory=threading.RLock)
+
+    def __post_init__(self):
+        if self.sqlite_path is not None:
+            self._conn = sqlite3.connect(str(self.sqlite_path), check_same_thread=False)
+            self._conn.execute('CREATE TABLE IF NOT EXISTS tool_results (key TEXT PRIMARY KEY, tool TEXT NOT NULL, value BLOB NOT NULL, expires REAL)')
+            self._conn.commit()
+
+    ############################# policies #############################
+    def policy(self, tool_name: ToolName) -> ToolCachePolicy | None:
+        '''Get the policy for a tool, or None if it should not be cached.'''
+        return self.policies.get(tool_name, self.default_policy)
+
+    def set_policy(self, tool_name: ToolName, policy: ToolCachePolicy | None = None) -> None:
+        '''Mark a tool as cacheable (with default settings if no policy is given).'''
+        self.policies[tool_name] = policy if policy is not None else ToolCachePolicy()
+
+    @staticmethod
+    def make_key(tool_name: ToolName, args: dict[str, typing.Any]) -> str:
+        '''Get the cache key for a tool call.'''
+        payload = json.dumps([tool_name, args], sort_keys=True, default=str, separators=(',', ':'))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    ############################# access #############################
+    def get(self, tool_name: ToolName, args: dict[str, typing.Any]) -> tuple[bool, typing.Any]:
+        '''Get (found, return_value) for a tool call. Return values may legitimately be None, hence the flag.'''
+        policy = self.policy(tool_name)
+        if policy is None:
+            return False, None
+        key = self.make_key(tool_name, args)
+        now = time.time()
+
+        with self._lock:
+            entries = self._entries.get(tool_name)
+            if entries is not None and key in entries.values:
+                value, expires = entries.values[key]
+                if expires is None or expires > now:
+                    entries.values.move_to_end(key)
+                    self._stats.memory_hits += 1
+                    return True, pickle.loads(value)
+                self._remove_memory(entries, key)
+                self._stats.expired += 1
+
+            if self._conn is not None and policy.persist:
+                row = self._conn.execute('SELECT value, expires FROM tool_results WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    value, expires = row
+                    if expires is None or expires > now:
+                        self._stats.disk_hits += 1
+                        self._put_memory(tool_name, policy, key, value, expires)
+                        return True, pickle.loads(value)
+                    self._conn.execute('DELETE FROM tool_results WHERE key = ?', (key,))
+                    self._conn.commit()
+                    self._stats.expired += 1
+
+            self._stats.misses += 1
+            return False, None
+
+    def put(self, tool_name: ToolName, args: dict[str, typing.Any], return_value: typing.Any) -> None:
+        '''Store a return value if the tool has a policy.'''
+        policy = self.policy(tool_name)
+        if policy is None:
+            return
+        try:
+            value = pickle.dumps(return_value)
+        except Exception:
+            return
+        key = self.make_key(tool_name, args)
+        expires = time.time() + policy.ttl if policy.ttl is not None else None
+
+        with self._lock:
+            self._put_memory(tool_name, policy, key, value, expires)
+            if self._conn is not None and policy.persist:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO tool_results (key, tool, value, expires) VALUES (?, ?, ?, ?)',
+                    (key, tool_name, value, expires),
+                )
+                self._conn.commit()
+
+    def _put_memory(self, tool_name: ToolName, policy: ToolCachePolicy, key: str, value: bytes, expires: float | None) -> None:
+        entries = self._entries.setdefault(tool_name, _ToolEntries())
+        if key in entries.values:
+            self._remove_memory(entries, key)
+        entries.values[key] = (value, expires)
+        entries.num_bytes += len(value)
+        while len(entries.values) > policy.max_entries or (policy.max_bytes is not None and entries.num_bytes > policy.max_bytes and len(entries.values) > 1):
+            _, (old_value, _) = entries.values.popitem(last=False)
+            entries.num_bytes -= len(old_value)
+
+    @staticmethod
+    def _remove_memory(entries: _ToolEntries, key: str) -> None:
+        value, _ = entries.values.pop(key)
+        entries.num_bytes -= len(value)
+
+    ############################# other #############################
+    def stats(self) -> ToolCacheStats:
+        '''Get a snapshot of the hit/miss counts.'''
+        with self._lock:
+            return dataclasses.replace(
+                self._stats,
+                size = sum(len(e.values) for e in self._entries.values()),
+                num_bytes = sum(e.num_bytes for e in self._entries.values()),
+            )
+
+    def clear(self, tool_name: ToolName | None = None) -> None:
+        '''Remove cached results for one tool, or for all tools, from memory and disk.'''
+        with self._lock:
+            if tool_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(tool_name, None)
+            if self._conn is not None:
+                if tool_name is None:
+                    self._conn.execute('DELETE FROM tool_results')
+                else:
+                    self._conn.execute('DELETE FROM tool_results WHERE tool = ?', (tool_name,))
+                self._conn.commit()
+
+    def close(self) -> None:
+        '''Close the SQLite connection, if any.'''
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __repr__(self) -> str:
+        s = self.stats()
+        return f'{self.__class__.__name__}(tools={list(self.policies)}, size={s.size}, hits={s.hits}, misses={s.misses}, sqlite_path={self.sqlite_path})'
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import asyncio
+import concurrent.futures
+import importlib
+import pickle
+import threading
+
+from .errors import ToolTimeoutError
+from .types import ToolName
+
+if typing.TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+
+ToolExecutorKind = typing.Literal['inline', 'thread', 'process']
+
+
+@dataclasses.dataclass
+class ToolExecutionPolicy:
+    '''How a single tool is run.
+    Args:
+        timeout: seconds to wait for the tool before returning a timeout error to the model.
+            A timed-out tool cannot be interrupted, so it keeps running in its worker.
+        executor: 'inline' runs in the calling thread (or a worker thread if there is a timeout),
+            'thread' always uses the runner's thread pool, and 'process' uses its process pool so
+            CPU-bound tools do not hold the GIL. Process tools must be importable module attributes
+            (e.g. functions decorated with @tool at module level) or picklable, and so must their results.
+    '''
+    timeout: float | None = None
+    executor: ToolExecutorKind = 'inline'
+
+
+@dataclasses.dataclass(repr=False)
+class ToolRunner:
+    '''Runs tool calls according to per-tool execution policies.
+    Example:
+        runner = ToolRunner(policies={
+            'run_sql': ToolExecutionPolicy(timeout=10),
+            'parse_pdf': ToolExecutionPolicy(timeout=60, executor='process'),
+        })
+        agent = Agent.from_model(model, tools=tools, tool_runner=runner)
+    '''
+    policies: dict[ToolName, ToolExecutionPolicy] = dataclasses.field(default_factory=dict)
+    default_policy: ToolExecutionPolicy = dataclasses.field(default_factory=ToolExecutionPolicy)
+    max_threads: int | None = None
+    max_processes: int | None = None
+    _thread_pool: concurrent.futures.ThreadPoolExecutor | None = None
+    _process_pool: concurrent.futures.ProcessPoolExecutor | None = None
+    _lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+    def policy(self, tool_name: ToolName) -> ToolExecutionPolicy:
+        return self.policies.get(tool_name, self.default_policy)
+
+    ############################# running tools #############################
+    def invoke(self, tool: BaseTool, args: dict[str, typing.Any]) -> typing.Any:
+        '''Run the tool. Raises ToolTimeoutError if it does not finish in time.'''
+        policy = self.policy(tool.name)
+        if policy.executor == 'inline' and policy.timeout is None:
+            return tool.invoke(args)
+
+        if policy.executor == 'process':
+            future = self.process_pool.submit(_invoke_in_process, _ToolReference.from_tool(tool), args)
+        else:
+            future = self.thread_pool.submit(tool.invoke, args)
+
+        try:
+            return future.result(timeout=policy.timeout)
+        except TimeoutError as e:
+            if future.done(): # the tool itself raised a TimeoutError
+                raise
+            future.cancel()
+            raise ToolTimeoutError.from_timeout(tool.name, policy.timeout) from e
+
+    async def ainvoke(self, tool: BaseTool, args: dict[str, typing.Any]) -> typing.Any:
+        '''Run the tool without blocking the event loop. Raises ToolTimeoutError if it does not finish in time.'''
+        policy = self.policy(tool.name)
+        loop = asyncio.get_running_loop()
+        if policy.executor == 'process':
+            awaitable = loop.run_in_executor(self.process_pool, _invoke_in_process, _ToolReference.from_tool(tool), args)
+        elif policy.executor == 'thread':
+            awaitable = loop.run_in_executor(self.thread_pool, tool.invoke, args)
+        else:
+            awaitable = tool.ainvoke(args)
+
+        if policy.timeout is None:
+            return await awaitable
+        task = asyncio.ensure_future(awaitable)
+        try:
+            return await asyncio.wait_for(task, policy.timeout)
+        except TimeoutError as e:
+            if task.done() and not task.cancelled():
+                raise
+            raise ToolTimeoutError.from_timeout(tool.name, policy.timeout) from e
+
+    ############################# pools #############################
+    @property
+    def thread_pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._lock:
+            if self._thread_pool is None:
+                self._thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix='simplechatbot-tool')
+            return self._thread_pool
+
+    @property
+    def process_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_processes)
+            return self._process_pool
+
+    def shutdown(self, wait: bool = True) -> None:
+        '''Shut down the worker pools. They are recreated if the runner is used again.'''
+        with self._lock:
+            for pool in (self._thread_pool, self._process_pool):
+                if pool is not None:
+                    pool.shutdown(wait=wait, cancel_futures=True)
+            self._thread_pool = None
+            self._process_pool = None
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(policies={self.policies}, default_policy={self.default_policy})'
+
+
+@dataclasses.dataclass
+class _ToolReference:
+    '''Picklable handle used to send a tool to a worker process.
+        Tools made with the @tool decorator have a dynamically created args schema that cannot be
+        pickled, so they are sent as (module, name) and looked up again in the worker.
+    '''
+    tool: BaseTool | None = None
+    module: str | None = None
+    name: str | None = None
+
+    @classmethod
+    def from_tool(cls, tool: BaseTool) -> typing.Self:
+        func = getattr(tool, 'func', None)
+        module = getattr(func, '__module__', None)
+        name = getattr(func, '__qualname__', None)
+        if module is not None and name is not None and getattr(importlib.import_module(module), name, None) is tool:
+            return cls(module=module, name=name)
+        try:
+            pickle.dumps(tool)
+        except Exception as e:
+            raise ValueError(f'The tool {tool.name} cannot be sent to a process pool: it must be a module-level attribute or picklable.') from e
+        return cls(tool=tool)
+
+    def load(self) -> BaseTool:
+        if self.tool is not None:
+            return self.tool
+        return getattr(importlib.import_module(self.module), self.name)
+
+
+def _invoke_in_process(ref: _ToolReference, args: dict[str, typing.Any]) -> typing.Any:
+    return ref.load().invoke(args)
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import typing
+import dataclasses
+import collections
+import logging
+import math
+import operator
+import re
+import threading
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from .types import ToolName
+from .coalesce import chunk_text
+
+if typing.TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(repr=False)
+class ToolSelector:
+    '''Base class for choosing which tools to bind for a turn. Subclass and implement scores().
+        The top_k highest scoring tools are bound, plus any pinned tools. If no tool scores above
+        min_score (e.g. a query like "do it again" that shares no terms with any tool), every tool
+        is bound rather than none. Tools that are not bound can still be executed if the model calls
+        them (e.g. from earlier in the conversation).
+        Each selection is logged at DEBUG level and kept in last_selection for debugging. A selector
+        is shared by clones and may be used from several threads, so last_selection is simply the
+        most recent selection by any of them; use the return value of select() for a given turn.
+    '''
+    top_k: int = 8
+    pinned: typing.Collection[ToolName] = ()
+    min_score: float = 0.0
+    last_selection: list[ToolName] = dataclasses.field(default_factory=list)
+
+    def scores(self, tools: dict[ToolName, BaseTool], query: str) -> dict[ToolName, float]:
+        '''Get a relevance score for each tool. Higher is more relevant.'''
+        raise NotImplementedError
+
+    def select(
+        self,
+        tools: dict[ToolName, BaseTool],
+        query: str,
+        pinned: typing.Collection[ToolName] = (),
+    ) -> dict[ToolName, BaseTool]:
+        '''Get the subset of tools to bind for this query.
+        Args:
+            pinned: extra tools to always include (e.g. the tool named by tool_choice).
+        '''
+        always = {n for n in (*self.pinned, *pinned) if n in tools}
+        if len(tools) - len(always) <= self.top_k:
+            selected = set(tools)
+        else:
+            scores = self.scores({n: t for n, t in tools.items() if n not in always}, query)
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            selected = always | {n for n, score in ranked[:self.top_k] if score > self.min_score}
+            if len(selected) == len(always):
+                logger.debug('no tool scored above %s for query %r; binding all tools', self.min_score, query[:80])
+                selected = set(tools)
+
+        selection = [n for n in tools if n in selected]
+        self.last_selection = selection
+        logger.debug('selected %d of %d tools for query %r: %s', len(selected), len(tools), query[:80], selection)
+        return {n: tools[n] for n in selection}
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(top_k={self.top_k}, pinned={list(self.pinned)})'
+
+
+@dataclasses.dataclass(repr=False)
+class LexicalToolSelector(ToolSelector):
+    '''Scores tools with BM25 over their names and descriptions. Needs no model or network access.
+        Term counts are indexed once per tool object, so only the query is tokenized each turn.
+    '''
+    k1: float = 1.2
+    b: float = 0.75
+    _term_counts: dict[int, tuple[BaseTool, collections.Counter[str], int]] = dataclasses.field(default_factory=dict)
+    _lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+    def scores(self, tools: dict[ToolName, BaseTool], query: str) -> dict[ToolName, float]:
+        docs = {name: self.tool_terms(tool) for name, tool in tools.items()}
+        num_docs = len(docs)
+        avg_len = sum(length for _, length in docs.values()) / max(num_docs, 1)
+        query_terms = set(tokenize(query))
+        doc_freq = {term: sum(1 for counts, _ in docs.values() if term in counts) for term in query_terms}
+
+        scores = dict()
+        for name, (counts, length) in docs.items():
+            score = 0.0
+            for term in query_terms:
+                tf = counts.get(term, 0)
+                if tf == 0:
+                    continue
+                idf = math.log(1 + (num_docs - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                score += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_len))
+            scores[name] = score
+        return scores
+
+    def tool_terms(self, tool: BaseTool) -> tuple[collections.Counter[str], int]:
+        '''Get the (cached) term counts and length of a tool's name and description.'''
+        with self._lock:
+            cached = self._term_counts.get(id(tool))
+            if cached is not None and cached[0] is tool:
+                return cached[1], cached[2]
+        terms = tokenize(f'{tool.name} {tool.name} {tool.description}') # name counts double
+        counts = collections.Counter(terms)
+        with self._lock:
+            self._term_counts[id(tool)] = (tool, counts, len(terms))
+        return counts, len(terms)
+
+
+@dataclasses.dataclass(repr=False)
+class EmbeddingToolSelector(ToolSelector):
+    '''Scores tools by cosine similarity between the query and tool name/description embeddings.
+        Tool embeddings are computed once per tool object (in a single embed_documents call for
+        new tools) and kept normalized in memory, so each turn costs one embed_query call.
+    Example:
+        selector = EmbeddingToolSelector(embeddings=OllamaEmbeddings(model='nomic-embed-text'), top_k=5)
+    '''
+    embeddings: Embeddings | None = None
+    _vectors: dict[int, tuple[BaseTool, list[float]]] = dataclasses.field(default_factory=dict)
+    _lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+    def scores(self, tools: dict[ToolName, BaseTool], query: str) -> dict[ToolName, float]:
+        vectors = self.tool_vectors(list(tools.values()))
+        query_vector = normalize(self.embeddings.embed_query(query))
+        return {name: sum(map(operator.mul, query_vector, vec)) for name, vec in zip(tools, vectors)}
+
+    def tool_vectors(self, tools: list[BaseTool]) -> list[list[float]]:
+        '''Get normalized embeddings for tools, embedding only those not seen before.'''
+        with self._lock:
+            missing = [t for t in tools if id(t) not in self._vectors or self._vectors[id(t)][0] is not t]
+        if len(missing):
+            new_vectors = self.embeddings.embed_documents([f'{t.name}: {t.description}' for t in missing])
+            with self._lock:
+                for tool, vec in zip(missing, new_vectors):
+                    self._vectors[id(tool)] = (tool, normalize(vec))
+        with self._lock:
+            return [self._vectors[id(t)][1] for t in tools]
+
+
+def tokenize(text: str) -> list[str]:
+    '''Split text into lowercase alphanumeric terms (underscores separate terms).'''
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+def normalize(vector: typing.Sequence[float]) -> list[float]:
+    norm = math.sqrt(sum(v*v for v in vector))
+    return [v / norm for v in vector] if norm > 0 else list(vector)
+
+
+def query_from_messages(messages: BaseMessage | str | typing.Sequence[BaseMessage | str]) -> str | None:
+    '''Get the text of the most recent human message, which is used to select tools.'''
+    if isinstance(messages, str):
+        return messages
+    if isinstance(messages, BaseMessage):
+        messages = [messages]
+    for message in reversed(messages):
+        if isinstance(message, str):
+            return message
+        if isinstance(message, HumanMessage):
+            return chunk_text(message)
+    return None
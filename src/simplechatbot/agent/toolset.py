@@ -6,12 +6,17 @@ import typing
 from langchain_core.tools import BaseTool, BaseToolkit, render_text_description
 from langchain_core.language_models import BaseChatModel
 
-from .errors import ToolRaisedExceptionError, UknownToolError
+from .errors import ToolRaisedExceptionError, UknownToolError, ToolTimeoutError
 from .types import ToolCallID, ToolName, UnspecifiedType, UNSPECIFIED
 from .util import format_tool_text
+from .timing import phase
+from .factory_cache import merge_factory_tools
 
 if typing.TYPE_CHECKING:
     from .agent import Agent
+    from .binding_cache import ModelBindingCache
+    from .timing import PhaseTimings
+    from .tool_selection import ToolSelector
     ToolFactoryType = typing.Callable[[Agent],list[BaseTool]]
     
 
@@ -27,6 +32,7 @@ class ToolSet:
     tools: dict[ToolName, BaseTool]
     tool_factories: list[ToolFactoryType]
     tool_choice: ToolName | typing.Literal['auto', 'any'] | None = None
+    tool_selector: ToolSelector | None = None
     
     ################################# constructors #################################
     @classmethod
@@ -40,6 +46,7 @@ class ToolSet:
         toolkits: list[BaseToolkit] | None = None,
         tool_factories: list[ToolFactoryType] | None = None,
         tool_choice: ToolName | typing.Literal['auto', 'any'] | None = None,
+        tool_selector: ToolSelector | None = None,
     ) -> typing.Self:
         '''Create a toolset from a list of toolkits.
         Args:
@@ -47,27 +54,50 @@ class ToolSet:
             toolkits: list of toolkits to add before returning all tools
             tool_factories: list of tool factories that will be called with Agent as an argument.
             tool_choice: tool to use when multiple tools are available
+            tool_selector: if provided, bind only the tools most relevant to the current turn.
         '''
         return cls(
             tools = cls._tool_dict_from_lists(tools, toolkits),
             tool_factories = list(tool_factories) if tool_factories is not None else [],
             tool_choice = tool_choice,
+            tool_selector = tool_selector,
         )
         
     ################################# accessing tools #################################
     def bind_tools(
         self, 
         agent: Agent | None = None,
+        binding_cache: ModelBindingCache | None = None,
+        timings: PhaseTimings | None = None,
+        query: str | None = None,
     ) -> tuple[BaseChatModel, ToolLookup]:
-        '''Create tools from factories and bind them to the model.'''
-        tool_lookup = self.tool_lookup(agent=agent)
-        if len(tool_lookup) > 0:
-            if self.tool_choice is None:
-                return agent._model.bind_tools(tool_lookup.tool_list()), tool_lookup
+        '''Create tools from factories and bind them to the model.
+        Args:
+            agent: agent whose model the tools are bound to. Passed to tool factories.
+            binding_cache: if provided, reuse previously bound models for the same tools.
+            timings: if provided, record time spent in the tool_dict, select_tools, and bind_tools phases.
+            query: text of the current turn. If the toolset has a tool_selector, only the tools
+                relevant to it are bound. The returned lookup always contains every tool.
+        '''
+        with phase(timings, 'tool_dict'):
+            tool_lookup = self.tool_lookup(agent=agent)
+
+        bind_lookup = tool_lookup
+        if self.tool_selector is not None and query is not None:
+            with phase(timings, 'select_tools'):
+                pinned = (self.tool_choice,) if self.tool_choice not in (None, 'auto', 'any') else ()
+                bind_lookup = ToolLookup(tools=self.tool_selector.select(tool_lookup.tools, query, pinned=pinned))
+
+        with phase(timings, 'bind_tools'):
+            if len(bind_lookup) > 0:
+                if binding_cache is not None:
+                    return binding_cache.bind_tools(agent._model, bind_lookup, self.tool_choice), tool_lookup
+                elif self.tool_choice is None:
+                    return agent._model.bind_tools(bind_lookup.tool_list()), tool_lookup
+                else:
+                    return agent._model.bind_tools(bind_lookup.tool_list(), tool_choice=self.tool_choice), tool_lookup
             else:
-                return agent._model.bind_tools(tool_lookup.tool_list(), tool_choice=self.tool_choice), tool_lookup
-        else:
-            return agent._model, tool_lookup
+                return agent._model, tool_lookup
         
     ################################# merging #################################
     def __add__(self, other: typing.Self) -> typing.Self:
@@ -84,6 +114,7 @@ class ToolSet:
             tools = {**self.tools, **other.tools},
             tool_factories = self.tool_factories + other.tool_factories,
             tool_choice = other.tool_choice if replace_tool_choice else self.tool_choice,
+            tool_selector = self.tool_selector if self.tool_selector is not None else other.tool_selector,
         )
 
     def merge_tools(
@@ -98,6 +129,7 @@ class ToolSet:
             tools = {**self.tools, **self._tool_dict_from_lists(tools, toolkits)},
             tool_factories = list(self.tool_factories) + (list(tool_factories) if tool_factories is not None else []),
             tool_choice = tool_choice if tool_choice is not UNSPECIFIED else self.tool_choice,
+            tool_selector = self.tool_selector,
         )
     
     ################################# accessing tool information #################################
@@ -110,19 +142,18 @@ class ToolSet:
         return ToolLookup.from_toolset(self, agent=agent)
 
     def tool_dict(self, agent: Agent | None = None) -> dict[ToolName, BaseTool]:
-        '''Get a list of tools.'''
-        if self.tool_factories is not None:
-            if agent is None:
-                raise ValueError('agent must be provided if tool factories are provided')
-            factory_tools = {t.name: t for tf in self.tool_factories for t in tf(agent)}
-        else:
-            factory_tools = dict()
-
-        toolname_overlap = set(self.tools.keys()) & set(factory_tools.keys())
-        if len(toolname_overlap):
-            raise ValueError('The following tools are defined in both tools and tool factories: ' + ', '.join(toolname_overlap))
+        '''Get a dict of tools, including those created by tool factories.
+            Factory output is cached in agent.factory_cache unless it is None.
+        '''
+        if not len(self.tool_factories):
+            return dict(self.tools)
+        if agent is None:
+            raise ValueError('agent must be provided if tool factories are provided')
 
-        return {**self.tools, **factory_tools}
+        if agent.factory_cache is not None:
+            return agent.factory_cache.tool_dict(self.tools, self.tool_factories, agent)
+        factory_tools = {t.name: t for tf in self.tool_factories for t in tf(agent)}
+        return merge_factory_tools(self.tools, factory_tools)
 
     @classmethod
     def _tool_dict_from_lists(
@@ -143,6 +174,7 @@ class ToolSet:
             tools = dict(self.tools),
             tool_factories = list(self.tool_factories),
             tool_choice = self.tool_choice,
+            tool_selector = self.tool_selector,
         )
 
     ################################# dunder #################################
@@ -229,22 +261,69 @@ class ToolCallInfo:
         return format_tool_text(self.tool_call_args)
     
 
-    def execute(self, agent: Agent|None = None, add_to_history: bool = True) -> ToolCallResult:
+    def execute(self, agent: Agent|None = None, add_to_history: bool = True, timings: PhaseTimings | None = None) -> ToolCallResult:
         '''Execute the tool call and return the result.'''
-        try:
-            return_value = self.tool.invoke(self.args)
-        except Exception as e:
-            raise ToolRaisedExceptionError.from_exception(self, e) from e
+        cache = agent.tool_cache if agent is not None else None
+        runner = agent.tool_runner if agent is not None else None
+        cached, return_value = cache.get(self.name, self.args) if cache is not None else (False, None)
+        error = None
+        if not cached:
+            try:
+                with phase(timings, f'tool:{self.name}'):
+                    return_value = runner.invoke(self.tool, self.args) if runner is not None else self.tool.invoke(self.args)
+            except ToolTimeoutError as e:
+                # returned to the model rather than raised so it can retry or work around it
+                return_value = e.to_tool_content()
+                error = e
+            except Exception as e:
+                raise ToolRaisedExceptionError.from_exception(self, e) from e
+            if cache is not None and error is None:
+                cache.put(self.name, self.args, return_value)
         
         result = ToolCallResult.from_tool_info(
             info = self, 
             return_value = return_value, 
+            cached = cached,
+            error = error,
         )
 
         if add_to_history:
             if agent is None:
                 raise ValueError('agent must be provided if add_to_history is True')
-            agent.history.add_tool_message(result.return_value, result.id)
+            agent.history.add_tool_message(result.return_value, result.id, status=result.status)
+
+        return result
+
+    async def aexecute(self, agent: Agent|None = None, add_to_history: bool = True, timings: PhaseTimings | None = None) -> ToolCallResult:
+        '''Execute the tool call using BaseTool.ainvoke and return the result.'''
+        cache = agent.tool_cache if agent is not None else None
+        runner = agent.tool_runner if agent is not None else None
+        cached, return_value = cache.get(self.name, self.args) if cache is not None else (False, None)
+        error = None
+        if not cached:
+            try:
+                with phase(timings, f'tool:{self.name}'):
+                    return_value = await runner.ainvoke(self.tool, self.args) if runner is not None else await self.tool.ainvoke(self.args)
+            except ToolTimeoutError as e:
+                # returned to the model rather than raised so it can retry or work around it
+                return_value = e.to_tool_content()
+                error = e
+            except Exception as e:
+                raise ToolRaisedExceptionError.from_exception(self, e) from e
+            if cache is not None and error is None:
+                cache.put(self.name, self.args, return_value)
+        
+        result = ToolCallResult.from_tool_info(
+            info = self, 
+            return_value = return_value, 
+            cached = cached,
+            error = error,
+        )
+
+        if add_to_history:
+            if agent is None:
+                raise ValueError('agent must be provided if add_to_history is True')
+            agent.history.add_tool_message(result.return_value, result.id, status=result.status)
 
         return result
 
@@ -254,18 +333,29 @@ class ToolCallResult:
     '''Result of a tool call.'''
     info: ToolCallInfo
     return_value: typing.Any
+    cached: bool = False
+    error: ToolTimeoutError | None = None
 
     @classmethod
     def from_tool_info(cls, 
         info: ToolCallInfo,
         return_value: typing.Any,
+        cached: bool = False,
+        error: ToolTimeoutError | None = None,
     ) -> typing.Self:
         '''Create a tool call result from tool info, tool, and return value.'''
         return cls(
             info = info,
             return_value = return_value,
+            cached = cached,
+            error = error,
         )
 
+    @property
+    def status(self) -> typing.Literal['success', 'error']:
+        '''Status of the ToolMessage for this result.'''
+        return 'error' if self.error is not None else 'success'
+
     @property
     def id(self) -> ToolCallID:
         return self.info.id
@@ -5,14 +5,18 @@ from .toolset import UknownToolError, ToolRaisedExceptionError
 if typing.TYPE_CHECKING:
     from .agent import Agent
     from .chatresult import ChatResult
+    from .run import RunStep, RunTrace
 else:
     Agent = typing.TypeVar('Agent')
     ChatResult = typing.TypeVar('ChatResult')
+    RunStep = typing.TypeVar('RunStep')
+    RunTrace = typing.TypeVar('RunTrace')
 
 @dataclasses.dataclass
 class ChatBotUI:
     agent: Agent
     ignore_tool_exceptions: bool = False
+    max_iterations: int | None = 10
 
     def start_interactive(self, 
         stream: bool = False,
@@ -49,37 +53,35 @@ class ChatBotUI:
 
             #print(self.agent.history.get_buffer_string())
 
-    def _do_chat_call(self, user_text: str|None, stream: bool, show_tools: bool) -> dict[str,ChatResult]:
-        '''Handle a single chat. Recursive if tools are called.'''
-        print(f'AI Response: ', end="", flush=True)
-        if stream:
-            result = self.agent.stream(user_text, add_to_history=True)
-            for chunk in result:
-                print(chunk.content, end="", flush=True)
-        else:
-            result = self.agent.chat(user_text, add_to_history=True)
-            print(result.message.content)
-
-        if self.ignore_tool_exceptions:
-            try:
-                tool_results = result.execute_tools()
-            except UknownToolError as e:
-                print(f'UNKOWN TOOL CALL: {e.tool_name}')
+    def _do_chat_call(self, user_text: str|None, stream: bool, show_tools: bool) -> RunTrace | None:
+        '''Handle a single chat, executing tool calls until the model responds without them.'''
+        def print_step(step: RunStep) -> None:
+            if not stream:
+                print(step.content)
+            if len(step.tool_results):
+                print('\n[Tool Results]')
+                for tool_result in step.tool_results.values():
+                    print(f'{tool_result.info.tool_info_str()} -> {tool_result.return_value}')
+                print('[END Tool Results]')
+                print(f'AI Response: ', end="", flush=True)
 
-            except ToolRaisedExceptionError as e:
-                print(f'TOOL RAISED EXCEPTION: {str(e.e)}\nCALL INFO: {e.tool_info}')
-        else:
-            tool_results = result.execute_tools()
-
-        # if tools were called, do this recursively
-        if len(tool_results):
-            print('\n[Tool Results]')
-            for tool_result in tool_results.values():
-                print(f'{tool_result.info.tool_info_str()} -> {tool_result.return_value}')
-            print('[END Tool Results]')
-
-            # recursively call chat if tools were called
-            self._do_chat_call(None, stream, show_tools)
+        print(f'AI Response: ', end="", flush=True)
+        try:
+            return self.agent.run(
+                user_text,
+                max_iterations = self.max_iterations,
+                stream = stream,
+                do_print = stream,
+                on_step = print_step,
+            )
+        except UknownToolError as e:
+            if not self.ignore_tool_exceptions:
+                raise
+            print(f'UNKOWN TOOL CALL: {e.tool_name}')
+        except ToolRaisedExceptionError as e:
+            if not self.ignore_tool_exceptions:
+                raise
+            print(f'TOOL RAISED EXCEPTION: {str(e.e)}\nCALL INFO: {e.tool_info}')
 
     def start_streamlit(self, streamlit: typing.Any, show_intro: bool = False) -> None:
         user = lambda m: streamlit.chat_message("user").write(m)
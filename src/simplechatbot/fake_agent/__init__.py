@@ -0,0 +1,2 @@
+from .fake_model import FakeChatModel
+from .fake_agent import FakeAgent
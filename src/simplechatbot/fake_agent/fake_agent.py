@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import typing
+
+from .fake_model import FakeChatModel, ScriptedResponse
+
+if typing.TYPE_CHECKING:
+    from langchain_core.tools import BaseTool, BaseToolkit
+    from ..agent.toolset import ToolFactoryType, ToolName
+
+from ..agent import Agent
+
+
+class FakeAgent(Agent):
+    '''Agent created from the offline FakeChatModel. Use for tests and benchmarks without API keys.'''
+    @classmethod
+    def new(cls,
+        responses: list[ScriptedResponse] | None = None,
+        system_prompt: typing.Optional[str] = None,
+        tools: typing.Optional[list[BaseTool]] = None,
+        toolkits: typing.Optional[list[BaseToolkit]] = None,
+        tool_factories: list[ToolFactoryType] | None = None,
+        tool_choice: ToolName | typing.Literal['auto', 'any'] | None = None,
+        **model_kwargs,
+    ) -> typing.Self:
+        '''Create a new agent with a fake model.
+        Args:
+            responses: scripted responses returned in order. See FakeChatModel.
+            system_prompt: first system message for the chat.
+            tools: tools to be bound to the model using model.bind_tools(tools).
+            model_kwargs: any additional arguments to pass to FakeChatModel (latency, tokens_per_second, etc).
+        '''
+        model = FakeChatModel(
+            responses = list(responses) if responses is not None else [],
+            **model_kwargs
+        )
+        return cls.from_model(
+            model = model,
+            system_prompt = system_prompt,
+            tools = tools,
+            toolkits = toolkits,
+            tool_factories=tool_factories,
+            tool_choice = tool_choice,
+        )
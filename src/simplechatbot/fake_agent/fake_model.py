@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import typing
+import asyncio
+import json
+import re
+import threading
+import time
+import uuid
+
+import pydantic
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+)
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+if typing.TYPE_CHECKING:
+    from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+    from langchain_core.runnables import Runnable
+    from langchain_core.tools import BaseTool
+
+ScriptedResponse = typing.Union[
+    str,
+    AIMessage,
+    pydantic.BaseModel,
+    typing.Callable[[list[BaseMessage]], typing.Union[str, AIMessage, pydantic.BaseModel]],
+]
+
+
+class FakeChatModel(BaseChatModel):
+    '''Deterministic local chat model for tests and benchmarks. Needs no network access or API keys.
+        Responses are taken from `responses` in order (cycling when exhausted). A response can be:
+            str: plain text reply.
+            AIMessage: returned as-is, so scripted tool calls can be included via tool_calls.
+            pydantic.BaseModel: returned as a tool call named after the class, which is what
+                with_structured_output() expects.
+            callable: called with the input messages and should return one of the above.
+        If there are no responses, the last input message is echoed back.
+        Latency is simulated with `latency` (seconds before the first token) and
+        `tokens_per_second` (pacing of streamed output; None means no delay).
+    '''
+    responses: list[typing.Any] = pydantic.Field(default_factory=list) # list[ScriptedResponse]; Any avoids pydantic coercion
+    latency: float = 0.0
+    tokens_per_second: float | None = None
+    tokens_per_chunk: int = 1
+    model_name: str = 'fake-chat-model'
+    _cursor: int = pydantic.PrivateAttr(default=0)
+    _lock: threading.Lock = pydantic.PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return 'simplechatbot-fake'
+
+    @property
+    def _identifying_params(self) -> dict[str, typing.Any]:
+        return {'model_name': self.model_name}
+
+    @property
+    def num_calls(self) -> int:
+        '''Number of responses produced so far.'''
+        return self._cursor
+
+    def bind_tools(
+        self,
+        tools: typing.Sequence[BaseTool | dict | type | typing.Callable],
+        tool_choice: str | None = None,
+        **kwargs,
+    ) -> Runnable[typing.Any, AIMessage]:
+        '''Convert tools to schemas the way a real provider would, so binding cost is realistic.'''
+        formatted_tools = [convert_to_openai_tool(t) for t in tools]
+        if tool_choice is not None:
+            kwargs['tool_choice'] = tool_choice
+        return self.bind(tools=formatted_tools, **kwargs)
+
+    ############################# generating responses #############################
+    def next_message(self, messages: list[BaseMessage]) -> AIMessage:
+        '''Get the next scripted response as an AIMessage.'''
+        with self._lock:
+            if len(self.responses):
+                response = self.responses[self._cursor % len(self.responses)]
+            else:
+                response = None
+            self._cursor += 1
+
+        if response is None:
+            response = messages[-1].content if len(messages) else ''
+        if callable(response) and not isinstance(response, (str, AIMessage, pydantic.BaseModel)):
+            response = response(messages)
+
+        if isinstance(response, AIMessage):
+            message = response
+        elif isinstance(response, pydantic.BaseModel):
+            message = AIMessage(content='', tool_calls=[{
+                'name': type(response).__name__,
+                'args': response.model_dump(),
+                'id': f'call_{uuid.uuid4().hex[:24]}',
+            }])
+        else:
+            message = AIMessage(content=str(response))
+
+        return message.model_copy(update={
+            'usage_metadata': self._usage_metadata(messages, message),
+        })
+
+    def split_chunks(self, message: AIMessage) -> list[AIMessageChunk]:
+        '''Split a message into streamed chunks of `tokens_per_chunk` whitespace-delimited tokens.
+            Tool calls are sent in the final chunk, with usage metadata.
+        '''
+        tokens = self._tokenize(message.content)
+        texts = [''.join(tokens[i:i+self.tokens_per_chunk]) for i in range(0, len(tokens), self.tokens_per_chunk)]
+        chunks = [AIMessageChunk(content=t, id=message.id) for t in texts]
+        chunks.append(AIMessageChunk(
+            content = '',
+            id = message.id,
+            usage_metadata = message.usage_metadata,
+            tool_call_chunks = [
+                tool_call_chunk(name=tc['name'], args=json.dumps(tc['args']), id=tc['id'], index=i)
+                for i, tc in enumerate(message.tool_calls)
+            ],
+        ))
+        return chunks
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        message = self.next_message(messages)
+        time.sleep(self.latency + self._generation_time(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        message = self.next_message(messages)
+        await asyncio.sleep(self.latency + self._generation_time(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> typing.Iterator[ChatGenerationChunk]:
+        message = self.next_message(messages)
+        if self.latency > 0:
+            time.sleep(self.latency)
+        for chunk in self.split_chunks(message):
+            delay = self._chunk_delay()
+            if delay > 0:
+                time.sleep(delay)
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: typing.Any,
+    ) -> typing.AsyncIterator[ChatGenerationChunk]:
+        message = self.next_message(messages)
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        for chunk in self.split_chunks(message):
+            delay = self._chunk_delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    ############################# helpers #############################
+    @staticmethod
+    def _tokenize(content: typing.Any) -> list[str]:
+        '''Split on whitespace, keeping the whitespace so tokens join back to the original text.'''
+        if not isinstance(content, str):
+            content = json.dumps(content, default=str)
+        return [t for t in re.split(r'(\s+)', content) if t]
+
+    def _generation_time(self, message: AIMessage) -> float:
+        if self.tokens_per_second is None:
+            return 0.0
+        return len(self._tokenize(message.content)) / self.tokens_per_second
+
+    def _chunk_delay(self) -> float:
+        if self.tokens_per_second is None:
+            return 0.0
+        return self.tokens_per_chunk / self.tokens_per_second
+
+    def _usage_metadata(self, messages: list[BaseMessage], message: AIMessage) -> dict[str, int]:
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4 # cheap estimate so long histories don't dominate benchmarks
+        output_tokens = len(self._tokenize(message.content)) + len(json.dumps(message.tool_calls)) // 4
+        return {
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'total_tokens': input_tokens + output_tokens,
+        }
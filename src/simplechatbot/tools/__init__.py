@@ -1,5 +1,32 @@
 
-# esposing everything in rag as a tool
-from .rag import *
+import importlib
+import typing
 
-from .workspaces import WorkspacesToolkit
+# tools are imported lazily because some (e.g. rag) pull in heavy dependencies.
+#   Access them like this:
+# import simplechatbot
+# simplechatbot.tools.WorkspacesToolkit
+_LAZY_ATTRIBUTES = {
+    # esposing everything in rag as a tool
+    'RagTool': '.rag',
+    'WorkspacesToolkit': '.workspaces',
+}
+_LAZY_SUBMODULES = ('rag', 'workspaces')
+
+if typing.TYPE_CHECKING:
+    from .rag import *
+    from .workspaces import WorkspacesToolkit
+
+def __getattr__(name: str) -> typing.Any:
+    '''Import tools lazily (PEP 562).'''
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    elif name in _LAZY_SUBMODULES:
+        value = importlib.import_module(f'.{name}', __name__)
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    globals()[name] = value
+    return value
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | set(_LAZY_SUBMODULES))
@@ -0,0 +1,90 @@
+from __future__ import annotations
+import typing
+import asyncio
+
+import pydantic
+import langchain_core.tools
+from langchain_core.messages import AIMessage
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+
+
+class FakeToolModel(GenericFakeChatModel):
+    '''Fake model that ignores tool binding so it can be used offline.'''
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+@langchain_core.tools.tool
+def add_numbers(a: int, b: int) -> int:
+    '''Add two numbers.'''
+    return a + b
+
+
+def make_agent(messages: list[AIMessage | str]) -> simplechatbot.Agent:
+    return simplechatbot.Agent.from_model(
+        model = FakeToolModel(messages=iter(messages)),
+        system_prompt = 'You are a helpful assistant.',
+        tools = [add_numbers],
+    )
+
+
+def test_achat():
+    agent = make_agent([
+        AIMessage(content='', tool_calls=[{'name': 'add_numbers', 'args': {'a': 1, 'b': 2}, 'id': 'call_1'}]),
+        'The answer is 3.',
+    ])
+
+    async def run():
+        r = await agent.achat('What is 1+2?')
+        assert(r.has_tool_calls())
+        results = await r.aexecute_tools()
+        assert(results['call_1'].return_value == 3)
+        r = await agent.achat(None)
+        assert(r.content == 'The answer is 3.')
+
+    asyncio.run(run())
+    assert(len(agent.history) == 5)
+
+
+def test_astream():
+    agent = make_agent(['hello there world'])
+
+    async def run():
+        stream = agent.astream('hello')
+        chunks = [c async for c in stream]
+        assert(len(chunks) > 1)
+        r = await stream.collect()
+        assert(r.content == 'hello there world')
+        assert(len(await stream.aexecute_tools()) == 0)
+        assert(len(await stream.execute_tools()) == 0) # alias
+
+    asyncio.run(run())
+    assert(agent.history.last.content == 'hello there world')
+
+
+def test_achat_structured():
+    class Answer(pydantic.BaseModel):
+        answer: str
+
+    agent = make_agent([])
+    agent._model = GenericFakeChatModel(messages=iter([]))
+
+    class FakeStructured:
+        async def ainvoke(self, messages, **kwargs):
+            return Answer(answer='42')
+
+    agent.get_model_with_structured_output = lambda output_structure: FakeStructured()
+
+    r = asyncio.run(agent.achat_structured('What is the answer?', output_structure=Answer))
+    assert(r.data.answer == '42')
+    assert(len(agent.history) == 3)
+
+
+if __name__ == '__main__':
+    test_achat()
+    test_astream()
+    test_achat_structured()
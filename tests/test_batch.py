@@ -0,0 +1,66 @@
+from __future__ import annotations
+import typing
+import asyncio
+
+import pydantic
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import RunnableLambda
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+
+
+class EchoModel(BaseChatModel):
+    '''Fake model that echoes the last message in upper case and fails on "fail".'''
+    @property
+    def _llm_type(self) -> str:
+        return 'echo'
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        content = messages[-1].content
+        if content == 'fail':
+            raise ValueError('requested failure')
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content.upper()))])
+
+    def with_structured_output(self, schema, **kwargs):
+        return self | RunnableLambda(lambda m: schema(label=m.content))
+
+
+def test_chat_many():
+    agent = simplechatbot.Agent.from_model(EchoModel(), system_prompt='Echo the user.')
+    inputs = ['a', 'b', 'fail', 'd']
+    results = agent.chat_many(inputs, max_concurrency=2)
+    assert(len(results) == 4)
+    assert([r.content for r in results if not isinstance(r, Exception)] == ['A', 'B', 'D'])
+    assert(isinstance(results[2], ValueError))
+
+    # original history is untouched, forks hold each conversation
+    assert(len(agent.history) == 1)
+    assert(len(results[0].agent.history) == 3)
+    assert(results[1].agent.history.last_human.content == 'b')
+
+    results = asyncio.run(agent.achat_many(inputs))
+    assert(results[3].content == 'D')
+
+
+def test_chat_structured_many():
+    class Label(pydantic.BaseModel):
+        label: str
+
+    agent = simplechatbot.Agent.from_model(EchoModel(), system_prompt='Echo the user.')
+    results = agent.chat_structured_many(['x', 'fail', 'z'], output_structure=Label)
+    assert(results[0].data.label == 'X')
+    assert(isinstance(results[1], Exception))
+    assert(results[2].data.label == 'Z')
+    assert(len(agent.history) == 1)
+
+    results = asyncio.run(agent.achat_structured_many(['x', 'y'], output_structure=Label))
+    assert([r.data.label for r in results] == ['X', 'Y'])
+
+
+if __name__ == '__main__':
+    test_chat_many()
+    test_chat_structured_many()
@@ -0,0 +1,77 @@
+from __future__ import annotations
+import typing
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent
+
+
+def test_chat_best_of():
+    agent = FakeAgent.new(responses=['ok', 'a much longer reply', 'medium reply', 'hi'], system_prompt='Be helpful.')
+    best = agent.chat_best_of('Say something.', n=4, scorer=lambda m: len(m.content))
+    assert(best.content == 'a much longer reply' and best.stop_reason == 'complete')
+    assert(sorted(best.scores) == [2, 2, 12, 19] and best.num_cancelled == 0)
+
+    # only the message and the winner are added to history
+    assert([m.content for m in agent.history][1:] == ['Say something.', 'a much longer reply'])
+    agent.history.check_tools_were_executed()
+
+
+def test_best_of_threshold_cancels():
+    agent = FakeAgent.new(responses=['good'], latency=0.05)
+    start = time.perf_counter()
+    best = agent.chat_best_of('Hello.', n=8, scorer=lambda m: 1.0, threshold=1.0, max_concurrency=2)
+    assert(best.stop_reason == 'threshold' and len(best.candidates) == 1)
+    assert(best.num_cancelled == 7)
+    assert(time.perf_counter() - start < 0.2)
+    assert(agent._model.num_calls < 8) # queued requests were never sent
+
+    async def ascorer(message: AIMessage) -> float:
+        return 5.0
+    agent = FakeAgent.new(responses=['fast'], latency=0.05)
+    best = asyncio.run(agent.achat_best_of('Hello.', n=6, scorer=ascorer, threshold=5.0))
+    assert(best.stop_reason == 'threshold' and best.num_cancelled == 5 and best.content == 'fast')
+    assert(len(agent.history) == 2)
+
+
+def test_structured_judge():
+    judge_agent = FakeAgent.new(responses=[
+        simplechatbot.JudgeScore(reasoning='too short', score=3),
+        simplechatbot.JudgeScore(reasoning='great', score=9),
+    ])
+    judge = simplechatbot.StructuredJudge(judge_agent, instructions='Prefer detail.')
+    agent = FakeAgent.new(responses=['short', 'detailed'])
+    best = agent.chat_best_of('Explain.', n=2, scorer=judge, max_concurrency=1)
+    assert(best.best.score == 9 and best.content == 'detailed')
+    assert(len(judge_agent.history) == 0)
+
+    best = asyncio.run(agent.achat_best_of('Explain.', n=2, scorer=judge, max_concurrency=1))
+    assert(best.best.score == 9)
+
+
+def test_invalid_n():
+    agent = FakeAgent.new(responses=['ok'])
+    for kwargs in [dict(n=0), dict(n=-1), dict(n=2, max_concurrency=0)]:
+        try:
+            agent.chat_best_of('Hello.', scorer=len, **kwargs)
+            assert(False)
+        except ValueError:
+            pass
+        try:
+            asyncio.run(agent.achat_best_of('Hello.', scorer=len, **kwargs))
+            assert(False)
+        except ValueError:
+            pass
+    assert(agent._model.num_calls == 0 and len(agent.history) == 0)
+
+
+if __name__ == '__main__':
+    test_chat_best_of()
+    test_best_of_threshold_cancels()
+    test_structured_judge()
+    test_invalid_n()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+import typing
+
+import langchain_core.tools
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+
+
+class CountingBindModel(GenericFakeChatModel):
+    '''Fake model that counts how many times tools are bound.'''
+    bind_count: int = 0
+
+    def bind_tools(self, tools, **kwargs):
+        self.bind_count += 1
+        return self
+
+
+@langchain_core.tools.tool
+def add_numbers(a: int, b: int) -> int:
+    '''Add two numbers.'''
+    return a + b
+
+@langchain_core.tools.tool
+def multiply_numbers(a: int, b: int) -> int:
+    '''Multiply two numbers.'''
+    return a * b
+
+
+def test_binding_cache():
+    model = CountingBindModel(messages=iter([]))
+    agent = simplechatbot.Agent.from_model(
+        model = model,
+        tools = [add_numbers],
+    )
+    for _ in range(5):
+        agent.get_model_with_tools()
+    assert(model.bind_count == 1)
+    assert(agent.binding_cache.stats().hits == 4)
+
+    # different tools or tool_choice produce a new binding
+    agent.get_model_with_tools(tools=[multiply_numbers])
+    agent.get_model_with_tools(tool_choice='any')
+    assert(model.bind_count == 3)
+    agent.get_model_with_tools(tools=[multiply_numbers])
+    assert(model.bind_count == 3)
+
+    # clones share the cache
+    agent.clone().get_model_with_tools()
+    assert(model.bind_count == 3)
+
+    agent.invalidate_binding_cache()
+    agent.get_model_with_tools()
+    assert(model.bind_count == 4)
+    assert(agent.binding_cache.stats().invalidations == 1)
+
+
+def test_binding_cache_model_identity():
+    model1 = CountingBindModel(messages=iter([]))
+    model2 = CountingBindModel(messages=iter([]))
+    cache = simplechatbot.ModelBindingCache()
+    lookup = simplechatbot.ToolSet.from_tools(tools=[add_numbers]).tool_lookup()
+    cache.bind_tools(model1, lookup)
+    cache.bind_tools(model2, lookup)
+    cache.bind_tools(model1, lookup)
+    assert(model1.bind_count == 1 and model2.bind_count == 1)
+    assert(len(cache) == 2)
+
+
+if __name__ == '__main__':
+    test_binding_cache()
+    test_binding_cache_model_identity()
@@ -0,0 +1,114 @@
+from __future__ import annotations
+import typing
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent
+
+
+def make_agent(num_turns: int) -> FakeAgent:
+    agent = FakeAgent.new(responses=['A reply.'], system_prompt='You narrate a story.')
+    for i in range(num_turns):
+        agent.history.add_human_message(f'Turn {i}: ' + 'x' * 200)
+        agent.history.add_ai_message(f'Reply {i}: ' + 'y' * 200)
+    return agent
+
+
+def test_checkpoint_and_branch():
+    agent = make_agent(20)
+    history = agent.history
+    checkpoint = agent.checkpoint(label='intro')
+    assert(agent.history is history and len(checkpoint) == 41) # the agent's history is not replaced
+
+    branches = [agent.branch(checkpoint) for _ in range(5)]
+    for i, branch in enumerate(branches):
+        branch.chat(f'Branch {i}')
+    assert(all(len(b.history) == 43 for b in branches))
+    assert(branches[0].history[-2].content == 'Branch 0' and branches[4].history[-2].content == 'Branch 4')
+    assert(branches[2].history[10] is agent.history[10])
+
+    # the agent and checkpoint are unchanged
+    agent.chat('Main line')
+    assert(len(agent.history) == 43 and len(checkpoint) == 41)
+    assert(agent.branch(checkpoint).history == checkpoint.history)
+
+
+def test_enable_shared_history():
+    agent = make_agent(5)
+    history = agent.enable_shared_history()
+    assert(agent.history is history and isinstance(history, simplechatbot.SharedMessageHistory))
+    assert(agent.enable_shared_history() is history)
+    assert(len(history) == 11)
+
+    checkpoint = agent.checkpoint()
+    assert(checkpoint.history._segment is history._segment) # O(1) snapshot
+    agent.chat('Next')
+    assert(len(agent.history) == 13 and len(checkpoint) == 11)
+
+
+def test_rewind():
+    agent = make_agent(5)
+    removed = agent.rewind(2)
+    assert([m.content[:6] for m in removed] == ['Turn 3', 'Reply ', 'Turn 4', 'Reply '])
+    assert(agent.history.last_human.content.startswith('Turn 2') and len(agent.history) == 7)
+
+    checkpoint = agent.checkpoint()
+    agent.chat('New turn')
+    agent.rewind()
+    assert(agent.history == checkpoint.history)
+
+    try:
+        agent.rewind(10)
+        assert(False)
+    except ValueError:
+        pass
+
+
+def test_rewind_shared_history():
+    class CountingHistory(simplechatbot.SharedMessageHistory):
+        num_iters = 0
+        def __iter__(self):
+            self.num_iters += 1
+            return super().__iter__()
+
+    agent = make_agent(0)
+    agent.history = CountingHistory(agent.history)
+    for i in range(500):
+        agent.history.add_human_message(f'Turn {i}')
+        agent.history.add_ai_message(f'Reply {i}')
+    agent.history.num_iters = 0
+    removed = agent.rewind(2)
+    assert(len(removed) == 4 and len(agent.history) == 997)
+    assert(agent.history.num_iters == 0) # only the removed turns were read
+
+
+def test_branch_memory():
+    num_branches = 50
+    agent = make_agent(50)
+    checkpoint = agent.checkpoint()
+    branches = [agent.branch(checkpoint) for _ in range(num_branches)]
+    for branch in branches:
+        branch.history.add_human_message('Something new')
+
+    # clones that replay the conversation have their own copies of every message
+    replayed = [make_agent(50) for _ in range(num_branches)]
+    for clone in replayed:
+        clone.history.add_human_message('Something new')
+
+    shared = simplechatbot.history_footprint(b.history for b in branches)
+    copied = simplechatbot.history_footprint(c.history for c in replayed)
+    assert(shared.total_messages == copied.total_messages)
+    assert(shared.unique_messages == 101 + num_branches)
+    assert(copied.sharing_ratio == 1.0 and shared.sharing_ratio > 30)
+    assert(shared.total_bytes * 10 < copied.total_bytes)
+
+
+if __name__ == '__main__':
+    test_checkpoint_and_branch()
+    test_enable_shared_history()
+    test_rewind()
+    test_rewind_shared_history()
+    test_branch_memory()
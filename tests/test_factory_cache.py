@@ -0,0 +1,98 @@
+from __future__ import annotations
+import typing
+
+import langchain_core.tools
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent
+
+
+@langchain_core.tools.tool
+def add_numbers(a: int, b: int) -> int:
+    '''Add two numbers.'''
+    return a + b
+
+
+class CountingFactory:
+    '''Tool factory that counts how many times it was called.'''
+    def __init__(self, name: str = 'get_name'):
+        self.name = name
+        self.num_calls = 0
+
+    def __call__(self, agent: simplechatbot.Agent) -> list[langchain_core.tools.BaseTool]:
+        self.num_calls += 1
+        num_calls = self.num_calls
+        def get_name() -> str:
+            '''Get a name.'''
+            return f'name {num_calls}'
+        return [langchain_core.tools.tool(self.name)(get_name)]
+
+
+def test_factory_output_is_cached():
+    factory = CountingFactory()
+    agent = FakeAgent.new(responses=['hi'], tools=[add_numbers], tool_factories=[factory])
+    for _ in range(3):
+        agent.chat('hello')
+    repr(agent)
+    agent.toolset.tool_lookup(agent=agent)
+    assert(factory.num_calls == 1)
+
+    # per-call tools do not change the factory key
+    agent.chat('hello', tools=[])
+    assert(factory.num_calls == 1)
+
+    agent.invalidate_tool_factories(factory)
+    lookup = agent.toolset.tool_lookup(agent=agent)
+    assert(factory.num_calls == 2)
+    assert(lookup['get_name'].invoke({}) == 'name 2')
+
+    # clones call the factory with the new agent
+    agent.clone().chat('hello')
+    assert(factory.num_calls == 3)
+
+
+def test_cached_output_is_copied():
+    factory = CountingFactory()
+    agent = FakeAgent.new(responses=['hi'], tools=[add_numbers], tool_factories=[factory])
+    tools = agent.toolset.tool_dict(agent=agent)
+    del tools['add_numbers']
+    tools['extra'] = add_numbers
+    assert(set(agent.toolset.tool_dict(agent=agent)) == {'add_numbers', 'get_name'})
+
+    output = agent.factory_cache.factory_output(factory, agent)
+    output.clear()
+    assert(len(agent.factory_cache.factory_output(factory, agent)) == 1)
+    assert(factory.num_calls == 1)
+
+
+def test_dynamic_and_disabled():
+    factory = CountingFactory()
+    agent = FakeAgent.new(responses=['hi'], tool_factories=[simplechatbot.dynamic_tool_factory(factory)])
+    agent.chat('hello')
+    agent.chat('hello')
+    assert(factory.num_calls == 2)
+
+    factory = CountingFactory()
+    agent = FakeAgent.new(responses=['hi'], tool_factories=[factory])
+    agent.factory_cache = None
+    agent.chat('hello')
+    agent.chat('hello')
+    assert(factory.num_calls == 2)
+
+
+def test_overlap_validation():
+    agent = FakeAgent.new(responses=['hi'], tools=[add_numbers], tool_factories=[CountingFactory('add_numbers')])
+    try:
+        agent.chat('hello')
+        assert(False)
+    except ValueError:
+        pass
+
+
+if __name__ == '__main__':
+    test_factory_output_is_cached()
+    test_cached_output_is_copied()
+    test_dynamic_and_disabled()
+    test_overlap_validation()
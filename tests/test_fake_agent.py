@@ -0,0 +1,66 @@
+from __future__ import annotations
+import typing
+import asyncio
+import time
+
+import pydantic
+import langchain_core.tools
+from langchain_core.messages import AIMessage
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent, FakeChatModel
+
+
+@langchain_core.tools.tool
+def add_numbers(a: int, b: int) -> int:
+    '''Add two numbers.'''
+    return a + b
+
+
+def test_scripted_tool_loop():
+    agent = FakeAgent.new(
+        responses = [
+            AIMessage(content='', tool_calls=[{'name': 'add_numbers', 'args': {'a': 1, 'b': 2}, 'id': 'call_1'}]),
+            'The answer is 3.',
+        ],
+        system_prompt = 'You are a calculator.',
+        tools = [add_numbers],
+    )
+    r = agent.stream('What is 1+2?').collect()
+    assert(r.tool_calls[0].name == 'add_numbers')
+    assert(r.execute_tools()['call_1'].return_value == 3)
+    assert(agent.chat(None).content == 'The answer is 3.')
+    assert(agent._model.num_calls == 2)
+
+
+def test_streaming_chunks_and_latency():
+    model = FakeChatModel(responses=['one two three four'], tokens_per_chunk=2, latency=0.05, tokens_per_second=100)
+    start = time.monotonic()
+    chunks = list(model.stream('hello'))
+    assert(time.monotonic() - start >= 0.05)
+    assert(''.join(c.content for c in chunks) == 'one two three four')
+    assert(len([c for c in chunks if c.content]) == 4) # 7 tokens incl. whitespace, 2 per chunk
+    assert(sum(chunks[1:], chunks[0]).usage_metadata['output_tokens'] > 0)
+
+
+def test_structured_output():
+    class Answer(pydantic.BaseModel):
+        answer: str
+
+    agent = FakeAgent.new(responses=[Answer(answer='42')])
+    assert(agent.chat_structured('What is the answer?', output_structure=Answer).data.answer == '42')
+    assert(asyncio.run(agent.achat_structured('Again?', output_structure=Answer)).data.answer == '42')
+
+
+def test_echo():
+    agent = FakeAgent.new()
+    assert(agent.chat('echo this').content == 'echo this')
+
+
+if __name__ == '__main__':
+    test_scripted_tool_loop()
+    test_streaming_chunks_and_latency()
+    test_structured_output()
+    test_echo()
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import typing
+import asyncio
+import time
+
+import pydantic
+import langchain_core.tools
+from langchain_core.messages import AIMessage
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent, FakeChatModel
+
+
+@langchain_core.tools.tool
+def add_numbers(a: int, b: int) -> int:
+    '''Add two numbers.'''
+    return a + b
+
+
+class Answer(pydantic.BaseModel):
+    value: int
+
+
+def make_group(slow_latency: float = 0.5, **kwargs) -> simplechatbot.HedgedChatModel:
+    return simplechatbot.HedgedChatModel(
+        models = [
+            FakeChatModel(responses=['slow reply'], latency=slow_latency, model_name='slow'),
+            FakeChatModel(responses=['fast reply'], model_name='fast'),
+        ],
+        hedge_delay = 0.05,
+        **kwargs,
+    )
+
+
+def test_hedged_invoke_and_reorder():
+    model = make_group()
+    agent = simplechatbot.Agent.from_model(model)
+    start = time.perf_counter()
+    assert(agent.chat('Hello').content == 'fast reply')
+    assert(time.perf_counter() - start < 0.3)
+    stats = {s.name: s for s in model.latency_stats()}
+    assert(stats['fast'].wins == 1 and stats['fast'].hedges == 1 and stats['slow'].num_samples == 1)
+
+    # the fast model is now tried first, so no hedge is needed
+    assert(model.tracker.order(2) == [1, 0])
+    assert(agent.chat('Hello again').content == 'fast reply')
+    assert(model.latency_stats()[1].hedges == 1 and model.models[0].num_calls == 1)
+
+    # primary answers before the hedge delay
+    model = make_group(slow_latency=0.0)
+    assert(model.invoke('Hi').content == 'slow reply' and model.models[1].num_calls == 0)
+
+
+def test_hedged_stream():
+    model = make_group()
+    agent = simplechatbot.Agent.from_model(model)
+    assert(agent.stream('Hello').collect().content == 'fast reply')
+
+    model = make_group()
+    async def collect() -> str:
+        return ''.join([chunk.content async for chunk in model.astream('Hello')])
+    assert(asyncio.run(collect()) == 'fast reply')
+    assert(asyncio.run(model.ainvoke('Hello')).content == 'fast reply')
+
+
+def test_hedged_failover():
+    def fail(messages):
+        raise ConnectionError('provider down')
+    model = simplechatbot.HedgedChatModel(
+        models = [FakeChatModel(responses=[fail]), FakeChatModel(responses=['backup'])],
+        hedge_delay = 10.0,
+    )
+    assert(model.invoke('Hi').content == 'backup')
+    assert(''.join(c.content for c in model.stream('Hi')) == 'backup')
+    assert(model.latency_stats()[0].failures >= 1)
+
+    model = simplechatbot.HedgedChatModel(models=[FakeChatModel(responses=[fail])])
+    try:
+        model.invoke('Hi')
+        assert(False)
+    except ConnectionError:
+        pass
+
+
+def test_hedged_tools_and_structured_output():
+    tool_call = AIMessage(content='', tool_calls=[{'name': 'add_numbers', 'args': {'a': 1, 'b': 2}, 'id': 'call_1'}])
+    model = simplechatbot.HedgedChatModel(
+        models = [FakeChatModel(responses=[tool_call], latency=0.5), FakeChatModel(responses=[tool_call])],
+        hedge_delay = 0.05,
+    )
+    agent = simplechatbot.Agent.from_model(model, tools=[add_numbers])
+    result = agent.chat('Add 1 and 2.')
+    assert(result.execute_tools()['call_1'].return_value == 3)
+    bound, _ = agent.get_model_with_tools()
+    assert(bound.tracker is model.tracker)
+
+    model = simplechatbot.HedgedChatModel(models=[FakeChatModel(responses=[Answer(value=3)])])
+    agent = simplechatbot.Agent.from_model(model)
+    assert(agent.chat_structured('What is 1+2?', output_structure=Answer).data.value == 3)
+
+
+def test_hedged_cache_keys():
+    # tool-bound copies must not share response cache entries with the unbound model
+    model = make_group()
+    agent = simplechatbot.Agent.from_model(model, response_cache=simplechatbot.ResponseCache())
+    agent.chat('hi', add_to_history=False)
+    agent.chat('hi', tools=[add_numbers], add_to_history=False)
+    agent.chat('hi', tools=[add_numbers], add_to_history=False)
+    stats = agent.response_cache.stats()
+    assert(stats.misses == 2 and stats.hits == 1)
+
+
+if __name__ == '__main__':
+    test_hedged_invoke_and_reorder()
+    test_hedged_stream()
+    test_hedged_failover()
+    test_hedged_tools_and_structured_output()
+    test_hedged_cache_keys()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+import typing
+import subprocess
+import sys
+import pathlib
+
+SRC_PATH = str(pathlib.Path(__file__).parent.parent / 'src')
+
+# these should only be loaded when the tools or provider subpackages are accessed
+HEAVY_MODULES = (
+    'simplechatbot.tools',
+    'simplechatbot.andrew',
+    'simplechatbot.openai_agent',
+    'simplechatbot.ollama_agent',
+    'simplechatbot.mistral_agent',
+    'simplechatbot.fake_agent',
+    'langchain_community',
+    'langchain_chroma',
+    'langchain_nvidia_ai_endpoints',
+    'langchain_openai',
+    'langchain_ollama',
+    'langchain_mistralai',
+    'bs4',
+)
+
+
+def run_import(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, '-c', f'import sys; sys.path.insert(0, {SRC_PATH!r}); {code}'],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_no_heavy_imports():
+    proc = run_import(f'import simplechatbot; print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))')
+    loaded = [m for m in proc.stdout.strip().split(',') if m]
+    assert(len(loaded) == 0), f'heavy modules imported eagerly: {loaded}'
+
+
+def test_lazy_access():
+    sys.path.append('../src/')
+    import simplechatbot
+    assert(simplechatbot.tools.WorkspacesToolkit.__name__ == 'WorkspacesToolkit')
+    assert('tools' in dir(simplechatbot))
+
+
+if __name__ == '__main__':
+    test_no_heavy_imports()
+    test_lazy_access()
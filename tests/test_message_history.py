@@ -0,0 +1,137 @@
+from __future__ import annotations
+import typing
+import pickle
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+
+
+def tool_call_message(*ids: str) -> AIMessage:
+    return AIMessage(content='', tool_calls=[{'name': 'some_tool', 'args': {}, 'id': i} for i in ids])
+
+
+def test_pending_tool_calls():
+    history = simplechatbot.MessageHistory.from_system_prompt('You are a helpful assistant.')
+    history.check_tools_were_executed()
+
+    # last message is an AIMessage with tool calls (used to index past the end)
+    history.add_message(tool_call_message('call_1', 'call_2'))
+    assert(history.pending_tool_ids() == {'call_1', 'call_2'})
+    try:
+        history.check_tools_were_executed()
+        assert(False)
+    except simplechatbot.ToolWasNotExecutedError:
+        pass
+
+    history.add_tool_message('result', 'call_1')
+    assert(history.tool_result_exists('call_1'))
+    assert(not history.tool_result_exists('call_2'))
+    assert(history.pending_tool_ids() == {'call_2'})
+
+    history.add_tool_message('result', 'call_2')
+    history.check_tools_were_executed()
+    assert(history.executed_tool_ids() == {'call_1', 'call_2'})
+
+
+def test_index_survives_list_operations():
+    history = simplechatbot.MessageHistory()
+    history.add_human_message('hello')
+    history.add_message(tool_call_message('call_1'))
+    history.add_tool_message('result', 'call_1')
+
+    # removing the tool result makes the call pending again
+    removed = history.pop()
+    assert(isinstance(removed, ToolMessage))
+    assert(history.pending_tool_ids() == {'call_1'})
+    assert(history.clone().pending_tool_ids() == {'call_1'})
+    assert(pickle.loads(pickle.dumps(history)).pending_tool_ids() == {'call_1'})
+
+    history += [ToolMessage(content='result', tool_call_id='call_1')]
+    history.check_tools_were_executed()
+
+    del history[1:]
+    history.check_tools_were_executed()
+    assert(len(history.executed_tool_ids()) == 0)
+
+
+def make_long_history(num_turns: int) -> simplechatbot.MessageHistory:
+    history = simplechatbot.MessageHistory.from_system_prompt('You are a helpful assistant.')
+    for i in range(num_turns):
+        history.add_human_message(f'question {i} ' + 'x'*36)
+        history.add_message(tool_call_message(f'call_{i}'))
+        history.add_tool_message('y'*40, f'call_{i}')
+        history.add_ai_message(f'answer {i} ' + 'z'*36)
+    return history
+
+
+def test_context_window_turns():
+    history = make_long_history(10)
+    messages = history.windowed(simplechatbot.ContextWindow(max_turns=2))
+    assert(isinstance(messages[0], SystemMessage))
+    assert(len(messages) == 1 + 2*4)
+    assert(messages[1].content.startswith('question 8'))
+    assert(len(history) == 1 + 10*4)
+
+
+def test_context_window_tokens():
+    history = make_long_history(50)
+    window = simplechatbot.ContextWindow(max_tokens=100, token_counter=lambda m: 10)
+    messages = history.windowed(window)
+    assert(isinstance(messages[0], SystemMessage))
+    assert(len(messages) == 10)
+    # never starts with an orphaned tool message
+    assert(not isinstance(messages[1], ToolMessage))
+    assert(sum(window.count_tokens(m) for m in messages) <= 100)
+
+    # the most recent message is always sent even if over budget
+    window = simplechatbot.ContextWindow(max_tokens=1)
+    assert(history.windowed(window)[-1] is history[-1])
+
+
+def test_context_window_reads():
+    class CountingHistory(simplechatbot.SharedMessageHistory):
+        num_reads = 0
+        def __getitem__(self, index):
+            self.num_reads += len(range(*index.indices(len(self)))) if isinstance(index, slice) else 1
+            return super().__getitem__(index)
+        def __iter__(self):
+            self.num_reads += len(self)
+            return super().__iter__()
+
+    history = CountingHistory()
+    history.add_system_message('system')
+    for i in range(5000):
+        history.add_human_message(f'message {i}')
+        history.add_message(AIMessage(content='', tool_calls=[{'name': 'add', 'args': {}, 'id': f'call_{i}'}]))
+        history.add_tool_message(i, tool_call_id=f'call_{i}')
+        history.add_ai_message(f'reply {i}')
+    history.num_reads = 0
+    messages = history.windowed(simplechatbot.ContextWindow(max_turns=20), [HumanMessage('new')])
+    assert(len(messages) == 1 + 4*19 + 1)
+    assert(history.num_reads < 100) # proportional to the window, not the history
+
+
+def test_agent_context_window():
+    agent = simplechatbot.Agent.from_model(
+        model = GenericFakeChatModel(messages=iter([f'answer {i}' for i in range(5)])),
+        system_prompt = 'You are a helpful assistant.',
+        context_window = simplechatbot.ContextWindow(max_turns=1),
+    )
+    for i in range(5):
+        agent.chat(f'message {i}')
+    assert(len(agent.history) == 11)
+    assert(len(agent._get_message_history('next', add_to_history=False)) == 2)
+    assert(len(agent.clone()._get_message_history(None, add_to_history=False)) == 3)
+
+
+if __name__ == '__main__':
+    test_pending_tool_calls()
+    test_index_survives_list_operations()
+    test_context_window_turns()
+    test_context_window_tokens()
+    test_context_window_reads()
+    test_agent_context_window()
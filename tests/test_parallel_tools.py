@@ -0,0 +1,153 @@
+from __future__ import annotations
+import typing
+import time
+import asyncio
+import threading
+
+import langchain_core.tools
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+
+
+class FakeToolModel(GenericFakeChatModel):
+    '''Fake model that ignores tool binding so it can be used offline.'''
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+@langchain_core.tools.tool
+def slow_lookup(key: str, delay: float) -> str:
+    '''Look up a value slowly.'''
+    time.sleep(delay)
+    return f'value of {key}'
+
+
+def make_agent() -> simplechatbot.Agent:
+    # the same tool is called three times; later calls finish first
+    message = AIMessage(content='', tool_calls=[
+        {'name': 'slow_lookup', 'args': {'key': 'a', 'delay': 0.3}, 'id': 'call_a'},
+        {'name': 'slow_lookup', 'args': {'key': 'b', 'delay': 0.2}, 'id': 'call_b'},
+        {'name': 'slow_lookup', 'args': {'key': 'c', 'delay': 0.1}, 'id': 'call_c'},
+    ])
+    return simplechatbot.Agent.from_model(
+        model = FakeToolModel(messages=iter([message])),
+        tools = [slow_lookup],
+    )
+
+
+def test_parallel_tools():
+    agent = make_agent()
+    r = agent.chat('Look up a, b, and c.')
+
+    start = time.monotonic()
+    results = r.execute_tools(parallel=True)
+    elapsed = time.monotonic() - start
+    assert(elapsed < 0.5)
+
+    assert(list(results.keys()) == ['call_a', 'call_b', 'call_c'])
+    assert(results['call_b'].return_value == 'value of b')
+    tool_messages = [m for m in agent.history if isinstance(m, ToolMessage)]
+    assert([m.tool_call_id for m in tool_messages] == ['call_a', 'call_b', 'call_c'])
+
+
+def test_parallel_tools_async():
+    agent = make_agent()
+
+    async def run():
+        r = await agent.achat('Look up a, b, and c.')
+        return await r.aexecute_tools(parallel=True, max_concurrency=3)
+
+    start = time.monotonic()
+    results = asyncio.run(run())
+    assert(time.monotonic() - start < 0.5)
+    assert(len(results) == 3)
+    tool_messages = [m for m in agent.history if isinstance(m, ToolMessage)]
+    assert([m.tool_call_id for m in tool_messages] == ['call_a', 'call_b', 'call_c'])
+
+
+def test_sequential_tools():
+    agent = make_agent()
+    results = agent.chat('Look up a, b, and c.').execute_tools()
+    assert(len(results) == 3)
+
+
+tool_started = threading.Event()
+
+@langchain_core.tools.tool
+def signal_lookup(key: str) -> str:
+    '''Look up a value and signal that the lookup started.'''
+    tool_started.set()
+    return f'value of {key}'
+
+
+class EagerStreamModel(FakeToolModel):
+    '''Streams a tool call in pieces, then waits for the tool to start before sending trailing text.'''
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # like real providers, only the first chunk of a tool call carries its name and id
+        for i, args in enumerate(('{"ke', 'y": "a"', '}')):
+            yield ChatGenerationChunk(message=AIMessageChunk(content='', tool_call_chunks=[
+                tool_call_chunk(name='signal_lookup' if i == 0 else None, args=args, id='call_a' if i == 0 else None, index=0),
+            ]))
+        # only completes if the tool was dispatched while the stream is still open
+        started = tool_started.wait(timeout=2)
+        yield ChatGenerationChunk(message=AIMessageChunk(content='started' if started else 'waited'))
+
+
+def test_eager_tool_dispatch():
+    tool_started.clear()
+    agent = simplechatbot.Agent.from_model(model=EagerStreamModel(messages=iter([])), tools=[signal_lookup])
+    stream = agent.stream('Look up a.', eager_tools=True)
+    r = stream.collect()
+    assert(r.content == 'started')
+    assert(len(stream._dispatched) == 1)
+    results = r.execute_tools()
+    assert(results['call_a'].return_value == 'value of a')
+    assert(agent.history[-1].tool_call_id == 'call_a')
+    assert(isinstance(agent.history[-2], AIMessage))
+
+    # without eager dispatch the tool only runs from execute_tools
+    tool_started.clear()
+    stream = agent.stream('Look up a.')
+    assert(stream.collect().content == 'waited')
+    stream.execute_tools()
+
+
+def test_async_dispatch_from_sync_and_close():
+    from simplechatbot.fake_agent import FakeChatModel
+    message = AIMessage(content='', tool_calls=[{'name': 'slow_lookup', 'args': {'key': 'a', 'delay': 0.3}, 'id': 'call_a'}])
+
+    async def run():
+        agent = simplechatbot.Agent.from_model(model=FakeChatModel(responses=[message]), tools=[slow_lookup])
+        stream = agent.astream('Look up a.', eager_tools=True)
+        r = await stream.collect()
+        assert(len(stream._dispatched) == 1)
+        try:
+            r.execute_tools() # the tool is still running on the event loop
+            assert(False)
+        except ValueError:
+            pass
+        results = await r.aexecute_tools()
+        assert(results['call_a'].return_value == 'value of a')
+    asyncio.run(run())
+
+    # the agent that creates the tool executor owns it; clones get their own
+    with simplechatbot.Agent.from_model(model=FakeChatModel(responses=[message]), tools=[slow_lookup]) as agent:
+        executor = agent.tool_executor
+        clone = agent.clone()
+        assert(clone.tool_executor is not executor)
+        clone.close()
+    assert(agent._tool_executor is None and executor._shutdown)
+
+
+if __name__ == '__main__':
+    test_parallel_tools()
+    test_parallel_tools_async()
+    test_sequential_tools()
+    test_eager_tool_dispatch()
+    test_async_dispatch_from_sync_and_close()
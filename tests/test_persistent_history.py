@@ -0,0 +1,119 @@
+from __future__ import annotations
+import typing
+import pickle
+import tempfile
+import pathlib
+
+import langchain_core.tools
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent
+
+
+@langchain_core.tools.tool
+def add_numbers(a: int, b: int) -> int:
+    '''Add two numbers.'''
+    return a + b
+
+
+def open_histories(tmpdir: pathlib.Path) -> typing.Iterator[typing.Callable[[], simplechatbot.PersistentMessageHistory]]:
+    yield lambda: simplechatbot.PersistentMessageHistory.from_jsonl(tmpdir / 'chat.jsonl', cache_size=4)
+    yield lambda: simplechatbot.PersistentMessageHistory.from_sqlite(tmpdir / 'chat.db', session_id='abc', cache_size=4)
+
+
+def test_persistent_history():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for open_history in open_histories(pathlib.Path(tmpdir)):
+            history = open_history()
+            history.add_system_message('You are a helpful assistant.')
+            for i in range(10):
+                history.add_human_message(f'message {i}')
+                history.add_ai_message(f'reply {i}')
+            history.add_message(AIMessage(content='', tool_calls=[{'name': 'add_numbers', 'args': {'a': 1, 'b': 2}, 'id': 'call_1'}]))
+            expected = list(history)
+            assert(len(history) == 22 and len(history._cache) == 4)
+            history.close()
+
+            # reopening builds the tool index without reading any message
+            history = open_history()
+            assert(len(history) == 22 and len(history._cache) == 0)
+            assert(history.pending_tool_ids() == {'call_1'})
+            assert(history == expected and history[:] == expected and history[-3].content == 'message 9')
+            assert(history.system_prompt.content == 'You are a helpful assistant.')
+            assert(history.last_human.content == 'message 9')
+            assert(history + [HumanMessage('new')] == expected + [HumanMessage('new')])
+
+            history.add_tool_message(3, tool_call_id='call_1')
+            history.check_tools_were_executed()
+
+            # other mutations rewrite the store
+            history.pop()
+            del history[-1]
+            history.insert(1, HumanMessage('inserted'))
+            history.close()
+            history = open_history()
+            assert(len(history) == 22 and history[1].content == 'inserted' and history[-1].content == 'reply 9')
+            assert(len(pickle.loads(pickle.dumps(history))) == 22 and len(history.pending_tool_ids()) == 0)
+            history.close()
+
+
+def test_agent_with_persistent_history():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = pathlib.Path(tmpdir) / 'chat.jsonl'
+        tool_call = AIMessage(content='', tool_calls=[{'name': 'add_numbers', 'args': {'a': 1, 'b': 2}, 'id': 'call_1'}])
+        agent = FakeAgent.new(responses=[tool_call, 'The answer is 3.'], tools=[add_numbers])
+        agent.history = simplechatbot.PersistentMessageHistory.from_jsonl(path, cache_size=2)
+        trace = agent.run('Add 1 and 2.')
+        assert(trace.content == 'The answer is 3.')
+
+        # forks get in-memory copies, so they do not write to the file
+        fork = agent.clone()
+        fork.history.add_human_message('not persisted')
+        assert(type(fork.history) is simplechatbot.MessageHistory and len(agent.history) == 4)
+        agent.history.close()
+
+        history = simplechatbot.PersistentMessageHistory.from_jsonl(path)
+        assert([type(m) for m in history] == [HumanMessage, AIMessage, ToolMessage, AIMessage])
+        history.check_tools_were_executed()
+        history.close()
+
+
+class CountingStore(simplechatbot.JsonlMessageStore):
+    '''Counts messages deserialized from the file.'''
+    num_read: int = 0
+
+    def read(self, start: int, stop: int) -> list:
+        messages = super().read(start, stop)
+        self.num_read += len(messages)
+        return messages
+
+
+def test_windowed_reads():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = pathlib.Path(tmpdir) / 'chat.jsonl'
+        history = simplechatbot.PersistentMessageHistory.from_jsonl(path)
+        history.add_system_message('You are a helpful assistant.')
+        for i in range(500):
+            history.add_human_message(f'message {i}')
+            history.add_ai_message(f'reply {i}')
+        history.close()
+
+        store = CountingStore(path)
+        agent = FakeAgent.new(responses=[lambda messages: f'saw {len(messages)} messages'])
+        agent.history = simplechatbot.PersistentMessageHistory(store, cache_size=8)
+        agent.context_window = simplechatbot.ContextWindow(max_turns=2)
+        for i in range(3):
+            store.num_read = 0
+            assert(agent.chat(f'turn {i}').content == 'saw 4 messages')
+            assert(store.num_read <= 6) # system prompt plus the window, not the whole transcript
+        assert(len(agent.history) == 1007)
+        agent.history.close()
+
+
+if __name__ == '__main__':
+    test_persistent_history()
+    test_agent_with_persistent_history()
+    test_windowed_reads()
@@ -0,0 +1,225 @@
+from __future__ import annotations
+import typing
+import asyncio
+import threading
+import time
+
+import pydantic
+import langchain_core.tools
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.language_models import BaseChatModel
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent, FakeChatModel
+
+
+@langchain_core.tools.tool
+def add_numbers(a: int, b: int) -> int:
+    '''Add two numbers.'''
+    return a + b
+
+
+class Answer(pydantic.BaseModel):
+    value: int
+
+
+class SplitUsageModel(BaseChatModel):
+    '''Streams usage in two parts, input tokens with the first chunk and output tokens with the last.'''
+    @property
+    def _llm_type(self) -> str:
+        return 'split-usage'
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        raise NotImplementedError
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        yield ChatGenerationChunk(message=AIMessageChunk(content='hello ', usage_metadata={'input_tokens': 30, 'output_tokens': 0, 'total_tokens': 30}))
+        yield ChatGenerationChunk(message=AIMessageChunk(content='there', usage_metadata={'input_tokens': 0, 'output_tokens': 5, 'total_tokens': 5}))
+
+
+def test_request_and_token_buckets():
+    # a full minute of requests is available immediately, then they refill at 10/s
+    limiter = simplechatbot.RateLimiter(requests_per_minute=600)
+    for _ in range(600):
+        limiter.acquire(0).release()
+    start = time.perf_counter()
+    limiter.acquire(0).release()
+    assert(0.05 < time.perf_counter() - start < 0.5)
+
+    # tokens refill at 10/s; a request for 3 more than remain waits 0.3s
+    limiter = simplechatbot.RateLimiter(tokens_per_minute=600)
+    lease = limiter.acquire(600)
+    lease.release(600)
+    start = time.perf_counter()
+    limiter.acquire(3).release()
+    assert(0.2 < time.perf_counter() - start < 0.8)
+
+    # unused estimated tokens are returned to the bucket
+    limiter = simplechatbot.RateLimiter(tokens_per_minute=600)
+    limiter.acquire(600).release(actual_tokens=10)
+    start = time.perf_counter()
+    limiter.acquire(100).release()
+    assert(time.perf_counter() - start < 0.1)
+
+    stats = limiter.stats()
+    assert(stats.num_requests == 2)
+    assert(stats.estimated_tokens == 700)
+    assert(stats.actual_tokens == 10)
+    assert(stats.in_flight == 0)
+
+    limiter = simplechatbot.RateLimiter(completion_tokens=100)
+    messages = [HumanMessage(content='x'*400)]
+    assert(limiter.estimate_tokens(messages) == simplechatbot.approximate_token_count(messages[0]) + 100)
+    assert(limiter.estimate_tokens(messages, max_completion_tokens=5) == simplechatbot.approximate_token_count(messages[0]) + 5)
+
+
+def test_fair_queue_and_concurrency():
+    limiter = simplechatbot.RateLimiter(max_concurrency=1)
+    first = limiter.acquire(0)
+    order, in_flight, max_in_flight = list(), [0], [0]
+    lock = threading.Lock()
+
+    def worker(i: int):
+        with limiter.acquire(0):
+            with lock:
+                order.append(i)
+                in_flight[0] += 1
+                max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+
+    threads = list()
+    for i in range(5):
+        threads.append(threading.Thread(target=worker, args=(i,), daemon=True))
+        threads[-1].start()
+        time.sleep(0.02) # make arrival order deterministic
+    assert(limiter.stats().num_waiting == 5)
+    first.release()
+    for thread in threads:
+        thread.join()
+
+    assert(order == [0, 1, 2, 3, 4])
+    assert(max_in_flight[0] == 1)
+    stats = limiter.stats()
+    assert(stats.num_requests == 6)
+    assert(stats.num_waiting == 0)
+    assert(stats.max_wait >= 0.1)
+    assert(stats.p95_wait >= stats.p50_wait > 0)
+    assert(stats.mean_wait > 0)
+
+
+def test_async_queue_and_cancellation():
+    async def run():
+        limiter = simplechatbot.RateLimiter(max_concurrency=2)
+        order = list()
+
+        async def worker(i: int):
+            lease = await limiter.aacquire(0)
+            order.append(i)
+            await asyncio.sleep(0.01)
+            lease.release()
+
+        await asyncio.gather(*[worker(i) for i in range(6)])
+        assert(sorted(order) == list(range(6)))
+        assert(order[:2] == [0, 1])
+
+        # a cancelled waiter gives up its place without leaking a slot
+        held = [await limiter.aacquire(0), await limiter.aacquire(0)]
+        waiting = asyncio.ensure_future(limiter.aacquire(0))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        for lease in held:
+            lease.release()
+        lease = await asyncio.wait_for(limiter.aacquire(0), timeout=1)
+        lease.release()
+        assert(limiter.stats().in_flight == 0)
+
+    asyncio.run(run())
+
+
+def test_shared_limiter_and_agents():
+    limiter = simplechatbot.RateLimiter.shared('test-provider', tokens_per_minute=100_000, max_concurrency=2)
+    assert(simplechatbot.RateLimiter.shared('test-provider') is limiter)
+    assert(simplechatbot.RateLimiter.shared('other-provider') is not limiter)
+
+    agents = [limiter.attach(FakeAgent.from_model(FakeChatModel(responses=['hello there'], latency=0.05))) for _ in range(3)]
+    assert(isinstance(agents[0]._model, simplechatbot.RateLimitedChatModel))
+    assert(limiter.wrap(agents[0]._model) is agents[0]._model) # not wrapped twice
+
+    threads = [threading.Thread(target=agent.chat, args=('Hi',)) for agent in agents for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = limiter.stats()
+    assert(stats.num_requests == 6)
+    assert(stats.max_wait >= 0.04) # only two requests at a time
+    assert(0 < stats.actual_tokens < stats.estimated_tokens)
+    assert(sum(a._model.model.num_calls for a in agents) == 6)
+
+    # stream and async paths go through the limiter too
+    agent = agents[0]
+    assert(agent.stream('Hi').collect().content == 'hello there')
+    assert(asyncio.run(agent.achat('Hi')).content == 'hello there')
+    assert(limiter.stats().num_requests == 8)
+
+
+def test_rate_limited_tools_and_structured_output():
+    limiter = simplechatbot.RateLimiter(requests_per_minute=1000)
+    model = FakeChatModel(responses=[AIMessage(content='', tool_calls=[{'name': 'add_numbers', 'args': {'a': 1, 'b': 2}, 'id': 'call_1'}])])
+    agent = limiter.attach(FakeAgent.from_model(model, tools=[add_numbers]))
+    result = agent.chat('Add 1 and 2.')
+    assert(result.execute_tools()['call_1'].return_value == 3)
+    bound, _ = agent.get_model_with_tools()
+    assert(bound.limiter is limiter)
+
+    agent = limiter.attach(FakeAgent.from_model(FakeChatModel(responses=[Answer(value=3)])))
+    assert(agent.chat_structured('What is 1+2?', output_structure=Answer).data.value == 3)
+    assert(limiter.stats().num_requests == 2)
+
+
+def test_rate_limited_cache_keys():
+    limiter = simplechatbot.RateLimiter()
+    cache = simplechatbot.ResponseCache()
+    agent = limiter.attach(FakeAgent.from_model(FakeChatModel(responses=['hello']), response_cache=cache))
+    agent.chat('hi', add_to_history=False)
+    agent.chat('hi', tools=[add_numbers], add_to_history=False)
+    assert(cache.stats().misses == 2) # tools are part of the key
+
+    # differently configured models behind one limiter do not share entries
+    other = limiter.attach(FakeAgent.from_model(FakeChatModel(responses=['hello'], model_name='other'), response_cache=cache))
+    other.chat('hi', add_to_history=False)
+    assert(cache.stats().misses == 3)
+    agent.chat('hi', add_to_history=False)
+    assert(cache.stats().hits == 1)
+
+
+def test_stream_usage_and_shared_config():
+    limiter = simplechatbot.RateLimiter(tokens_per_minute=100_000)
+    model = limiter.wrap(SplitUsageModel())
+    assert(''.join(c.content for c in model.stream('hi')) == 'hello there')
+    assert(limiter.stats().actual_tokens == 35)
+
+    limiter = simplechatbot.RateLimiter.shared('config-provider', requests_per_minute=100)
+    assert(simplechatbot.RateLimiter.shared('config-provider', requests_per_minute=100) is limiter)
+    try:
+        simplechatbot.RateLimiter.shared('config-provider', requests_per_minute=200)
+        assert(False)
+    except ValueError:
+        pass
+
+
+if __name__ == '__main__':
+    test_request_and_token_buckets()
+    test_fair_queue_and_concurrency()
+    test_async_queue_and_cancellation()
+    test_shared_limiter_and_agents()
+    test_rate_limited_tools_and_structured_output()
+    test_rate_limited_cache_keys()
+    test_stream_usage_and_shared_config()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+import typing
+import uuid
+import tempfile
+import pathlib
+
+import langchain_core.tools
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.language_models import BaseChatModel
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeChatModel
+
+
+class CountingModel(BaseChatModel):
+    '''Fake model that replies with a fixed message and counts calls.'''
+    reply: AIMessage
+    num_calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'counting'
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.num_calls += 1
+        return ChatResult(generations=[ChatGeneration(message=self.reply)])
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+@langchain_core.tools.tool
+def lookup(key: str) -> str:
+    '''Look up a value.'''
+    return f'value of {key}'
+
+
+def test_memory_cache():
+    model = CountingModel(reply=AIMessage(content='hello there'))
+    agent = simplechatbot.Agent.from_model(
+        model = model,
+        system_prompt = 'You are a helpful assistant.',
+        response_cache = simplechatbot.ResponseCache(),
+    )
+    for _ in range(3):
+        r = agent.chat('hi', add_to_history=False)
+        assert(r.content == 'hello there')
+    assert(model.num_calls == 1)
+
+    # streaming hit replays as a StreamResult
+    stream = agent.stream('hi', add_to_history=False)
+    assert(stream.collect().content == 'hello there')
+    assert(model.num_calls == 1)
+
+    # different history is a miss
+    agent.chat('something else')
+    assert(model.num_calls == 2)
+    stats = agent.response_cache.stats()
+    assert(stats.memory_hits == 3 and stats.misses == 2)
+
+
+def test_cached_tool_calls():
+    reply = AIMessage(content='', tool_calls=[{'name': 'lookup', 'args': {'key': 'a'}, 'id': 'call_1'}])
+    model = CountingModel(reply=reply)
+    agent = simplechatbot.Agent.from_model(
+        model = model,
+        tools = [lookup],
+        response_cache = simplechatbot.ResponseCache(),
+    )
+    r1 = agent.chat('look up a', add_to_history=False)
+    r2 = agent.chat('look up a', add_to_history=False)
+    assert(model.num_calls == 1)
+    assert(r2.tool_calls[0].name == 'lookup')
+    assert(r1.tool_calls[0].id != r2.tool_calls[0].id)
+    assert(list(r2.execute_tools().values())[0].return_value == 'value of a')
+
+
+def test_replayed_tool_conversation():
+    def reply(messages):
+        # like a real provider: fresh message and tool call ids on every call
+        if messages[-1].type == 'human':
+            return AIMessage(content='', id=f'run-{uuid.uuid4()}', tool_calls=[{'name': 'lookup', 'args': {'key': 'a'}, 'id': f'call_{uuid.uuid4().hex}'}])
+        return AIMessage(content=f'Found {messages[-1].content}.', id=f'run-{uuid.uuid4()}', response_metadata={'request_id': str(uuid.uuid4())})
+
+    cache = simplechatbot.ResponseCache()
+    models = [FakeChatModel(responses=[reply]) for _ in range(2)]
+    traces = [simplechatbot.Agent.from_model(model, tools=[lookup], response_cache=cache).run('Find a.') for model in models]
+    assert(traces[0].content == traces[1].content == 'Found value of a.')
+    assert(models[0].num_calls == 2)
+    assert(models[1].num_calls == 0) # both turns were hits
+    assert(cache.stats().memory_hits == 2)
+
+
+def test_sqlite_cache():
+    with tempfile.TemporaryDirectory() as wd:
+        path = pathlib.Path(wd) / 'responses.db'
+        model = CountingModel(reply=AIMessage(content='from disk'))
+        cache = simplechatbot.ResponseCache(sqlite_path=path, max_entries=1)
+        agent = simplechatbot.Agent.from_model(model=model, response_cache=cache)
+        agent.chat('hi', add_to_history=False)
+        cache.close()
+
+        # new process-equivalent: empty memory tier, same database
+        cache = simplechatbot.ResponseCache(sqlite_path=path)
+        agent = simplechatbot.Agent.from_model(model=model, response_cache=cache)
+        assert(agent.chat('hi', add_to_history=False).content == 'from disk')
+        assert(model.num_calls == 1)
+        assert(cache.stats().disk_hits == 1)
+        cache.close()
+
+
+def test_memory_limits():
+    cache = simplechatbot.ResponseCache(max_entries=2, max_bytes=10)
+    cache.put('a', '12345')
+    cache.put('b', '12345')
+    cache.put('c', '12345')
+    assert(len(cache) == 2)
+    assert(cache.get('a') is None)
+    cache.put('d', '1234567890')
+    assert(len(cache) == 1)
+
+
+if __name__ == '__main__':
+    test_memory_cache()
+    test_cached_tool_calls()
+    test_replayed_tool_conversation()
+    test_sqlite_cache()
+    test_memory_limits()
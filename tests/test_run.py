@@ -0,0 +1,97 @@
+from __future__ import annotations
+import typing
+import asyncio
+import time
+
+import langchain_core.tools
+from langchain_core.messages import AIMessage, ToolMessage
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent
+
+
+@langchain_core.tools.tool
+def add_numbers(a: int, b: int) -> int:
+    '''Add two numbers.'''
+    return a + b
+
+
+def add_call(i: int) -> AIMessage:
+    return AIMessage(content='', tool_calls=[{'name': 'add_numbers', 'args': {'a': i, 'b': 1}, 'id': f'call_{i}'}])
+
+
+def test_run_until_complete():
+    agent = FakeAgent.new(responses=[add_call(1), add_call(2), 'The answer is 3.'], tools=[add_numbers])
+    steps = list()
+    trace = agent.run('Add some numbers.', on_step=steps.append)
+    assert(trace.completed and trace.stop_reason == 'complete')
+    assert(len(trace) == 3 and len(steps) == 3)
+    assert(trace.content == 'The answer is 3.')
+    assert(trace.tool_results['call_2'].return_value == 3)
+    assert(trace.total_tokens > 0)
+    assert(all(step.model_time >= 0 and step.tool_time >= 0 for step in trace))
+    agent.history.check_tools_were_executed()
+
+    # streamed, continuing from the current history
+    agent = FakeAgent.new(responses=[add_call(1), 'done'], tools=[add_numbers])
+    trace = agent.run('Add.', stream=True)
+    assert(trace.content == 'done' and len(trace) == 2)
+
+
+def test_run_limits():
+    # the model never stops calling tools
+    agent = FakeAgent.new(responses=[add_call(1)], tools=[add_numbers])
+    trace = agent.run('Loop forever.', max_iterations=4)
+    assert(trace.stop_reason == 'max_iterations' and len(trace) == 4)
+    assert(len([m for m in agent.history if isinstance(m, ToolMessage)]) == 4)
+    agent.history.check_tools_were_executed()
+
+    agent = FakeAgent.new(responses=[add_call(1)], tools=[add_numbers], latency=0.05)
+    trace = agent.run('Loop forever.', max_iterations=None, deadline=0.12)
+    assert(trace.stop_reason == 'deadline' and 2 <= len(trace) <= 3)
+
+    trace = agent.run(None, max_iterations=None, max_tokens=1)
+    assert(trace.stop_reason == 'token_budget' and len(trace) == 1)
+
+
+def test_run_without_steps():
+    agent = FakeAgent.new(responses=['hi'])
+    for run in (agent.run, lambda *a, **kw: asyncio.run(agent.arun(*a, **kw))):
+        try:
+            run('Hello.', max_iterations=0)
+            assert(False)
+        except ValueError:
+            pass
+    assert(len(agent.history) == 0)
+
+    # a deadline can still stop the run before the first model call
+    trace = agent.run('Hello.', deadline=0)
+    assert(trace.stop_reason == 'deadline' and len(trace) == 0)
+    try:
+        trace.content
+        assert(False)
+    except ValueError:
+        pass
+
+
+def test_arun():
+    agent = FakeAgent.new(responses=[add_call(1), 'The answer is 2.'], tools=[add_numbers])
+    trace = asyncio.run(agent.arun('Add.', parallel=True))
+    assert(trace.completed and trace.content == 'The answer is 2.')
+    assert(trace.steps[0].tool_results['call_1'].return_value == 2)
+
+
+def test_ui_uses_run():
+    agent = FakeAgent.new(responses=[add_call(1), 'The answer is 2.'], tools=[add_numbers])
+    trace = agent.ui._do_chat_call('Add.', stream=False, show_tools=False)
+    assert(trace.completed and len(trace) == 2)
+
+
+if __name__ == '__main__':
+    test_run_until_complete()
+    test_run_limits()
+    test_run_without_steps()
+    test_arun()
+    test_ui_uses_run()
@@ -0,0 +1,121 @@
+from __future__ import annotations
+import typing
+import pickle
+
+import langchain_core.tools
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent
+
+
+@langchain_core.tools.tool
+def add_numbers(a: int, b: int) -> int:
+    '''Add two numbers.'''
+    return a + b
+
+
+def test_shared_history():
+    history = simplechatbot.SharedMessageHistory()
+    history.add_system_message('You are in a tavern.')
+    for i in range(100):
+        history.add_human_message(f'message {i}')
+    expected = list(history)
+
+    forks = [history.clone() for _ in range(10)]
+    for i, fork in enumerate(forks):
+        fork.add_ai_message(f'fork {i}')
+    history.add_ai_message('original')
+
+    # the shared prefix is stored once
+    assert(all(fork[50] is history[50] for fork in forks))
+    assert(forks[3][:-1] == expected and forks[3][-1].content == 'fork 3' and len(forks[3]) == 102)
+    assert(history[-1].content == 'original' and history.segment_count() == 1)
+    assert(list(reversed(forks[0]))[0].content == 'fork 0')
+    assert(forks[0].last_human.content == 'message 99')
+
+    # truncation moves the view without touching shared messages
+    fork = forks[0]
+    del fork[50:]
+    fork.add_ai_message('rewound')
+    assert(len(fork) == 51 and fork[-1].content == 'rewound' and len(forks[1]) == 102)
+    assert(fork.pop().content == 'rewound' and fork == expected[:50])
+    fork.insert(1, HumanMessage('inserted'))
+    assert(fork[1].content == 'inserted' and history[1].content == 'message 0')
+
+    assert(pickle.loads(pickle.dumps(history)) == list(history))
+    assert(history.empty(keep_system_prompt=True) == expected[:1])
+
+
+def test_shared_tool_index():
+    history = simplechatbot.SharedMessageHistory()
+    history.add_message(AIMessage(content='', tool_calls=[{'name': 'add_numbers', 'args': {'a': 1, 'b': 2}, 'id': 'call_1'}]))
+    fork = history.clone()
+    fork.add_tool_message(3, tool_call_id='call_1')
+    fork.check_tools_were_executed()
+    assert(fork.tool_result_exists('call_1') and not history.tool_result_exists('call_1'))
+    assert(history.pending_tool_ids() == {'call_1'})
+    assert(fork.executed_tool_ids() == {'call_1'})
+
+    fork.pop()
+    assert(fork.pending_tool_ids() == {'call_1'} and not fork.tool_result_exists('call_1'))
+
+
+class CountingHistory(simplechatbot.SharedMessageHistory):
+    '''Counts full passes over the history.'''
+    num_iters: int = 0
+
+    def __iter__(self):
+        self.num_iters += 1
+        return super().__iter__()
+
+
+def test_truncation_is_incremental():
+    history = CountingHistory()
+    history.add_system_message('system')
+    for i in range(1000):
+        history.add_human_message(f'message {i}')
+        history.add_ai_message(f'reply {i}')
+    fork = history.clone()
+    fork.add_message(AIMessage(content='', tool_calls=[{'name': 'add_numbers', 'args': {'a': 1, 'b': 2}, 'id': 'call_1'}]))
+    fork.add_tool_message(3, tool_call_id='call_1')
+    fork.add_ai_message('The answer is 3.')
+    fork.num_iters = 0
+
+    assert([m.content for m in fork[-3:-1]] == ['', '3'] and fork[1:3] == history[1:3])
+    fork.pop()
+    assert(len(fork.pending_tool_ids()) == 0)
+    del fork[-1] # the tool call is pending again
+    assert(fork.pending_tool_ids() == {'call_1'})
+    fork.pop()
+    assert(len(fork.pending_tool_ids()) == 0 and len(fork) == 2001)
+    assert(fork.num_iters == 0) # nothing walked the whole history
+
+    # removing most of the history rebuilds the index from what is left
+    fork.add_message(AIMessage(content='', tool_calls=[{'name': 'add_numbers', 'args': {'a': 1, 'b': 2}, 'id': 'call_2'}]))
+    del fork[1:]
+    assert(len(fork) == 1 and len(fork.pending_tool_ids()) == 0)
+
+
+def test_agent_clone_shares_history():
+    tool_call = AIMessage(content='', tool_calls=[{'name': 'add_numbers', 'args': {'a': 1, 'b': 2}, 'id': 'call_1'}])
+    agent = FakeAgent.new(responses=[tool_call, 'The answer is 3.'], tools=[add_numbers])
+    agent.history = simplechatbot.SharedMessageHistory.from_system_prompt('You add numbers.')
+    trace = agent.run('Add 1 and 2.')
+    assert(trace.content == 'The answer is 3.')
+    assert([type(m) for m in agent.history][2:] == [AIMessage, ToolMessage, AIMessage])
+    assert(agent.history.segment_count() == 1) # sending messages does not fork the history
+
+    clone = agent.clone()
+    assert(isinstance(clone.history, simplechatbot.SharedMessageHistory) and clone.history[0] is agent.history[0])
+    clone.chat('Hello again.')
+    assert(len(clone.history) == 7 and len(agent.history) == 5)
+
+
+if __name__ == '__main__':
+    test_shared_history()
+    test_shared_tool_index()
+    test_truncation_is_incremental()
+    test_agent_clone_shares_history()
@@ -0,0 +1,105 @@
+from __future__ import annotations
+import typing
+import time
+
+import langchain_core.tools
+from langchain_core.messages import AIMessageChunk
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent
+
+
+class FakeToolModel(GenericFakeChatModel):
+    '''Fake model that ignores tool binding so it can be used offline.'''
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def make_agent(messages: list) -> simplechatbot.Agent:
+    return simplechatbot.Agent.from_model(
+        model = FakeToolModel(messages=iter(messages)),
+        system_prompt = 'You are a helpful assistant.',
+    )
+
+
+def test_stream_accumulation():
+    text = ' '.join(f'word{i}' for i in range(500))
+    agent = make_agent([text])
+    stream = agent.stream('Say many words.')
+    assert(stream.full_message.content == '')
+
+    for i, chunk in enumerate(stream):
+        if i == 10:
+            # available lazily mid-stream
+            assert(stream.full_message.content == ''.join(c.content for c in stream.chunks))
+    assert(stream.full_message.content == text)
+    assert(stream.collect().content == text)
+    assert(agent.history.last.content == text)
+
+
+def test_add_ai_chunks():
+    history = simplechatbot.MessageHistory()
+    history.add_ai_chunks([AIMessageChunk(content=c) for c in ('a', 'b', 'c')])
+    assert(history.last.content == 'abc')
+
+
+def test_stream_stats():
+    agent = FakeAgent.new(responses=['one two three four five six'], latency=0.02, tokens_per_second=200)
+    stream = agent.stream('Count to six.')
+    try:
+        stream.stats()
+        assert(False)
+    except ValueError:
+        pass
+
+    r = stream.collect()
+    stats = r.stream_stats
+    assert(stats.time_to_first_token >= 0.02)
+    assert(stats.num_chunks == len(stream.chunks))
+    assert(not stats.tokens_estimated and stats.output_tokens == stats.usage['output_tokens'])
+    assert(stats.tokens_per_second > 0)
+    assert(stats.max_gap >= stats.p50_gap > 0)
+    assert(len(stream.metrics.arrivals) == stats.num_chunks)
+
+    # the clock starts when the request is sent (first iteration), not when the stream is created
+    stream = agent.stream('Count to six.')
+    time.sleep(0.1)
+    stats = stream.collect().stream_stats
+    assert(0.02 <= stats.time_to_first_token < 0.1)
+
+    # without usage metadata each chunk counts as a token
+    agent = make_agent(['a b c'])
+    stats = agent.stream('hi').progress_and_collect().stream_stats
+    assert(stats.tokens_estimated and stats.output_tokens == stats.num_chunks)
+
+
+def test_coalesced_callback():
+    text = ' '.join(f'word{i}' for i in range(100))
+    agent = FakeAgent.new(responses=[text])
+    batches = list()
+    stream = agent.stream(
+        'Say many words.',
+        receive_callback = batches.append,
+        coalesce = simplechatbot.CoalescePolicy(max_delay=None, max_chars=50),
+    )
+    # raw chunk iteration is unchanged
+    chunks = list(stream)
+    assert(len(batches) < len(chunks))
+    assert(all(isinstance(b, str) for b in batches))
+    assert(''.join(batches) == text)
+    assert(all(len(b) >= 50 for b in batches[:-1]))
+
+    # final partial batch is flushed at the end even if no limit was reached
+    batches.clear()
+    agent.stream('again', receive_callback=batches.append, coalesce=simplechatbot.CoalescePolicy(max_delay=None, max_chars=None)).collect()
+    assert(batches == [text])
+
+
+if __name__ == '__main__':
+    test_stream_accumulation()
+    test_add_ai_chunks()
+    test_stream_stats()
+    test_coalesced_callback()
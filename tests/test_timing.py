@@ -0,0 +1,72 @@
+from __future__ import annotations
+import typing
+import asyncio
+
+import langchain_core.tools
+from langchain_core.messages import AIMessage
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent
+
+
+@langchain_core.tools.tool
+def add_numbers(a: int, b: int) -> int:
+    '''Add two numbers.'''
+    return a + b
+
+
+def tool_factory(agent: simplechatbot.Agent) -> list[langchain_core.tools.BaseTool]:
+    return [add_numbers]
+
+
+def tool_call_reply() -> AIMessage:
+    return AIMessage(content='', tool_calls=[{'name': 'add_numbers', 'args': {'a': 1, 'b': 2}, 'id': 'call_1'}])
+
+
+def test_phases():
+    aggregator = simplechatbot.TimingAggregator()
+    agent = FakeAgent.new(responses=[tool_call_reply(), 'The answer is 3.'], tool_factories=[tool_factory])
+    agent.timer = simplechatbot.PhaseTimer(sink=aggregator)
+
+    r = agent.chat('What is 1+2?')
+    r.execute_tools()
+    for name in ('history', 'merge_tools', 'tool_dict', 'bind_tools', 'model', 'tool:add_numbers'):
+        assert(name in r.timings.phases)
+
+    r = agent.stream(None).collect()
+    assert(r.content == 'The answer is 3.')
+    assert(r.timings.kind == 'stream')
+    assert(r.timings['model'] > 0)
+
+    p = aggregator.percentiles()
+    assert(p['invoke.model']['count'] == 1)
+    assert(p['tools.tool:add_numbers']['count'] == 1)
+    assert(p['stream.total']['p99'] >= p['stream.total']['p50'])
+    assert('invoke.model' in aggregator.summary())
+
+
+def test_async_phases():
+    agent = FakeAgent.new(responses=[tool_call_reply()], tools=[add_numbers])
+    agent.timer = simplechatbot.PhaseTimer()
+
+    async def run():
+        r = await agent.achat('What is 1+2?')
+        await r.aexecute_tools()
+        return r
+
+    r = asyncio.run(run())
+    assert('tool:add_numbers' in r.timings.phases)
+
+
+def test_disabled():
+    agent = FakeAgent.new(responses=['hello'])
+    assert(agent.chat('hi').timings is None)
+    assert(agent.stream('hi').collect().timings is None)
+
+
+if __name__ == '__main__':
+    test_phases()
+    test_async_phases()
+    test_disabled()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+import typing
+import tempfile
+import pathlib
+import time
+
+import langchain_core.tools
+from langchain_core.messages import AIMessage, ToolMessage
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent
+
+num_lookups = 0
+
+@langchain_core.tools.tool
+def schema_lookup(table: str) -> str:
+    '''Get the schema of a table.'''
+    global num_lookups
+    num_lookups += 1
+    return f'CREATE TABLE {table} (id INTEGER)'
+
+
+def lookup_call(i: int, table: str = 'albums') -> AIMessage:
+    return AIMessage(content='', tool_calls=[{'name': 'schema_lookup', 'args': {'table': table}, 'id': f'call_{i}'}])
+
+
+def test_tool_cache():
+    global num_lookups
+    num_lookups = 0
+    cache = simplechatbot.ToolResultCache(policies={'schema_lookup': simplechatbot.ToolCachePolicy()})
+    agent = FakeAgent.new(
+        responses = [lookup_call(1), lookup_call(2), lookup_call(3, 'tracks')],
+        tools = [schema_lookup],
+    )
+    agent.tool_cache = cache
+
+    r1 = agent.chat('Get the schema.').execute_tools()['call_1']
+    r2 = agent.chat('Again.').execute_tools()['call_2']
+    agent.chat('Other table.').execute_tools()
+    assert(num_lookups == 2)
+    assert(not r1.cached and r2.cached)
+    assert(r2.return_value == r1.return_value)
+
+    # the replayed result is recorded against the new tool call id
+    tool_messages = [m for m in agent.history if isinstance(m, ToolMessage)]
+    assert([m.tool_call_id for m in tool_messages] == ['call_1', 'call_2', 'call_3'])
+
+    stats = cache.stats()
+    assert(stats.memory_hits == 1 and stats.misses == 2 and stats.size == 2)
+
+
+def test_uncached_tools_and_limits():
+    cache = simplechatbot.ToolResultCache(policies={'a': simplechatbot.ToolCachePolicy(max_entries=2, ttl=0.05)})
+    assert(cache.get('b', {}) == (False, None))
+    cache.put('b', {}, 1)
+    assert(cache.get('b', {}) == (False, None))
+
+    for i in range(3):
+        cache.put('a', {'i': i}, i)
+    assert(cache.get('a', {'i': 0}) == (False, None))
+    assert(cache.get('a', {'i': 2}) == (True, 2))
+    time.sleep(0.06)
+    assert(cache.get('a', {'i': 2}) == (False, None))
+    assert(cache.stats().expired == 1)
+
+    # argument order does not matter
+    assert(cache.make_key('a', {'x': 1, 'y': 2}) == cache.make_key('a', {'y': 2, 'x': 1}))
+
+
+def test_disk_cache():
+    with tempfile.TemporaryDirectory() as wd:
+        path = pathlib.Path(wd) / 'tools.db'
+        cache = simplechatbot.ToolResultCache(default_policy=simplechatbot.ToolCachePolicy(), sqlite_path=path)
+        cache.put('schema_lookup', {'table': 'albums'}, {'columns': ['id']})
+        cache.close()
+
+        cache = simplechatbot.ToolResultCache(default_policy=simplechatbot.ToolCachePolicy(), sqlite_path=path)
+        assert(cache.get('schema_lookup', {'table': 'albums'}) == (True, {'columns': ['id']}))
+        assert(cache.stats().disk_hits == 1)
+        cache.clear('schema_lookup')
+        assert(cache.get('schema_lookup', {'table': 'albums'})[0] == False)
+        cache.close()
+
+
+if __name__ == '__main__':
+    test_tool_cache()
+    test_uncached_tools_and_limits()
+    test_disk_cache()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+import typing
+import asyncio
+import json
+import os
+import time
+
+import langchain_core.tools
+from langchain_core.messages import AIMessage, ToolMessage
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent
+
+
+@langchain_core.tools.tool
+def slow_tool(delay: float) -> str:
+    '''Wait for a while.'''
+    time.sleep(delay)
+    return 'finished'
+
+
+@langchain_core.tools.tool
+def get_pid() -> int:
+    '''Get the id of the process running this tool.'''
+    return os.getpid()
+
+
+def call(name: str, args: dict, id: str) -> AIMessage:
+    return AIMessage(content='', tool_calls=[{'name': name, 'args': args, 'id': id}])
+
+
+def make_agent(responses: list, policies: dict) -> simplechatbot.Agent:
+    agent = FakeAgent.new(responses=responses, tools=[slow_tool, get_pid])
+    agent.tool_runner = simplechatbot.ToolRunner(policies=policies)
+    return agent
+
+
+def test_timeout_returns_tool_message():
+    agent = make_agent(
+        responses = [call('slow_tool', {'delay': 1.0}, 'call_1'), call('slow_tool', {'delay': 0.0}, 'call_2')],
+        policies = {'slow_tool': simplechatbot.ToolExecutionPolicy(timeout=0.1)},
+    )
+    start = time.monotonic()
+    result = agent.chat('Wait.').execute_tools()['call_1']
+    assert(time.monotonic() - start < 0.5)
+    assert(isinstance(result.error, simplechatbot.ToolTimeoutError))
+
+    message = agent.history[-1]
+    assert(isinstance(message, ToolMessage) and message.status == 'error')
+    assert(json.loads(message.content)['error'] == 'timeout')
+
+    # fast calls are unaffected
+    result = agent.chat(None).execute_tools()['call_2']
+    assert(result.error is None and result.return_value == 'finished')
+    assert(agent.history[-1].status == 'success')
+    agent.tool_runner.shutdown(wait=False)
+
+
+def test_async_timeout():
+    agent = make_agent(
+        responses = [call('slow_tool', {'delay': 1.0}, 'call_1')],
+        policies = {'slow_tool': simplechatbot.ToolExecutionPolicy(timeout=0.1, executor='thread')},
+    )
+    async def run():
+        r = await agent.achat('Wait.')
+        return await r.aexecute_tools()
+
+    start = time.monotonic()
+    results = asyncio.run(run())
+    assert(time.monotonic() - start < 0.5)
+    assert(results['call_1'].status == 'error')
+    agent.tool_runner.shutdown(wait=False)
+
+
+def test_process_pool():
+    agent = make_agent(
+        responses = [call('get_pid', {}, 'call_1')],
+        policies = {'get_pid': simplechatbot.ToolExecutionPolicy(executor='process', timeout=30)},
+    )
+    result = agent.chat('Which process?').execute_tools()['call_1']
+    assert(result.return_value != os.getpid())
+    agent.tool_runner.shutdown()
+
+
+if __name__ == '__main__':
+    test_timeout_returns_tool_message()
+    test_async_timeout()
+    test_process_pool()
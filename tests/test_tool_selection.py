@@ -0,0 +1,105 @@
+from __future__ import annotations
+import typing
+
+import langchain_core.tools
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+
+import sys
+sys.path.append('../src/')
+import simplechatbot
+from simplechatbot.fake_agent import FakeAgent
+
+
+def make_tools(n: int) -> list[langchain_core.tools.BaseTool]:
+    def make(i: int):
+        def func(x: int) -> int:
+            return x + i
+        return langchain_core.tools.StructuredTool.from_function(func, name=f'dummy_tool_{i}', description=f'Unrelated helper number {i}.')
+    return [make(i) for i in range(30)]
+
+
+@langchain_core.tools.tool
+def get_weather(city: str) -> str:
+    '''Get the current weather forecast for a city.'''
+    return f'Sunny in {city}.'
+
+
+@langchain_core.tools.tool
+def send_email(to: str, body: str) -> str:
+    '''Send an email message.'''
+    return 'sent'
+
+
+def bound_tool_names(agent) -> list[str]:
+    model, _ = agent.get_model_with_tools(messages='What is the weather in Paris?')
+    return [t['function']['name'] for t in model.kwargs['tools']]
+
+
+def test_lexical_selection():
+    selector = simplechatbot.LexicalToolSelector(top_k=3, pinned=['send_email'])
+    tools = [*make_tools(30), get_weather, send_email]
+    agent = FakeAgent.new(responses=['ok'], tools=tools)
+    agent.toolset.tool_selector = selector
+
+    names = bound_tool_names(agent)
+    assert('get_weather' in names and 'send_email' in names)
+    assert(len(names) <= 3 + 1)
+    assert(selector.last_selection == names)
+
+    # without messages (e.g. batch), every tool is bound
+    model, lookup = agent.get_model_with_tools()
+    assert(len(model.kwargs['tools']) == len(tools))
+
+
+def test_no_matching_tools():
+    # a query that matches no tool binds every tool rather than none
+    selector = simplechatbot.LexicalToolSelector(top_k=3)
+    tools = [*make_tools(30), get_weather, send_email]
+    selected = selector.select({t.name: t for t in tools}, 'do it again')
+    assert(len(selected) == len(tools))
+    assert(selector.last_selection == list(selected))
+
+
+def test_unbound_tools_still_execute():
+    tools = [*make_tools(30), get_weather]
+    responses = [AIMessage(content='', tool_calls=[{'name': 'dummy_tool_5', 'args': {'x': 1}, 'id': 'call_1'}])]
+    agent = FakeAgent.new(responses=responses, tools=tools)
+    agent.toolset.tool_selector = simplechatbot.LexicalToolSelector(top_k=2)
+    result = agent.chat('What is the weather in Paris?')
+    assert('dummy_tool_5' not in agent.toolset.tool_selector.last_selection)
+    assert(result.execute_tools()['call_1'].return_value == 6)
+
+
+class KeywordEmbeddings(Embeddings):
+    '''Embeds text as counts of a few keywords.'''
+    keywords = ('weather', 'email', 'helper')
+
+    def __init__(self):
+        self.num_documents = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.num_documents += len(texts)
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return [float(text.lower().count(k)) for k in self.keywords]
+
+
+def test_embedding_selection():
+    embeddings = KeywordEmbeddings()
+    selector = simplechatbot.EmbeddingToolSelector(embeddings=embeddings, top_k=1)
+    tools = [*make_tools(30), get_weather, send_email]
+    agent = FakeAgent.new(responses=['ok'], tools=tools)
+    agent.toolset.tool_selector = selector
+
+    assert(bound_tool_names(agent) == ['get_weather'])
+    assert(bound_tool_names(agent) == ['get_weather'])
+    assert(embeddings.num_documents == len(tools)) # tool vectors are computed once
+
+
+if __name__ == '__main__':
+    test_lexical_selection()
+    test_no_matching_tools()
+    test_unbound_tools_still_execute()
+    test_embedding_selection()